@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        # 注册权限缓存失效的信号处理
+        from . import permission_cache  # noqa: F401
+        # 注册菜单配置缓存的失效信号
+        from . import config_cache  # noqa: F401
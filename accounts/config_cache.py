@@ -0,0 +1,29 @@
+"""
+菜单配置缓存的失效（缓存实现见 core.http_cache）
+
+菜单树包含子菜单、权限数和角色数，菜单本身、两个多对多关系或被关联的权限/角色删除时都需要失效；
+queryset.update() 不触发信号，调用方需要自己调用 invalidate_menu_cache。
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.http_cache import bump_version
+
+from .models import Menu, Permission, UserRole
+
+MENU_TREE_CACHE = 'menu-tree'
+
+
+def invalidate_menu_cache():
+    transaction.on_commit(lambda: bump_version(MENU_TREE_CACHE))
+
+
+@receiver(post_save, sender=Menu)
+@receiver(post_delete, sender=Menu)
+@receiver(m2m_changed, sender=Menu.permissions.through)
+@receiver(m2m_changed, sender=Menu.roles.through)
+@receiver(post_delete, sender=Permission)
+@receiver(post_delete, sender=UserRole)
+def _menu_changed(sender, **kwargs):
+    invalidate_menu_cache()
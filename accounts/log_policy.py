@@ -0,0 +1,152 @@
+"""
+操作日志记录策略
+
+按请求路径前缀配置（settings.OPERATION_LOG_POLICIES，最长前缀优先）：
+- SKIP_GET:    不记录 GET 请求
+- SAMPLE_RATE: 读请求(GET/HEAD/OPTIONS)每 K 次只记录 1 次，写操作始终记录
+- RESPONSE:    响应数据的保存方式
+               'full'     完整保存
+               'truncate' 超过 MAX_BYTES 时只保存前 MAX_BYTES 字节预览和摘要
+               'summary'  只保存 哈希/大小/行数 摘要
+               'none'     不保存
+"""
+import hashlib
+import itertools
+import json
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+DEFAULT_POLICY = {
+    'SKIP_GET': False,
+    'SAMPLE_RATE': 1,
+    'RESPONSE': 'full',
+    'MAX_BYTES': 16 * 1024,
+}
+
+
+class LogPolicy:
+    """单个路径前缀的日志策略"""
+
+    def __init__(self, skip_get=False, sample_rate=1, response='full', max_bytes=DEFAULT_POLICY['MAX_BYTES']):
+        self.skip_get = skip_get
+        self.sample_rate = max(1, int(sample_rate or 1))
+        self.response = response
+        self.max_bytes = max_bytes
+        self._counter = itertools.count()
+        self._counter_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        config = {**DEFAULT_POLICY, **config}
+        return cls(
+            skip_get=config['SKIP_GET'],
+            sample_rate=config['SAMPLE_RATE'],
+            response=config['RESPONSE'],
+            max_bytes=config['MAX_BYTES'],
+        )
+
+    def should_log(self, method):
+        if method == 'GET' and self.skip_get:
+            return False
+        if method in READ_METHODS and self.sample_rate > 1:
+            with self._counter_lock:
+                return next(self._counter) % self.sample_rate == 0
+        return True
+
+    def shape_response(self, data):
+        """按策略把响应数据转换成要存入 response_data 的内容"""
+        return json.loads(self.serialize_response(data))
+
+    def serialize_response(self, data, max_bytes=None):
+        """
+        按策略把响应数据序列化成 JSON 字符串。
+        max_bytes 是额外的整体上限：'full' 策略超过上限时也只保存预览和摘要。
+        """
+        if self.response == 'none':
+            return '{}'
+
+        try:
+            text = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return '{}'
+        return self.serialize_body(text.encode('utf-8'), max_bytes, row_count=count_rows(data)).decode('utf-8')
+
+    def serialize_body(self, body, max_bytes=None, row_count=None):
+        """
+        按策略处理已经渲染好的 JSON 响应体（bytes），返回要保存的 JSON 文本（bytes）。
+        大小/哈希/预览都在字节上计算，不解析也不重新序列化响应数据；
+        row_count 由调用方传入（对列表取 len 是常数时间）。
+        """
+        if self.response == 'none' or not body:
+            return b'{}'
+
+        limit = self.max_bytes if self.response == 'truncate' else None
+        if max_bytes is not None:
+            limit = max_bytes if limit is None else min(limit, max_bytes)
+
+        if self.response != 'summary' and (limit is None or len(body) <= limit):
+            return body
+
+        summary = {
+            '_summary': True,
+            'size': len(body),
+            'sha256': hashlib.sha256(body).hexdigest(),
+            'row_count': row_count,
+        }
+        if self.response != 'summary':
+            summary['_truncated'] = True
+            summary['preview'] = body[:limit].decode('utf-8', 'ignore')
+        return json.dumps(summary, ensure_ascii=False).encode('utf-8')
+
+
+def count_rows(data):
+    if isinstance(data, list):
+        return len(data)
+    if isinstance(data, dict):
+        for key in ('results', 'items', 'data'):
+            if isinstance(data.get(key), list):
+                return len(data[key])
+    return None
+
+
+_policies = None
+_policies_lock = threading.Lock()
+
+
+def _build_policies():
+    config = getattr(settings, 'OPERATION_LOG_POLICIES', {})
+    default = LogPolicy.from_config(config.get('default', {}))
+    paths = sorted(
+        ((prefix, LogPolicy.from_config(policy)) for prefix, policy in config.get('paths', [])),
+        key=lambda pair: len(pair[0]),
+        reverse=True,
+    )
+    return default, paths
+
+
+def resolve_policy(path):
+    """返回与请求路径匹配的策略（最长前缀优先）"""
+    global _policies
+    if _policies is None:
+        with _policies_lock:
+            if _policies is None:
+                _policies = _build_policies()
+
+    default, paths = _policies
+    for prefix, policy in paths:
+        if path.startswith(prefix):
+            return policy
+    return default
+
+
+@receiver(setting_changed)
+def _reset_policies(setting, **kwargs):
+    global _policies
+    if setting == 'OPERATION_LOG_POLICIES':
+        _policies = None
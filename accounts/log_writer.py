@@ -0,0 +1,189 @@
+"""
+操作日志后台写入器
+
+请求线程只把日志放进内存队列，由后台线程批量 bulk_create 写入数据库。
+- 队列有上限，满了以后按 OVERFLOW_POLICY 处理：
+  'drop'  直接丢弃新日志（只计数，不影响请求）
+  'block' 最多等待 BLOCK_TIMEOUT 秒，仍然满则丢弃
+  'sync'  退回到在请求线程中同步写入（背压）
+- 进程退出时（atexit）把队列中剩余的日志全部写完。
+- ASYNC=False 时在请求线程中同步写入，测试环境可用 override_settings 关闭异步。
+- 响应数据直接使用已经渲染好的响应体（response.content）：请求线程只在字节上按日志策略
+  截断或计算摘要（单项不超过 MAX_ENTRY_BYTES），不重新序列化 response.data；
+  解析成 JSON 在写入线程中进行。队列不持有请求/响应对象，内存占用有上限。
+"""
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .log_policy import LogPolicy, count_rows
+
+logger = logging.getLogger('django')
+
+DEFAULT_SETTINGS = {
+    'ASYNC': True,
+    'QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,
+    'OVERFLOW_POLICY': 'drop',
+    'BLOCK_TIMEOUT': 0.05,
+    'MAX_ENTRY_BYTES': 64 * 1024,
+}
+
+# 没有指定策略的数据（请求数据）完整保存，超过 MAX_ENTRY_BYTES 时只保存预览和摘要
+_FULL_POLICY = LogPolicy(response='full')
+
+
+def get_log_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'OPERATION_LOG', {})}
+
+
+def prepare_entry(entry, max_bytes):
+    """
+    把日志中的请求/响应数据处理成有上限的 JSON 文本，返回可以入队的新字典。
+    带 response_body（已渲染的 JSON 响应体）时按字节处理，response_data 只用于统计行数
+    """
+    entry = dict(entry)
+    policy = entry.pop('response_policy', None) or _FULL_POLICY
+    body = entry.pop('response_body', None)
+    entry['request_data'] = _FULL_POLICY.serialize_response(entry.get('request_data', {}), max_bytes)
+    if body is not None:
+        entry['response_data'] = policy.serialize_body(body, max_bytes, row_count=count_rows(entry.get('response_data')))
+    else:
+        entry['response_data'] = policy.serialize_response(entry.get('response_data', {}), max_bytes)
+    return entry
+
+
+def _loads(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return {}
+
+
+class OperationLogWriter:
+    """操作日志批量写入器"""
+
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.dropped_count = 0
+
+    # ---------- 请求线程调用 ----------
+
+    def submit(self, entry):
+        """提交一条日志（OperationLog 的字段字典，可带 response_policy），返回是否被接收"""
+        config = get_log_settings()
+        entry = prepare_entry(entry, config['MAX_ENTRY_BYTES'])
+        if not config['ASYNC'] or self._stopping.is_set():
+            self.write([entry])
+            return True
+
+        log_queue = self._ensure_started(config)
+        try:
+            if config['OVERFLOW_POLICY'] == 'block':
+                log_queue.put(entry, timeout=config['BLOCK_TIMEOUT'])
+            else:
+                log_queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            if config['OVERFLOW_POLICY'] == 'sync':
+                self.write([entry])
+                return True
+            with self._lock:
+                self.dropped_count += 1
+                dropped = self.dropped_count
+            if dropped % 1000 == 1:
+                logger.warning(f"操作日志队列已满，已丢弃 {dropped} 条日志")
+            return False
+
+    # ---------- 写入 ----------
+
+    def write(self, entries):
+        """批量写入数据库，写入失败不影响业务"""
+        from .models import OperationLog
+
+        if not entries:
+            return
+        try:
+            OperationLog.objects.bulk_create([self._build_log(OperationLog, entry) for entry in entries])
+        except Exception as e:
+            logger.error(f"记录操作日志失败: {e}")
+
+    def _build_log(self, model, entry):
+        """entry 为 prepare_entry 处理后的字典"""
+        entry = dict(entry)
+        entry['request_data'] = _loads(entry['request_data'])
+        entry['response_data'] = _loads(entry['response_data'])
+        return model(**entry)
+
+    # ---------- 后台线程 ----------
+
+    def _ensure_started(self, config):
+        if self._thread is not None and self._thread.is_alive():
+            return self._queue
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self._queue is None:
+                    self._queue = queue.Queue(maxsize=config['QUEUE_SIZE'])
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(config['BATCH_SIZE'], config['FLUSH_INTERVAL']),
+                    name='operation-log-writer',
+                    daemon=True,
+                )
+                self._thread.start()
+        return self._queue
+
+    def _run(self, batch_size, flush_interval):
+        while not self._stopping.is_set():
+            batch = self._collect(batch_size, flush_interval)
+            if batch:
+                close_old_connections()
+                self.write(batch)
+        close_old_connections()
+
+    def _collect(self, batch_size, flush_interval):
+        """最多等待 flush_interval 秒，凑够 batch_size 条就立即返回"""
+        batch = []
+        deadline = time.monotonic() + flush_interval
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        batch = []
+        while self._queue is not None:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def shutdown(self, timeout=5.0):
+        """停止后台线程，并把队列中剩余的日志全部写入"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        remaining = self._drain()
+        batch_size = get_log_settings()['BATCH_SIZE']
+        for start in range(0, len(remaining), batch_size):
+            self.write(remaining[start:start + batch_size])
+
+
+operation_log_writer = OperationLogWriter()
+atexit.register(operation_log_writer.shutdown)
@@ -4,40 +4,21 @@ from django.utils.deprecation import MiddlewareMixin
 from django.http import JsonResponse
 from django.conf import settings
 from rest_framework import status
-from .models import OperationLog, UserProfile
+from .models import UserProfile
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from django.contrib.auth.models import User
-from django.core.serializers.json import DjangoJSONEncoder
+from .log_policy import resolve_policy
+from .log_writer import operation_log_writer
+from .permission_cache import get_required_permission, is_exempt_path, permission_cache
 
 class PermissionMiddleware(MiddlewareMixin):
-    """权限校验中间件"""
+    """权限校验中间件（路由前缀树 + 用户权限缓存，见 permission_cache）"""
     
     def process_request(self, request):
-        # 不需要权限校验的路径
-        exempt_paths = [
-            '/api/auth/login/',
-            '/api/auth/register/',
-            '/api/auth/refresh/',
-            '/api/auth/verify/',
-            '/api/auth/logout/',
-            '/api/user/info/',  # 获取用户信息不需要权限
-            '/api/menus/',  # 获取菜单不需要权限
-            '/api/departments/',  # 获取部门不需要权限
-            '/api/job-titles/',  # 获取职称不需要权限
-            '/api/roles/',  # 获取角色不需要权限
-            '/api/permissions/',  # 获取权限不需要权限
-            '/api/upload-avatar/',  # 上传头像不需要权限
-            '/api/delete-avatar/',  # 删除头像不需要权限
-            '/admin/',  # Django管理后台
-            '/static/',  # 静态文件
-            '/media/',  # 媒体文件
-        ]
-        
         # 检查是否为豁免路径
-        for exempt_path in exempt_paths:
-            if request.path.startswith(exempt_path):
-                return None
+        if is_exempt_path(request.path):
+            return None
         
         # 如果是API请求且用户已认证，检查权限
         if request.path.startswith('/api/') and request.user.is_authenticated:
@@ -56,74 +37,18 @@ class PermissionMiddleware(MiddlewareMixin):
     
     def _check_permissions(self, request, user):
         """检查用户权限"""
-        try:
-            profile = user.profile
-            
-            # 如果用户没有角色，默认拒绝访问
-            if not profile.role:
-                return False
-            
-            # 获取用户角色权限
-            role_permissions = profile.role.permissions
-            
-            # 根据请求路径和方法判断所需权限
-            required_permission = self._get_required_permission(request)
-            
-            if not required_permission:
-                return True  # 不需要特殊权限
-            
-            return required_permission in role_permissions
-            
-        except UserProfile.DoesNotExist:
-            return False
-    
-    def _get_required_permission(self, request):
-        """根据请求获取所需权限"""
-        path = request.path
-        method = request.method
+        # 根据请求路径和方法判断所需权限
+        required_permission = get_required_permission(request.path, request.method)
         
-        # 权限映射规则
-        permission_rules = {
-            # 耗材管理权限
-            '/api/supplies/': {
-                'GET': 'supply_view',
-                'POST': 'supply_create',
-                'PUT': 'supply_update',
-                'PATCH': 'supply_update',
-                'DELETE': 'supply_delete',
-            },
-            # 库存管理权限
-            '/api/inventory/': {
-                'GET': 'inventory_view',
-                'POST': 'inventory_create',
-                'PUT': 'inventory_update',
-                'PATCH': 'inventory_update',
-                'DELETE': 'inventory_delete',
-            },
-            # 用户管理权限
-            '/api/users/': {
-                'GET': 'user_view',
-                'POST': 'user_create',
-                'PUT': 'user_update',
-                'PATCH': 'user_update',
-                'DELETE': 'user_delete',
-            },
-            # 系统管理权限
-            '/api/system/': {
-                'GET': 'system_view',
-                'POST': 'system_create',
-                'PUT': 'system_update',
-                'PATCH': 'system_update',
-                'DELETE': 'system_delete',
-            },
-        }
+        # 获取用户角色权限（缓存），没有 profile 或没有角色时为 None，默认拒绝访问
+        role_permissions = permission_cache.get_permissions(user.pk)
+        if role_permissions is None:
+            return False
         
-        # 查找匹配的权限规则
-        for path_prefix, method_permissions in permission_rules.items():
-            if path.startswith(path_prefix):
-                return method_permissions.get(method)
+        if not required_permission:
+            return True  # 不需要特殊权限
         
-        return None
+        return required_permission in role_permissions
 
 class OperationLogMiddleware(MiddlewareMixin):
     """操作日志中间件"""
@@ -159,6 +84,11 @@ class OperationLogMiddleware(MiddlewareMixin):
             if request.path.startswith(path):
                 return response
         
+        # 按路径策略决定是否记录（跳过GET / 抽样）
+        policy = resolve_policy(request.path)
+        if not policy.should_log(request.method):
+            return response
+        
         # 计算执行时间
         execution_time = 0
         if hasattr(request, 'start_time'):
@@ -175,10 +105,14 @@ class OperationLogMiddleware(MiddlewareMixin):
             except:
                 request_data = {}
         
-        # 获取响应数据
+        # 获取响应数据：直接使用已经渲染好的 JSON 响应体，不在请求线程中重新序列化
+        # （response.data 只用于统计行数；非 JSON 渲染的响应不保存响应数据）
         response_data = {}
-        if hasattr(response, 'data'):
+        response_body = None
+        if getattr(response, 'data', None) is not None:  # 204 等响应的 data 为 None
             response_data = response.data
+            is_json = response.get('Content-Type', '').startswith('application/json')
+            response_body = response.content if is_json and not response.streaming else b''
         
         # 确定操作类型
         operation_type = self._get_operation_type(request.method, request.path)
@@ -192,37 +126,23 @@ class OperationLogMiddleware(MiddlewareMixin):
         # 创建操作描述
         description = self._create_description(request, operation_type, model_name)
         
-        # 记录日志
+        # 记录日志（交给后台写入器批量写入，不阻塞当前请求）
         if hasattr(request, 'user') and request.user.is_authenticated:
-            try:
-                # 使用DjangoJSONEncoder来处理datetime对象
-                request_data_json = json.dumps(request_data, cls=DjangoJSONEncoder)
-                response_data_json = json.dumps(response_data, cls=DjangoJSONEncoder)
-                
-                # 将JSON字符串转换回字典（这样存储在数据库中时会被正确序列化）
-                try:
-                    request_data_processed = json.loads(request_data_json)
-                    response_data_processed = json.loads(response_data_json)
-                except:
-                    request_data_processed = {}
-                    response_data_processed = {}
-                
-                OperationLog.objects.create(
-                    user=request.user,
-                    operation_type=operation_type,
-                    model_name=model_name,
-                    object_id=object_id,
-                    description=description,
-                    ip_address=request.client_ip,
-                    user_agent=request.META.get('HTTP_USER_AGENT', ''),
-                    request_data=request_data_processed,
-                    response_data=response_data_processed,
-                    status_code=response.status_code,
-                    execution_time=execution_time,
-                )
-            except Exception as e:
-                # 记录日志失败不影响正常响应
-                print(f"记录操作日志失败: {e}")
+            operation_log_writer.submit({
+                'user_id': request.user.id,
+                'operation_type': operation_type,
+                'model_name': model_name,
+                'object_id': object_id,
+                'description': description,
+                'ip_address': request.client_ip,
+                'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+                'request_data': request_data,
+                'response_data': response_data,
+                'response_body': response_body,
+                'response_policy': policy,
+                'status_code': response.status_code,
+                'execution_time': execution_time,
+            })
         
         return response
     
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_passwordresettoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='operationlog',
+            index=models.Index(fields=['user', '-created_at'], name='oplog_user_created_idx'),
+        ),
+    ]
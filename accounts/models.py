@@ -176,6 +176,8 @@ class OperationLog(models.Model):
             models.Index(fields=['user', 'operation_type']),
             models.Index(fields=['model_name', 'object_id']),
             models.Index(fields=['created_at']),
+            # 按用户查看操作记录（时间倒序）
+            models.Index(fields=['user', '-created_at'], name='oplog_user_created_idx'),
         ]
 
     def __str__(self):
@@ -0,0 +1,231 @@
+"""
+权限校验缓存
+
+- RouteTrie: 路径前缀字典树，豁免路径和权限规则在模块加载时编译一次，
+  每次请求只需沿请求路径走一遍，不再逐条 startswith。
+- 用户角色权限缓存：未配置 BACKEND 时使用进程内 LRU + TTL；配置了 BACKEND（多进程共享的
+  Django 缓存）时只使用共享缓存，不再保留进程内副本，任一进程的失效对所有进程立即生效。
+  每个用户只在缓存未命中时用一次联表查询取出角色权限。
+- UserRole.permissions 或 UserProfile.role 变化时通过信号失效相关用户的缓存
+  （在事务提交后执行）。queryset.update() 不触发信号，此时由 TTL 兜底。
+- 进程内缓存的失效只作用于当前进程，多进程部署时必须配置 BACKEND，
+  否则其他进程最长在 TTL 秒内仍使用撤销前的权限。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import UserProfile, UserRole
+
+DEFAULT_SETTINGS = {
+    'MAX_SIZE': 2048,
+    'TTL': 300,
+    # Django 缓存别名，例如 'default'；为 None 时只使用进程内缓存
+    'BACKEND': None,
+    'KEY_PREFIX': 'perm:user:',
+}
+
+
+def get_cache_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'PERMISSION_CACHE', {})}
+
+
+class RouteTrie:
+    """按字符构建的前缀树，lookup 返回与路径匹配的最长前缀对应的值"""
+
+    _END = object()
+
+    def __init__(self, routes=None):
+        self._root = {}
+        for prefix, value in (routes or {}).items():
+            self.insert(prefix, value)
+
+    def insert(self, prefix, value):
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[self._END] = value
+
+    def lookup(self, path, default=None):
+        node = self._root
+        found = node.get(self._END, default)
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                break
+            if self._END in node:
+                found = node[self._END]
+        return found
+
+
+# 不需要权限校验的路径
+EXEMPT_PATHS = [
+    '/api/auth/login/',
+    '/api/auth/register/',
+    '/api/auth/refresh/',
+    '/api/auth/verify/',
+    '/api/auth/logout/',
+    '/api/user/info/',  # 获取用户信息不需要权限
+    '/api/menus/',  # 获取菜单不需要权限
+    '/api/departments/',  # 获取部门不需要权限
+    '/api/job-titles/',  # 获取职称不需要权限
+    '/api/roles/',  # 获取角色不需要权限
+    '/api/permissions/',  # 获取权限不需要权限
+    '/api/upload-avatar/',  # 上传头像不需要权限
+    '/api/delete-avatar/',  # 删除头像不需要权限
+    '/admin/',  # Django管理后台
+    '/static/',  # 静态文件
+    '/media/',  # 媒体文件
+]
+
+
+def _crud_permissions(name):
+    return {
+        'GET': f'{name}_view',
+        'POST': f'{name}_create',
+        'PUT': f'{name}_update',
+        'PATCH': f'{name}_update',
+        'DELETE': f'{name}_delete',
+    }
+
+
+# 权限映射规则：路径前缀 -> {请求方法: 所需权限}
+PERMISSION_RULES = {
+    '/api/supplies/': _crud_permissions('supply'),  # 耗材管理权限
+    '/api/inventory/': _crud_permissions('inventory'),  # 库存管理权限
+    '/api/users/': _crud_permissions('user'),  # 用户管理权限
+    '/api/system/': _crud_permissions('system'),  # 系统管理权限
+}
+
+exempt_routes = RouteTrie({path: True for path in EXEMPT_PATHS})
+permission_routes = RouteTrie(PERMISSION_RULES)
+
+
+def is_exempt_path(path):
+    return exempt_routes.lookup(path, False)
+
+
+def get_required_permission(path, method):
+    """根据请求路径和方法获取所需权限，不需要特殊权限时返回 None"""
+    method_permissions = permission_routes.lookup(path)
+    if not method_permissions:
+        return None
+    return method_permissions.get(method)
+
+
+class UserPermissionCache:
+    """用户角色权限缓存（进程内 LRU + TTL，或共享的 Django 缓存）"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_permissions(self, user_id):
+        """
+        返回用户角色的权限集合（frozenset）
+        用户没有 profile 或没有角色时返回 None（默认拒绝访问）
+        """
+        config = get_cache_settings()
+        backend = self._backend(config)
+        if backend is not None:
+            return self._get_shared(backend, config, user_id)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                expires_at, permissions = entry
+                if expires_at > now:
+                    self._entries.move_to_end(user_id)
+                    return permissions
+                del self._entries[user_id]
+
+        permissions = self._load(user_id)
+        with self._lock:
+            self._entries[user_id] = (now + config['TTL'], permissions)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > config['MAX_SIZE']:
+                self._entries.popitem(last=False)
+        return permissions
+
+    def _get_shared(self, backend, config, user_id):
+        key = f"{config['KEY_PREFIX']}{user_id}"
+        cached = backend.get(key)
+        if cached is not None:
+            # Django 缓存中保存 {'permissions': list | None}，以区分"未命中"和"无角色"
+            permissions = cached['permissions']
+            return frozenset(permissions) if permissions is not None else None
+        permissions = self._load(user_id)
+        backend.set(key, {'permissions': sorted(permissions) if permissions is not None else None}, config['TTL'])
+        return permissions
+
+    def invalidate(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+        config = get_cache_settings()
+        backend = self._backend(config)
+        if backend is not None:
+            backend.delete_many([f"{config['KEY_PREFIX']}{user_id}" for user_id in user_ids])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _backend(self, config):
+        alias = config['BACKEND']
+        return caches[alias] if alias else None
+
+    def _load(self, user_id):
+        # 一次联表查询取出角色权限；没有 profile 时结果为空，没有角色时为 None
+        rows = list(
+            UserProfile.objects
+            .filter(user_id=user_id)
+            .values_list('role_id', 'role__permissions')[:1]
+        )
+        if not rows or rows[0][0] is None:
+            return None
+        return frozenset(rows[0][1] or [])
+
+
+permission_cache = UserPermissionCache()
+
+
+def _invalidate_on_commit(user_ids):
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: permission_cache.invalidate(user_ids))
+
+
+@receiver(post_save, sender=UserRole)
+def _role_saved(sender, instance, **kwargs):
+    _invalidate_on_commit(UserProfile.objects.filter(role=instance).values_list('user_id', flat=True))
+
+
+@receiver(pre_delete, sender=UserRole)
+def _role_deleted(sender, instance, **kwargs):
+    # 删除角色时 profile.role 通过 SET_NULL 批量置空，不会触发 UserProfile 的信号
+    _invalidate_on_commit(UserProfile.objects.filter(role=instance).values_list('user_id', flat=True))
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def _profile_changed(sender, instance, **kwargs):
+    _invalidate_on_commit([instance.user_id])
+
+
+@receiver(setting_changed)
+def _reset_cache(setting, **kwargs):
+    if setting == 'PERMISSION_CACHE':
+        permission_cache.clear()
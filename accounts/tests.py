@@ -1,3 +1,112 @@
-from django.test import TestCase
+import hashlib
+import json
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .log_policy import LogPolicy
+from .log_writer import prepare_entry
+from .models import Menu, UserProfile, UserRole
+from .permission_cache import UserPermissionCache, permission_cache
+
+
+class OperationLogEntryTests(TestCase):
+    """日志在入队前序列化成有上限的字符串，不持有响应对象"""
+
+    def test_prepare_entry_is_bounded(self):
+        rows = [{'id': i, 'name': '探针' * 10} for i in range(1000)]
+        entry = prepare_entry(
+            {'request_data': {'ids': list(range(5000))}, 'response_data': rows, 'response_policy': LogPolicy()},
+            max_bytes=1024,
+        )
+        self.assertNotIn('response_policy', entry)
+        for field in ('request_data', 'response_data'):
+            self.assertIsInstance(entry[field], str)
+            self.assertLess(len(entry[field].encode('utf-8')), 2 * 1024)
+        self.assertIn('"row_count": 1000', entry['response_data'])
+
+    def test_prepare_entry_keeps_small_data(self):
+        entry = prepare_entry({'request_data': {'a': 1}, 'response_data': {'ok': True}}, max_bytes=1024)
+        self.assertEqual((entry['request_data'], entry['response_data']), ('{"a": 1}', '{"ok": true}'))
+
+    def test_prepare_entry_uses_rendered_body(self):
+        """响应数据只在响应体字节上截断和摘要，不重新序列化 response.data"""
+        body = json.dumps([{'id': i} for i in range(1000)]).encode('utf-8')
+        # response.data 无法序列化：只用于统计行数
+        entry = prepare_entry(
+            {'response_data': [object()] * 1000, 'response_body': body, 'response_policy': LogPolicy()},
+            max_bytes=1024,
+        )
+        summary = json.loads(entry['response_data'])
+        self.assertEqual(summary['size'], len(body))
+        self.assertEqual(summary['sha256'], hashlib.sha256(body).hexdigest())
+        self.assertEqual(summary['row_count'], 1000)
+        self.assertTrue(body.decode('utf-8').startswith(summary['preview']))
+        self.assertNotIn('response_body', entry)
+
+
+@override_settings(OPERATION_LOG={'ASYNC': False})
+class PermissionRevocationTests(TestCase):
+    """撤销角色权限后，受保护的接口立即拒绝访问"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = UserRole.objects.create(name='operator', permissions=['supply_view'])
+        cls.user = User.objects.create_user('operator', password='password')
+        UserProfile.objects.create(user=cls.user, role=cls.role)
+
+    def setUp(self):
+        permission_cache.clear()
+        cache.clear()
+        # 权限中间件读取会话用户，DRF 视图使用 JWT 认证
+        self.client.force_login(self.user)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(self.user)}'
+
+    def test_revoke_role_permission(self):
+        self.assertEqual(self.client.get('/api/supplies/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.permissions = []
+            self.role.save()
+        self.assertEqual(self.client.get('/api/supplies/').status_code, 403)
+
+    @override_settings(PERMISSION_CACHE={'BACKEND': 'default'})
+    def test_revoke_in_other_process(self):
+        """配置共享缓存时，其他进程的失效对当前进程立即生效"""
+        self.assertEqual(self.client.get('/api/supplies/').status_code, 200)
+        UserRole.objects.filter(id=self.role.id).update(permissions=[])
+        # 另一个进程中的缓存实例收到信号后失效共享缓存
+        UserPermissionCache().invalidate([self.user.id])
+        self.assertEqual(self.client.get('/api/supplies/').status_code, 403)
+
+
+@override_settings(OPERATION_LOG={'ASYNC': False}, CONFIG_CACHE={'LOCAL_TTL': 60})
+class MenuTreeCacheTests(TestCase):
+    """菜单树的版本化缓存：菜单变化后 ETag 失效"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def test_menu_change_invalidates(self):
+        menu = Menu.objects.create(name='耗材管理', path='/supplies')
+        response = self.client.get('/api/menus/tree/')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/menus/tree/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            menu.name = '库存管理'
+            menu.save()
+        response = self.client.get('/api/menus/tree/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['name'] for item in response.json()], ['库存管理'])
+
+        # queryset.update() 不触发信号，batch_update 显式失效
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/menus/batch_update/', {'ids': [menu.id], 'is_visible': False}, format='json')
+        response = self.client.get('/api/menus/tree/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.json()), (200, []))
@@ -23,6 +23,8 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
 import json
 from django.core.serializers.json import DjangoJSONEncoder
+from core.http_cache import cached_config_response
+from .config_cache import MENU_TREE_CACHE, invalidate_menu_cache
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
@@ -1169,10 +1171,12 @@ class MenuViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def tree(self, request):
-        """获取菜单树形结构"""
-        menus = Menu.objects.filter(parent=None, is_active=True, is_visible=True).order_by('order')
-        serializer = self.get_serializer(menus, many=True)
-        return Response(serializer.data)
+        """获取菜单树形结构（版本化缓存，菜单变化时失效）"""
+        def build():
+            menus = Menu.objects.filter(parent=None, is_active=True, is_visible=True).order_by('order')
+            return self.get_serializer(menus, many=True).data
+
+        return cached_config_response(request, MENU_TREE_CACHE, build)
 
     @action(detail=False, methods=['post'])
     def batch_update(self, request):
@@ -1199,6 +1203,7 @@ class MenuViewSet(viewsets.ModelViewSet):
             
             if update_data:
                 queryset.update(**update_data)
+                invalidate_menu_cache()
             
             return Response({'message': f'成功更新 {queryset.count()} 个菜单'})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
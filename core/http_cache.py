@@ -0,0 +1,142 @@
+"""
+静态配置接口的版本化缓存 + HTTP 条件请求
+
+表头配置、菜单树、启用模板这类接口的内容很少变化：
+- 每类配置（namespace）有一个版本号，数据变化时调用 bump_version 递增，
+  旧版本的缓存条目不再被读取，等待 TTL 过期
+- 响应体在每个版本只构建一次，ETag 取响应内容的摘要，Last-Modified 取版本更新时间
+- 请求带 If-None-Match / If-Modified-Since 且未变化时直接返回 304，不再传输响应体
+
+多进程部署时 BACKEND 需要指向共享缓存（例如 Redis / 数据库缓存）。BACKEND 是进程内的
+LocMemCache 时，bump_version 只能让当前进程失效，其它进程会继续返回旧内容和旧 ETag，
+因此改用 LOCAL_TTL：默认 0 表示不缓存（每次构建响应体，ETag 仍按内容生成，304 照常工作），
+大于 0 时版本号和条目最多缓存 LOCAL_TTL 秒，过期后重新构建。
+
+代码中的常量配置（例如 B453 表头）不会在运行时变化，用 static_config_entry 在模块导入时
+构建一次响应体和 ETag，与 BACKEND 无关；版本化缓存只用于菜单、模板等数据库中的配置。
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+DEFAULT_SETTINGS = {
+    'BACKEND': 'default',   # CACHES 中的别名
+    'TTL': 3600,            # 缓存条目有效期(秒)
+    'KEY_PREFIX': 'config:',
+    # 浏览器每次使用前都向服务器确认（配合 ETag 得到 304）
+    'CACHE_CONTROL': 'private, no-cache',
+    # BACKEND 为进程内缓存时的有效期(秒)，0 表示不缓存
+    'LOCAL_TTL': 0,
+}
+
+
+def get_config_cache_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'CONFIG_CACHE', {})}
+
+
+def _cache(config):
+    return caches[config['BACKEND']]
+
+
+def _timeouts(config, cache):
+    """返回 (版本号有效期, 条目有效期)；进程内缓存且 LOCAL_TTL 为 0 时返回 None（不缓存）"""
+    if isinstance(cache, LocMemCache):
+        if not config['LOCAL_TTL']:
+            return None
+        return config['LOCAL_TTL'], min(config['TTL'], config['LOCAL_TTL'])
+    return None, config['TTL']
+
+
+def get_version(namespace):
+    """返回 (版本号, 版本更新时间戳)，缓存中没有时以当前时间初始化"""
+    config = get_config_cache_settings()
+    cache = _cache(config)
+    timeouts = _timeouts(config, cache)
+    if timeouts is None:
+        return time.time_ns(), int(time.time())
+    key = f"{config['KEY_PREFIX']}{namespace}:version"
+    stamp = cache.get(key)
+    if stamp is None:
+        now = int(time.time())
+        cache.add(key, (time.time_ns(), now), timeouts[0])
+        stamp = cache.get(key) or (time.time_ns(), now)
+    return stamp
+
+
+def bump_version(*namespaces):
+    """配置数据变化后调用，使对应的缓存和 ETag 失效"""
+    config = get_config_cache_settings()
+    cache = _cache(config)
+    timeouts = _timeouts(config, cache)
+    if timeouts is None:
+        return
+    for namespace in namespaces:
+        cache.set(f"{config['KEY_PREFIX']}{namespace}:version", (time.time_ns(), int(time.time())), timeouts[0])
+
+
+def get_cached_entry(namespace, builder, variant=''):
+    """
+    取当前版本的缓存条目 {'data', 'etag', 'last_modified'}，未命中时调用 builder() 构建。
+    同一配置因查询参数不同而内容不同时，通过 variant 区分。
+    """
+    config = get_config_cache_settings()
+    cache = _cache(config)
+    timeouts = _timeouts(config, cache)
+    if timeouts is None:
+        # 不缓存：没有共享的版本更新时间，不返回 Last-Modified，只用 ETag 做条件请求
+        return _build_entry(builder, None)
+
+    version, modified = get_version(namespace)
+    digest = hashlib.md5(variant.encode('utf-8')).hexdigest()[:12]
+    key = f"{config['KEY_PREFIX']}{namespace}:{version}:{digest}"
+
+    entry = cache.get(key)
+    if entry is None:
+        entry = _build_entry(builder, modified)
+        cache.set(key, entry, timeouts[1])
+    return entry
+
+
+def _build_entry(builder, modified):
+    data = builder()
+    content = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, sort_keys=True)
+    return {
+        'data': data,
+        'etag': quote_etag(hashlib.md5(content.encode('utf-8')).hexdigest()),
+        'last_modified': modified,
+    }
+
+
+def static_config_entry(builder):
+    """构建常量配置的条目（在模块导入时调用一次），不使用缓存和版本号"""
+    return _build_entry(builder, None)
+
+
+def config_response(request, entry):
+    """
+    按条目返回配置响应：未变化时返回 304，否则返回带 ETag / Last-Modified 的 Response。
+    需要在视图的认证和权限检查之后调用。
+    """
+    response = get_conditional_response(
+        request, etag=entry['etag'], last_modified=entry['last_modified']
+    )
+    if response is None:
+        response = Response(entry['data'])
+    response['ETag'] = entry['etag']
+    if entry['last_modified'] is not None:
+        response['Last-Modified'] = http_date(entry['last_modified'])
+    response['Cache-Control'] = get_config_cache_settings()['CACHE_CONTROL']
+    return response
+
+
+def cached_config_response(request, namespace, builder, variant=''):
+    """返回版本化缓存的配置响应（见 config_response）"""
+    return config_response(request, get_cached_entry(namespace, builder, variant))
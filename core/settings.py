@@ -194,6 +194,72 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# 操作日志写入配置（accounts.log_writer）
+OPERATION_LOG = {
+    'ASYNC': True,               # 后台线程批量写入
+    'QUEUE_SIZE': 10000,         # 内存队列上限
+    'BATCH_SIZE': 200,           # 每批 bulk_create 条数
+    'FLUSH_INTERVAL': 1.0,       # 最长攒批时间(秒)
+    'OVERFLOW_POLICY': 'drop',   # 队列满时: drop / block / sync
+    'BLOCK_TIMEOUT': 0.05,       # block 策略下最长等待时间(秒)
+    'MAX_ENTRY_BYTES': 64 * 1024,  # 单条日志请求/响应数据入队前序列化的上限(字节)
+}
+
+# Excel后台导入任务（supplies.import_jobs）
+IMPORT_JOBS = {
+    'ASYNC': True,          # 在后台线程池中执行导入
+    'WORKERS': 2,           # 同时执行的导入任务数
+    'UPLOAD_DIR': 'imports',  # 上传文件暂存目录（MEDIA_ROOT下）
+    'STALE_SECONDS': 3600,  # running 超过该时间的任务视为进程已退出，标记为失败
+    'REQUEUE_SECONDS': 300,  # pending 超过该时间的任务视为排队丢失，重新提交
+    'MAX_ROWS': 50000,      # 工作表整表读入内存，超过该行数的任务直接失败
+}
+
+# 权限校验缓存（accounts.permission_cache）
+PERMISSION_CACHE = {
+    'MAX_SIZE': 2048,   # 进程内 LRU 最多缓存的用户数
+    'TTL': 300,         # 缓存有效期(秒)
+    'BACKEND': None,    # 多进程部署必须填写共享缓存的 CACHES 别名（Redis / 数据库缓存），此时不再使用进程内 LRU
+}
+
+# 静态配置接口的版本化缓存（core.http_cache）：表头配置、菜单树、启用模板
+CONFIG_CACHE = {
+    'BACKEND': 'default',   # CACHES 中的别名，多进程部署时应指向共享缓存（Redis / 数据库缓存）
+    'TTL': 3600,            # 缓存条目有效期(秒)
+    'LOCAL_TTL': 0,         # BACKEND 为进程内 LocMemCache 时的有效期(秒)，0 表示不缓存
+}
+
+# 计算项目增量同步（supplies.delta_sync）
+DELTA_SYNC = {
+    'TOMBSTONE_DAYS': 7,    # 删除记录保留天数，更早的 since 返回完整数据（reset）
+}
+
+# 统计汇总表维护（supplies.summary）
+SUPPLY_SUMMARY = {
+    'ASYNC': True,            # Supply 保存/删除后在后台线程合并刷新分类汇总
+    'DEBOUNCE_SECONDS': 2.0,  # 第一次标记后等待多久执行全量聚合(秒)
+}
+
+# 申请表复制（supplies.form_clone）
+FORM_CLONE = {
+    'BATCH_SIZE': 1000,                        # bulk_create 每批条数
+    'INSERT_SELECT_VENDORS': ('postgresql',),  # 使用 INSERT ... SELECT 在数据库内复制的数据库
+}
+
+# 操作日志记录策略（accounts.log_policy），按路径前缀匹配，最长前缀优先
+OPERATION_LOG_POLICIES = {
+    'default': {'RESPONSE': 'truncate', 'MAX_BYTES': 16 * 1024},
+    'paths': [
+        # 表单明细列表数据量大：读请求抽样记录，且只保存摘要
+        ('/api/dynamic-calculation-items/', {'SAMPLE_RATE': 10, 'RESPONSE': 'summary'}),
+        ('/api/dynamic-supply-items/', {'SAMPLE_RATE': 10, 'RESPONSE': 'summary'}),
+        ('/api/dynamic-forecast-data/', {'SAMPLE_RATE': 10, 'RESPONSE': 'summary'}),
+        ('/api/grouped-material-data/', {'SAMPLE_RATE': 10, 'RESPONSE': 'summary'}),
+        # 查看日志本身不再产生日志
+        ('/api/logs/', {'SKIP_GET': True}),
+    ],
+}
+
 # 添加日志配置
 LOGGING = {
     'version': 1,
@@ -0,0 +1,167 @@
+import React, { useEffect, useRef, useState } from "react";
+import {
+  Button,
+  Modal,
+  ModalContent,
+  ModalHeader,
+  ModalBody,
+  ModalFooter,
+  Progress,
+} from "@heroui/react";
+import { addToast } from "@heroui/toast";
+
+import { createImportJob, getImportJob, ImportJob } from "@/services/api";
+
+// 轮询间隔（毫秒）
+const POLL_INTERVAL = 1500;
+
+const STAGE_LABELS: Record<string, string> = {
+  queued: "排队中",
+  reading: "读取Excel",
+  importing: "导入数据",
+  syncing: "同步耗材",
+  done: "完成",
+};
+
+interface ImportSuppliesButtonProps {
+  formId?: number;
+  onImportSuccess?: (job: ImportJob) => void;
+}
+
+const ImportSuppliesButton: React.FC<ImportSuppliesButtonProps> = ({
+  formId,
+  onImportSuccess,
+}) => {
+  const fileInputRef = useRef<HTMLInputElement>(null);
+  const timerRef = useRef<number | null>(null);
+  const [job, setJob] = useState<ImportJob | null>(null);
+  const [uploading, setUploading] = useState(false);
+
+  const stopPolling = () => {
+    if (timerRef.current !== null) {
+      window.clearTimeout(timerRef.current);
+      timerRef.current = null;
+    }
+  };
+
+  useEffect(() => stopPolling, []);
+
+  // 轮询任务状态，直到完成或失败
+  const pollJob = (jobId: number) => {
+    timerRef.current = window.setTimeout(async () => {
+      try {
+        const current = await getImportJob(jobId);
+
+        setJob(current);
+        if (current.status === "completed") {
+          addToast({
+            title: "导入成功",
+            description: current.result,
+            color: "success",
+            timeout: 3000,
+            shouldShowTimeoutProgress: true,
+          });
+          onImportSuccess?.(current);
+        } else if (current.status === "failed") {
+          addToast({
+            title: "导入失败",
+            description: current.result,
+            color: "danger",
+            timeout: 4000,
+            shouldShowTimeoutProgress: true,
+          });
+        } else {
+          pollJob(jobId);
+        }
+      } catch (error) {
+        console.error("查询导入任务失败:", error);
+        pollJob(jobId);
+      }
+    }, POLL_INTERVAL);
+  };
+
+  const handleFileChange = async (
+    event: React.ChangeEvent<HTMLInputElement>,
+  ) => {
+    const file = event.target.files?.[0];
+
+    event.target.value = "";
+    if (!file) {
+      return;
+    }
+
+    setUploading(true);
+    try {
+      const created = await createImportJob(file, { form_id: formId });
+
+      setJob(created);
+      pollJob(created.id);
+    } catch (error) {
+      console.error("上传Excel失败:", error);
+      addToast({
+        title: "上传失败",
+        description: error instanceof Error ? error.message : "上传Excel失败",
+        color: "danger",
+        timeout: 4000,
+        shouldShowTimeoutProgress: true,
+      });
+    } finally {
+      setUploading(false);
+    }
+  };
+
+  const handleClose = () => {
+    stopPolling();
+    setJob(null);
+  };
+
+  const finished = job?.status === "completed" || job?.status === "failed";
+
+  return (
+    <>
+      <input
+        ref={fileInputRef}
+        accept=".xlsx"
+        className="hidden"
+        type="file"
+        onChange={handleFileChange}
+      />
+      <Button
+        color="secondary"
+        isLoading={uploading}
+        variant="flat"
+        onPress={() => fileInputRef.current?.click()}
+      >
+        导入Excel
+      </Button>
+
+      <Modal isOpen={job !== null} onClose={handleClose}>
+        <ModalContent>
+          <ModalHeader>导入Excel：{job?.file_name}</ModalHeader>
+          <ModalBody>
+            <Progress
+              showValueLabel
+              color={job?.status === "failed" ? "danger" : "primary"}
+              isIndeterminate={job?.status === "pending"}
+              label={STAGE_LABELS[job?.stage || ""] || job?.stage}
+              value={job?.progress || 0}
+            />
+            {job && job.total_rows > 0 && (
+              <p className="text-sm text-gray-600">
+                已处理 {job.processed_rows} / {job.total_rows} 行
+              </p>
+            )}
+            {finished && <p className="text-sm">{job?.result}</p>}
+          </ModalBody>
+          <ModalFooter>
+            <Button variant="light" onPress={handleClose}>
+              {finished ? "关闭" : "后台运行"}
+            </Button>
+          </ModalFooter>
+        </ModalContent>
+      </Modal>
+    </>
+  );
+};
+
+export default ImportSuppliesButton;
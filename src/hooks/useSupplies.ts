@@ -4,6 +4,7 @@ import type {
   CreateSupplyRequest,
   UpdateSupplyRequest,
   AdjustStockRequest,
+  StatisticsSummaryResponse,
 } from "@/services/supplies";
 
 import { useState, useEffect } from "react";
@@ -214,3 +215,33 @@ export const useSupplies = () => {
     setError: (error: string | null) => setError(error),
   };
 };
+
+// 预先汇总的统计信息（分类 / 申请表汇总），统计卡片和分类图表不再遍历全部耗材
+export const useStatisticsSummary = (formId?: number) => {
+  const [summary, setSummary] = useState<StatisticsSummaryResponse | null>(
+    null,
+  );
+  const [isLoading, setIsLoading] = useState(false);
+  const [error, setError] = useState<string | null>(null);
+
+  const fetchSummary = async (refresh = false) => {
+    try {
+      setIsLoading(true);
+      setError(null);
+      const data = await statisticsApi.getSummary({ form_id: formId, refresh });
+
+      setSummary(data);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : "获取统计汇总失败");
+      console.error("Failed to fetch statistics summary:", err);
+    } finally {
+      setIsLoading(false);
+    }
+  };
+
+  useEffect(() => {
+    fetchSummary();
+  }, [formId]);
+
+  return { summary, isLoading, error, fetchSummary };
+};
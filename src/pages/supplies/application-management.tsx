@@ -17,7 +17,7 @@ import {
 import { PlusIcon } from "@/components/icons";
 import DynamicApplicationManager from "@/components/DynamicApplicationManager";
 import DynamicApplicationDetail from "@/components/DynamicApplicationDetail";
-// import ImportSuppliesButton from "@/components/ImportSuppliesButton";
+import ImportSuppliesButton from "@/components/ImportSuppliesButton";
 import {
   ApplicationForm,
   applicationFormService,
@@ -273,16 +273,12 @@ const ApplicationManagementPage: React.FC = () => {
             >
               快速创建申请表
             </Button>
-            {/* <ImportSuppliesButton
+            <ImportSuppliesButton
               onImportSuccess={() => {
-                // 导入成功后刷新页面数据
-                console.log("导入成功，准备刷新页面...");
-                setTimeout(() => {
-                  console.log("执行页面刷新...");
-                  window.location.reload();
-                }, 2000); // 增加延迟，确保后端同步完成
+                // 后台任务完成后数据已提交，直接刷新页面数据
+                window.location.reload();
               }}
-            /> */}
+            />
           </div>
         )}
       </div>
@@ -49,7 +49,11 @@ import {
   MinusIcon,
   EditIcon,
 } from "@/components/icons";
-import { useSupplies, SupplyItem } from "@/hooks/useSupplies";
+import {
+  useSupplies,
+  useStatisticsSummary,
+  SupplyItem,
+} from "@/hooks/useSupplies";
 import {
   validateDataConsistency,
   generateInventorySummary,
@@ -150,6 +154,7 @@ const SuppliesInventoryOverviewPage: FC = () => {
     updateSupply,
     deleteSupply,
   } = useSupplies();
+  const { summary: statisticsSummary, fetchSummary } = useStatisticsSummary();
   const [searchTerm, setSearchTerm] = useState("");
   const [selectedCategory, setSelectedCategory] = useState<string>("all");
   const [minQuantity, setMinQuantity] = useState<string>("");
@@ -216,23 +221,13 @@ const SuppliesInventoryOverviewPage: FC = () => {
     page * rowsPerPage,
   );
 
-  const categories = Array.from(new Set(supplies.map((item) => item.category)));
-
-  // 准备饼图数据 - 按类别汇总
-  const pieChartData = categories.map((category) => {
-    const categorySupplies = supplies.filter(
-      (item) => item.category === category,
-    );
-    const totalQuantity = categorySupplies.reduce(
-      (sum, item) => sum + item.current_stock,
-      0,
-    );
-
-    return {
-      name: category,
-      value: totalQuantity,
-    };
-  });
+  // 准备饼图数据 - 按类别汇总（来自分类汇总）
+  const pieChartData = Object.entries(
+    statisticsSummary?.category_stats || {},
+  ).map(([category, stats]) => ({
+    name: category,
+    value: stats.total_stock,
+  }));
 
   // 准备柱状图数据
   const barChartData = supplies.map((item) => ({
@@ -335,6 +330,7 @@ const SuppliesInventoryOverviewPage: FC = () => {
 
     setConsistencyIssues(issues);
     setIsConsistencyValid(true);
+    fetchSummary();
   };
 
   const summary = generateInventorySummary(supplies, records);
@@ -353,6 +349,7 @@ const SuppliesInventoryOverviewPage: FC = () => {
         timeout: 3000,
       });
       closeDeleteModal();
+      fetchSummary();
     } catch (error) {
       addToast({
         title: "删除失败",
@@ -576,7 +573,7 @@ const SuppliesInventoryOverviewPage: FC = () => {
         setBatchRemarks({});
         closeBatchModal();
         // 刷新数据
-        await fetchSupplies();
+        await Promise.all([fetchSupplies(), fetchSummary()]);
       }
     } catch (error) {
       console.error(`批量${currentOperation}操作失败:`, error);
@@ -692,7 +689,7 @@ const SuppliesInventoryOverviewPage: FC = () => {
         <Card className="shadow-lg">
           <CardBody className="text-center">
             <div className="text-2xl font-bold text-primary">
-              {summary.totalSupplies}
+              {statisticsSummary?.total_supplies ?? summary.totalSupplies}
             </div>
             <div className="text-sm text-gray-600">总耗材数</div>
           </CardBody>
@@ -708,7 +705,7 @@ const SuppliesInventoryOverviewPage: FC = () => {
         <Card className="shadow-lg">
           <CardBody className="text-center">
             <div className="text-2xl font-bold text-danger">
-              {summary.lowStockItems}
+              {statisticsSummary?.low_stock_count ?? summary.lowStockItems}
             </div>
             <div className="text-sm text-gray-600">库存不足</div>
           </CardBody>
@@ -724,7 +721,9 @@ const SuppliesInventoryOverviewPage: FC = () => {
         <Card className="shadow-lg">
           <CardBody className="text-center">
             <div className="text-2xl font-bold text-blue-600">
-              {formatPrice(calculateTotalValue(supplies))}
+              {formatPrice(
+                statisticsSummary?.total_value ?? calculateTotalValue(supplies),
+              )}
             </div>
             <div className="text-sm text-gray-600">库存总价值</div>
           </CardBody>
@@ -28,7 +28,7 @@ import {
 } from "recharts";
 
 import { SearchIcon, RefreshIcon, WarningIcon } from "@/components/icons";
-import { useSupplies } from "@/hooks/useSupplies";
+import { useSupplies, useStatisticsSummary } from "@/hooks/useSupplies";
 import { generateInventorySummary } from "@/utils/dataConsistencyTest";
 import { formatDate } from "@/utils/dateUtils";
 
@@ -85,6 +85,7 @@ const getUnitByCategory = (category: string): string => {
 
 export default function SuppliesStatisticsPage() {
   const { supplies, records, isLoading, error } = useSupplies();
+  const { summary: statisticsSummary } = useStatisticsSummary();
   const [dateRange, setDateRange] = useState<{
     start: DateValue;
     end: DateValue;
@@ -95,8 +96,9 @@ export default function SuppliesStatisticsPage() {
   const [isResetting, setIsResetting] = useState(false);
   const [showDebugInfo, setShowDebugInfo] = useState(false);
 
-  // 获取所有类别
-  const categories = Array.from(new Set(supplies.map((item) => item.category)));
+  // 获取所有类别（来自分类汇总）
+  const categoryStats = statisticsSummary?.category_stats || {};
+  const categories = Object.keys(categoryStats);
 
   // 调试信息
   const debugInfo = {
@@ -155,20 +157,10 @@ export default function SuppliesStatisticsPage() {
 
   // 生成真实的分类数据
   const generateCategoryData = () => {
-    return categories.map((category) => {
-      const categorySupplies = supplies.filter(
-        (item) => item.category === category,
-      );
-      const totalStock = categorySupplies.reduce(
-        (sum, item) => sum + item.current_stock,
-        0,
-      );
-
-      return {
-        name: category,
-        value: totalStock,
-      };
-    });
+    return categories.map((category) => ({
+      name: category,
+      value: categoryStats[category].total_stock,
+    }));
   };
 
   // 生成真实的排名数据
@@ -301,7 +293,7 @@ export default function SuppliesStatisticsPage() {
         <Card className="shadow-lg">
           <CardBody className="text-center">
             <div className="text-2xl font-bold text-primary">
-              {summary.totalSupplies}
+              {statisticsSummary?.total_supplies ?? summary.totalSupplies}
             </div>
             <div className="text-sm text-gray-600">总耗材数</div>
           </CardBody>
@@ -317,7 +309,7 @@ export default function SuppliesStatisticsPage() {
         <Card className="shadow-lg">
           <CardBody className="text-center">
             <div className="text-2xl font-bold text-danger">
-              {summary.lowStockItems}
+              {statisticsSummary?.low_stock_count ?? summary.lowStockItems}
             </div>
             <div className="text-sm text-gray-600">库存不足</div>
           </CardBody>
@@ -533,6 +533,81 @@ export const deleteAvatar = async (): Promise<{ message: string }> => {
   });
 };
 
+// Excel 后台导入任务
+export interface ImportJob {
+  id: number;
+  status: "pending" | "running" | "completed" | "failed";
+  stage: string;
+  progress: number;
+  file_name: string;
+  sheet_name: string;
+  table_type: string;
+  form_id: number | null;
+  total_rows: number;
+  processed_rows: number;
+  imported_count: number;
+  error_count: number;
+  success: boolean;
+  result: string;
+  result_data: Record<string, any>;
+  created_at: string | null;
+  started_at: string | null;
+  finished_at: string | null;
+  duration: number | null;
+}
+
+export interface ImportJobOptions {
+  form_id?: number;
+  sheet_name?: string;
+  table_type?: "management" | "calculation";
+  header_row?: number;
+}
+
+// 上传Excel并创建导入任务（立即返回，导入在后台执行）
+export const createImportJob = async (
+  file: File,
+  options: ImportJobOptions = {},
+): Promise<ImportJob> => {
+  const token = getToken();
+  const formData = new FormData();
+
+  formData.append("file", file);
+  Object.entries(options).forEach(([key, value]) => {
+    if (value !== undefined && value !== null && value !== "") {
+      formData.append(key, String(value));
+    }
+  });
+
+  const headers: Record<string, string> = {};
+
+  if (token) {
+    headers.Authorization = `Bearer ${token}`;
+  }
+
+  const response = await fetch(`${API_BASE_URL}/import-jobs/`, {
+    method: "POST",
+    headers,
+    body: formData,
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}));
+
+    throw new Error(
+      errorData.error ||
+        errorData.detail ||
+        `HTTP error! status: ${response.status}`,
+    );
+  }
+
+  return response.json();
+};
+
+// 查询导入任务状态和进度
+export const getImportJob = async (jobId: number): Promise<ImportJob> => {
+  return apiRequest<ImportJob>(`/import-jobs/${jobId}/`);
+};
+
 // 获取职称列表
 export interface JobTitle {
   id: number;
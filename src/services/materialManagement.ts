@@ -3,6 +3,7 @@ import type {
   ApplicationForm,
   DynamicSupplyItem,
   DynamicCalculationItem,
+  DynamicCalculationItemDelta,
   DynamicForecastData,
   B482SupplyItem,
   AndorSupplyItem,
@@ -316,6 +317,24 @@ export const materialManagementApi = {
         body: JSON.stringify(params),
       });
     },
+
+    // 批量计算：一次请求计算多组参数，结果按输入顺序返回
+    calculateBatch: async (
+      items: { [key: string]: any }[],
+    ): Promise<{
+      results: { [key: string]: any }[];
+      count: number;
+      error_count: number;
+    }> => {
+      return apiRequest<{
+        results: { [key: string]: any }[];
+        count: number;
+        error_count: number;
+      }>("/unified-calculation/batch/", {
+        method: "POST",
+        body: JSON.stringify({ items }),
+      });
+    },
   },
 
   // B453数据关联API
@@ -470,6 +489,23 @@ export const applicationFormService = {
 
     return response;
   },
+
+  // 从源申请表复制计算项目、耗材项目和预测数据
+  cloneFrom: async (
+    id: number,
+    sourceFormId: number,
+    kinds?: ("calculation_items" | "supply_items" | "forecasts")[],
+  ): Promise<{ message: string; copied: Record<string, number> }> => {
+    const response = await apiRequest<{
+      message: string;
+      copied: Record<string, number>;
+    }>(`/application-forms/${id}/clone_from/`, {
+      method: "POST",
+      body: JSON.stringify({ source_form_id: sourceFormId, kinds }),
+    });
+
+    return response;
+  },
 };
 
 // 动态耗材项目服务
@@ -567,6 +603,23 @@ export const dynamicCalculationItemService = {
     );
   },
 
+  // 增量同步：只获取 since（上次返回的 next_since）之后变化的项目和删除/隐藏列表
+  getDeltaByForm: async (
+    formId: number,
+    since: string,
+    includeHidden: boolean = false,
+  ): Promise<DynamicCalculationItemDelta> => {
+    const params = new URLSearchParams({
+      form_id: formId.toString(),
+      include_hidden: String(includeHidden),
+      since,
+    });
+
+    return apiRequest<DynamicCalculationItemDelta>(
+      `/dynamic-calculation-items/by_form/?${params.toString()}`,
+    );
+  },
+
   // 创建计算项目
   create: async (
     data: Partial<DynamicCalculationItem>,
@@ -76,6 +76,21 @@ export interface AdjustStockRequest {
   remark?: string;
 }
 
+export interface AdjustStockBatchResult {
+  index: number;
+  success: boolean;
+  record?: InventoryRecord;
+  error?: string;
+  status?: number;
+}
+
+export interface AdjustStockBatchResponse {
+  message: string;
+  results: AdjustStockBatchResult[];
+  count: number;
+  error_count: number;
+}
+
 export interface StatisticsResponse {
   total_supplies: number;
   low_stock_count: number;
@@ -91,6 +106,30 @@ export interface StatisticsResponse {
   recent_records: InventoryRecord[];
 }
 
+// 预先汇总的统计信息（只读取汇总表）
+export interface StatisticsSummaryResponse {
+  total_supplies: number;
+  low_stock_count: number;
+  total_value: number;
+  category_stats: Record<
+    string,
+    {
+      count: number;
+      total_stock: number;
+      total_value: number;
+      low_stock_count: number;
+    }
+  >;
+  form_stats: {
+    form_id: number;
+    item_count: number;
+    total_demand: number;
+    total_actual_order: number;
+    total_amount: number;
+    updated_at: string;
+  }[];
+}
+
 // 耗材管理API
 export const suppliesApi = {
   // 获取所有耗材
@@ -154,6 +193,17 @@ export const suppliesApi = {
     });
   },
 
+  // 批量库存调整（扫码批量上传，atomic 为 true 时任一失败则全部不执行）
+  adjustStockBatch: async (
+    movements: AdjustStockRequest[],
+    atomic = false,
+  ): Promise<AdjustStockBatchResponse> => {
+    return apiRequest<AdjustStockBatchResponse>("/adjust-stock/batch/", {
+      method: "POST",
+      body: JSON.stringify({ movements, atomic }),
+    });
+  },
+
   // 同步单个项目的进料需求与實際請購數量
   async syncSingleItemData(
     itemId: number,
@@ -234,4 +284,19 @@ export const statisticsApi = {
   getStatistics: async (): Promise<StatisticsResponse> => {
     return apiRequest<StatisticsResponse>("/statistics/");
   },
+
+  // 获取预先汇总的统计信息（分类 / 申请表汇总）
+  getSummary: async (params?: {
+    form_id?: number;
+    refresh?: boolean;
+  }): Promise<StatisticsSummaryResponse> => {
+    const queryParams = new URLSearchParams();
+
+    if (params?.form_id) queryParams.append("form_id", params.form_id.toString());
+    if (params?.refresh) queryParams.append("refresh", "1");
+
+    const url = `/statistics/summary/${queryParams.toString() ? "?" + queryParams.toString() : ""}`;
+
+    return apiRequest<StatisticsSummaryResponse>(url);
+  },
 };
@@ -119,6 +119,19 @@ export interface DynamicCalculationItem {
   is_visible?: boolean;
 }
 
+// 计算项目增量同步（by_form?since=）
+export interface DynamicCalculationItemDelta {
+  since: string;
+  next_since: string; // 下次请求作为 since 原样传回（不透明游标）
+  reset: boolean; // true 时 items 为完整数据，需要整表替换
+  items: DynamicCalculationItem[];
+  tombstones: {
+    id: number;
+    reason: "deleted" | "hidden";
+    at: string;
+  }[];
+}
+
 export interface ApplicationForm {
   id: number;
   template: number; // or a more detailed Template object
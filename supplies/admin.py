@@ -1,4 +1,5 @@
 from django.contrib import admin
+from .delta_sync import delete_calculation_items
 from .models import Supply, InventoryRecord, B482SupplyItem, AndorSupplyItem, CapacityForecast, B453SupplyItem, B453CalculationItem, B453ForecastData, ApplicationTemplate, ApplicationForm, DynamicSupplyItem, DynamicCalculationItem, DynamicForecastData
 
 @admin.register(Supply)
@@ -240,6 +241,12 @@ class DynamicCalculationItemAdmin(admin.ModelAdmin):
         }),
     ]
 
+    def delete_model(self, request, obj):
+        delete_calculation_items(DynamicCalculationItem.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_calculation_items(queryset)
+
 
 @admin.register(DynamicForecastData)
 class DynamicForecastDataAdmin(admin.ModelAdmin):
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class SuppliesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'supplies'
+
+    def ready(self):
+        # 注册统计汇总表的刷新信号
+        from . import summary  # noqa: F401
+        # 注册模板配置缓存的失效信号
+        from . import config_cache  # noqa: F401
+        # 注册申请表明细数据版本的递增信号
+        from . import form_version  # noqa: F401
+        # 注册计算项目删除记录（增量同步）的信号
+        from . import delta_sync  # noqa: F401
+        # 注册计算项目序号计数器的信号
+        from . import sequences  # noqa: F401
@@ -0,0 +1,229 @@
+"""
+supplies / accounts 接口基准测试
+
+在 seed_data 生成的数据集上，通过 APIClient 走完整的中间件和视图调用各个热点接口：
+- 计时运行：先预热一次，再重复 repeat 次，只计时不做其它统计，得到延迟分位数
+- 统计运行：额外执行一次，记录 SQL 查询次数和 tracemalloc 峰值内存
+  （tracemalloc 本身会拖慢执行，所以不参与计时）
+
+整个过程在一个事务中执行并在结束时回滚，可以直接在 SQLite 或本地 PostgreSQL 上运行。
+由于事务不提交，on_commit 回调（统计汇总刷新、数据版本递增）不会执行。
+结果写成 JSON 基线文件，compare_results 对比两次结果。
+导入任务整表读入内存，import_calculation 与 import_calculation_large（10 倍行数）
+两个场景的峰值内存之比反映内存随工作表行数的增长。
+"""
+import io
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import openpyxl
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from .seed_data import seed_dataset
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = (len(sorted_values) - 1) * percent / 100
+    lower = int(index)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (index - lower)
+
+
+def measure(func, repeat=10, warmup=1):
+    """执行 func 并返回延迟分位数(ms)、查询次数和峰值内存(KB)"""
+    for _ in range(warmup):
+        func()
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    durations.sort()
+
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        'runs': repeat,
+        'queries': len(queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'mean_ms': round(statistics.mean(durations), 2) if durations else 0.0,
+        'max_ms': round(durations[-1], 2) if durations else 0.0,
+    }
+    for percent in PERCENTILES:
+        result[f'p{percent}_ms'] = round(_percentile(durations, percent), 2)
+    return result
+
+
+def _calculation_workbook(rows):
+    """生成计算表导入用的工作簿（表头与 CalculationTableImport 的关键字匹配）"""
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = '耗材需求計算'
+    sheet.append(['No.', '料材名称', '使用站别', '每臺機用量', '使用次數', '當月產能', '最低庫存', '最高庫存', '當月需求/站', '備註'])
+    for index in range(rows):
+        sheet.append([
+            index + 1, f'BENCH 导入 探针 {index:05d}', 'ATE', 2, 10000, 5000 + index, 10, 50, index % 300, '',
+        ])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+class BenchmarkSuite:
+    """基准测试场景集合，每个场景返回一个无参函数（执行一次请求）"""
+
+    # 导入场景 -> 工作簿行数相对于 import_rows 的倍数
+    IMPORT_SCALES = {'import_calculation': 1, 'import_calculation_large': 10}
+
+    def __init__(self, client, dataset, import_rows=500):
+        self.client = client
+        self.dataset = dataset
+        self.form_id = dataset['form_ids'][0]
+        self.import_rows = {name: import_rows * scale for name, scale in self.IMPORT_SCALES.items()}
+        self.workbooks = {}
+
+    def _check(self, response, expected=(200,)):
+        if response.status_code not in expected:
+            raise AssertionError(f'{response.status_code}: {getattr(response, "data", response.content[:200])}')
+        return response
+
+    def by_form(self):
+        url = f'/api/dynamic-calculation-items/by_form/?form_id={self.form_id}'
+        return lambda: self._check(self.client.get(url))
+
+    def by_form_not_modified(self):
+        url = f'/api/dynamic-calculation-items/by_form/?form_id={self.form_id}'
+        etag = self._check(self.client.get(url))['ETag']
+        return lambda: self._check(self.client.get(url, HTTP_IF_NONE_MATCH=etag), expected=(304,))
+
+    def calculate_demands(self):
+        data = {'form_id': self.form_id}
+        return lambda: self._check(
+            self.client.post('/api/dynamic-calculation-items/calculate_demands/', data, format='json')
+        )
+
+    def sync_chase_data(self):
+        data = {'form_id': self.form_id, 'direction': 'chase_to_order', 'target_month_key': '2025-07'}
+        return lambda: self._check(
+            self.client.post('/api/dynamic-calculation-items/sync_chase_data_with_actual_order/', data, format='json')
+        )
+
+    def grouped_material_data(self):
+        url = f'/api/grouped-material-data/{self.form_id}/'
+        return lambda: self._check(self.client.get(url))
+
+    def _import_workbook(self, name):
+        if name not in self.workbooks:
+            self.workbooks[name] = _calculation_workbook(self.import_rows[name])
+        workbook = self.workbooks[name]
+
+        def run():
+            upload = io.BytesIO(workbook)
+            upload.name = 'bench_calculation.xlsx'
+            response = self._check(self.client.post(
+                '/api/import-jobs/',
+                {'file': upload, 'form_id': self.form_id, 'table_type': 'calculation'},
+                format='multipart',
+            ), expected=(202,))
+            if response.data['status'] != 'completed':
+                raise AssertionError(f"导入失败: {response.data['result']}")
+        return run
+
+    def import_calculation(self):
+        return self._import_workbook('import_calculation')
+
+    def import_calculation_large(self):
+        return self._import_workbook('import_calculation_large')
+
+    def operation_log_statistics(self):
+        return lambda: self._check(self.client.get('/api/logs/statistics/'))
+
+    def clone_form(self):
+        # 每次都复制到同一个目标申请表，目标表逐次变大，数据随事务回滚
+        url = f"/api/application-forms/{self.dataset['form_ids'][-1]}/clone_from/"
+        data = {'source_form_id': self.form_id}
+        return lambda: self._check(self.client.post(url, data, format='json'))
+
+    SCENARIOS = (
+        'by_form', 'by_form_not_modified', 'calculate_demands', 'sync_chase_data',
+        'grouped_material_data', 'import_calculation', 'import_calculation_large', 'operation_log_statistics',
+        'clone_form',
+    )
+
+
+def run_benchmarks(forms=10, items_per_form=500, logs=20000, import_rows=500, repeat=10, seed=42, only=None):
+    """生成种子数据、执行各场景并回滚，返回 {'dataset': ..., 'results': {场景: 指标}}"""
+    output = {}
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+        OPERATION_LOG={'ASYNC': False},
+        IMPORT_JOBS={'ASYNC': False},
+        MEDIA_ROOT=media_root,
+    ):
+        try:
+            with transaction.atomic():
+                dataset = seed_dataset(forms=forms, items_per_form=items_per_form, logs=logs, seed=seed)
+                user = User.objects.get(pk=dataset['user_id'])
+                user.is_superuser = True
+                user.save(update_fields=['is_superuser'])
+
+                client = APIClient()
+                client.force_authenticate(user)
+                suite = BenchmarkSuite(client, dataset, import_rows=import_rows)
+
+                results = {}
+                for name in BenchmarkSuite.SCENARIOS:
+                    if only and name not in only:
+                        continue
+                    results[name] = measure(getattr(suite, name)(), repeat=repeat)
+                    if name in suite.import_rows:
+                        results[name]['rows'] = suite.import_rows[name]
+
+                output = {
+                    'dataset': {key: value for key, value in dataset.items() if key not in ('form_ids', 'user_id')},
+                    'results': results,
+                }
+                raise _Rollback
+        except _Rollback:
+            pass
+    return output
+
+
+def compare_results(baseline, current, threshold=0.2):
+    """
+    对比两次结果，返回 (行列表, 是否有退化)。
+    p50/p95 延迟、查询次数、峰值内存任一项增长超过 threshold（比例）视为退化。
+    """
+    rows = []
+    regressed = False
+    for name, metrics in current.get('results', {}).items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            rows.append((name, '新增场景', '', '', False))
+            continue
+        for key in ('p50_ms', 'p95_ms', 'queries', 'peak_memory_kb'):
+            old, new = before.get(key, 0), metrics.get(key, 0)
+            change = (new - old) / old if old else (1.0 if new else 0.0)
+            worse = change > threshold if key != 'queries' else new > old
+            regressed = regressed or worse
+            rows.append((name, key, old, new, worse))
+    return rows, regressed
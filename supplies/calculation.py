@@ -0,0 +1,289 @@
+"""
+需求计算引擎
+
+- 计算核心（calculate_demand / calculate_net_demand）同时支持标量和 NumPy 数组，
+  unified_calculation、calculate_demands、add_usage_station 共用同一套公式和取整规则。
+- FormDemandCalculator 把一个申请表的全部计算项目载入数组，一次性向量化计算
+  当月需求/站、当月总需求、实际订购数量，再用一条 bulk_update 写回数据库。
+  多站别项目的 multi_station_data 会被展开成扁平数组，与单站别项目一起计算。
+"""
+import math
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ApplicationForm, DynamicCalculationItem
+from .summary import schedule_form_summary
+
+
+class CalculationError(ValueError):
+    """计算参数不合法"""
+
+
+def _to_number(value):
+    """JSON中的数值可能是字符串或空值，无法解析或不是有限数（inf/nan）时按0处理"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return number if math.isfinite(number) else 0.0
+
+
+def _finite(values):
+    """转换成 float64 数组，inf/nan 按0处理（否则转换成 int64 时得到无意义的值）"""
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isfinite(values), values, 0.0)
+
+
+def _station_values(data, key, count):
+    """取出某个站别参数列表，长度对齐到站别数量（缺失补0）"""
+    values = data.get(key) or []
+    return [_to_number(values[i]) if i < len(values) else 0.0 for i in range(count)]
+
+
+def _as_result(values, scalar):
+    return int(values) if scalar else values
+
+
+def calculate_demand(monthly_capacity, usage_per_set, usage_count):
+    """
+    当月需求/站 = 当月产能 × 每臺機用量 ÷ 使用次数
+    四舍五入取整（与前端 Math.round 一致），使用次数<=0 时为0，inf/nan 参数按0处理。
+    参数可以是标量（返回int）或数组（返回int64数组）。
+    """
+    capacity = _finite(monthly_capacity)
+    per_set = _finite(usage_per_set)
+    count = _finite(usage_count)
+
+    valid = count > 0
+    safe_count = np.where(valid, count, 1)
+    demand = _finite(np.where(valid, np.floor(capacity * per_set / safe_count + 0.5), 0)).astype(np.int64)
+    return _as_result(demand, demand.ndim == 0)
+
+
+def calculate_net_demand(monthly_demand, min_stock):
+    """当月总需求 = max(0, 当月需求/站 - 最低库存)，支持标量或数组"""
+    demand = np.asarray(monthly_demand, dtype=np.int64)
+    net_demand = np.maximum(0, demand - _finite(min_stock).astype(np.int64))
+    return _as_result(net_demand, net_demand.ndim == 0)
+
+
+def _demand_arrays(monthly_capacity, usage_per_set, usage_count, min_stock):
+    """按数组计算需求、总需求和实际订购数量（实际订购数量默认等于当月总需求）"""
+    demand = calculate_demand(monthly_capacity, usage_per_set, usage_count)
+    net_demand = calculate_net_demand(demand, min_stock)
+    return demand, net_demand, net_demand.copy()
+
+
+class FormDemandCalculator:
+    """按申请表批量计算需求量"""
+
+    load_fields = (
+        'id', 'form_id', 'no', 'material_name',
+        'usage_per_set', 'usage_count', 'monthly_capacity', 'min_stock',
+        'is_multi_station', 'multi_station_data',
+    )
+    update_fields = [
+        'monthly_demand', 'monthly_net_demand', 'actual_order', 'multi_station_data', 'updated_at', 'change_version',
+    ]
+
+    def __init__(self, form_id):
+        self.form_id = form_id
+
+    def load_items(self):
+        return list(
+            DynamicCalculationItem.objects
+            .filter(form_id=self.form_id)
+            .only(*self.load_fields)
+            .order_by('no')
+        )
+
+    def run(self):
+        """计算并写回，返回更新项目的摘要列表（与原接口返回格式一致）"""
+        items = self.load_items()
+        single_items = [item for item in items if not (item.is_multi_station and item.multi_station_data)]
+        multi_items = [item for item in items if item.is_multi_station and item.multi_station_data]
+        multi_ids = {item.id for item in multi_items}
+
+        now = timezone.now()
+        changed = self._calculate_single(single_items, now) + self._calculate_multi(multi_items, now)
+        changed.sort(key=lambda item: item.no)
+
+        if changed:
+            with transaction.atomic():
+                version = ApplicationForm.claim_change_version(self.form_id)
+                for item in changed:
+                    item.change_version = version
+                DynamicCalculationItem.objects.bulk_update(changed, self.update_fields)
+                schedule_form_summary(self.form_id)
+
+        return [
+            {
+                'id': item.id,
+                'material_name': item.material_name,
+                'monthly_demand': item.monthly_demand,
+                'monthly_net_demand': item.monthly_net_demand,
+                'actual_order': item.actual_order,
+                'is_multi_station': item.id in multi_ids,
+            }
+            for item in changed
+        ]
+
+    def _calculate_single(self, items, now):
+        if not items:
+            return []
+
+        usage_count = np.array([item.usage_count for item in items], dtype=np.float64)
+        demand, net_demand, actual_order = _demand_arrays(
+            np.array([item.monthly_capacity for item in items], dtype=np.float64),
+            np.array([item.usage_per_set for item in items], dtype=np.float64),
+            usage_count,
+            np.array([item.min_stock for item in items], dtype=np.float64),
+        )
+
+        # 使用次数为0的单站别项目保持原值不更新
+        changed = []
+        for index in np.flatnonzero(usage_count > 0):
+            item = items[index]
+            item.monthly_demand = int(demand[index])
+            item.monthly_net_demand = int(net_demand[index])
+            item.actual_order = int(actual_order[index])
+            item.updated_at = now
+            changed.append(item)
+        return changed
+
+    def _calculate_multi(self, items, now):
+        if not items:
+            return []
+
+        counts = np.array([len(item.multi_station_data.get('stations', [])) for item in items], dtype=np.int64)
+
+        def flatten(key):
+            return np.array(
+                [value for item, count in zip(items, counts) for value in _station_values(item.multi_station_data, key, count)],
+                dtype=np.float64,
+            )
+
+        demand, net_demand, actual_order = _demand_arrays(
+            flatten('monthly_capacity'),
+            flatten('usage_per_set'),
+            flatten('usage_count'),
+            flatten('min_stock'),
+        )
+
+        # 扁平数组按项目切回各自的站别列表，并按项目汇总
+        owner = np.repeat(np.arange(len(items)), counts)
+        splits = np.cumsum(counts)[:-1]
+        totals = {
+            'monthly_demand': np.bincount(owner, weights=demand, minlength=len(items)),
+            'monthly_net_demand': np.bincount(owner, weights=net_demand, minlength=len(items)),
+            'actual_order': np.bincount(owner, weights=actual_order, minlength=len(items)),
+        }
+        per_station = {
+            'monthly_demand': np.split(demand, splits),
+            'monthly_net_demand': np.split(net_demand, splits),
+            'actual_order': np.split(actual_order, splits),
+        }
+
+        for index, item in enumerate(items):
+            for key in ('monthly_demand', 'monthly_net_demand', 'actual_order'):
+                item.multi_station_data[key] = per_station[key][index].tolist()
+                setattr(item, key, int(round(totals[key][index])))
+            item.updated_at = now
+        return list(items)
+
+
+# ================================
+# 🆕 统一计算（单条 / 批量）
+# ================================
+
+UNIFIED_REQUIRED_FIELDS = ('monthly_capacity', 'usage_per_set', 'usage_count')
+UNIFIED_OPTIONAL_FIELDS = ('max_capacity', 'min_capacity', 'current_stock', 'unit_price')
+
+
+def _parse_number(key, value):
+    if value is None or value == '':
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise CalculationError(f'参数 {key} 必须是有效数字')
+    if not math.isfinite(number):
+        # 'inf'、'-inf'、'nan'、'1e400' 等能被 float 解析，但不是有效的计算参数
+        raise CalculationError(f'参数 {key} 必须是有效数字')
+    return int(number) if number.is_integer() else number
+
+
+def _parse_unified_params(params):
+    if not isinstance(params, dict):
+        raise CalculationError('计算参数格式错误')
+    if not all(params.get(key) for key in UNIFIED_REQUIRED_FIELDS):
+        raise CalculationError('缺少必要参数: monthly_capacity, usage_per_set, usage_count')
+    return {
+        key: _parse_number(key, params.get(key))
+        for key in UNIFIED_REQUIRED_FIELDS + UNIFIED_OPTIONAL_FIELDS
+    }
+
+
+def unified_calculate_many(param_list):
+    """
+    批量统一计算：计算当月需求/站、最高/最低库存、总需求和需求金额
+    返回与输入等长的列表，每项为结果字典，参数不合法的项为 {'error': ...}
+    """
+    parsed = []
+    for params in param_list:
+        try:
+            parsed.append(_parse_unified_params(params))
+        except CalculationError as e:
+            parsed.append(e)
+
+    valid = [p for p in parsed if not isinstance(p, CalculationError)]
+    if valid:
+        def column(key):
+            return np.array([p[key] or 0 for p in valid], dtype=np.float64)
+
+        usage_per_set = column('usage_per_set')
+        usage_count = column('usage_count')
+        monthly_demands = calculate_demand(column('monthly_capacity'), usage_per_set, usage_count)
+        max_inventories = calculate_demand(column('max_capacity'), usage_per_set, usage_count)
+        min_inventories = calculate_demand(column('min_capacity'), usage_per_set, usage_count)
+
+    results = []
+    index = 0
+    for p in parsed:
+        if isinstance(p, CalculationError):
+            results.append({'error': str(p)})
+            continue
+
+        monthly_demand = int(monthly_demands[index])
+        result = {'monthly_demand': monthly_demand}
+
+        if p['max_capacity'] and p['usage_count'] > 0:
+            result['max_inventory'] = int(max_inventories[index])
+            # 安全库存等于最高库存
+            result['safety_stock'] = result['max_inventory']
+
+        if p['min_capacity'] and p['usage_count'] > 0:
+            result['min_inventory'] = int(min_inventories[index])
+            # 验证安全库存是否在合理范围内
+            if 'safety_stock' in result and result['safety_stock'] < result['min_inventory']:
+                result = {'error': f'安全库存({result["safety_stock"]})不能低于最低库存({result["min_inventory"]})'}
+
+        if 'error' not in result:
+            if p['current_stock'] is not None:
+                result['net_demand'] = max(0, monthly_demand - p['current_stock'])
+            if p['unit_price']:
+                result['demand_value'] = monthly_demand * float(p['unit_price'])
+
+        results.append(result)
+        index += 1
+    return results
+
+
+def unified_calculate(params):
+    """单条统一计算，参数不合法时抛出 CalculationError"""
+    result = unified_calculate_many([params])[0]
+    if 'error' in result:
+        raise CalculationError(result['error'])
+    return result
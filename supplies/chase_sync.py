@@ -0,0 +1,115 @@
+"""
+进料需求(chase_data)与實際請購數量(actual_order)的同步
+
+单个项目和整张申请表共用 apply_chase_sync；整表同步只写回真正变化的行，
+并且只更新相关的列，避免把整行（含所有JSON大字段）重新写一遍。
+"""
+import copy
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ApplicationForm, DynamicCalculationItem
+from .summary import schedule_form_summary
+
+SYNC_DIRECTIONS = ('chase_to_order', 'order_to_chase')
+CHASE_WEEKS = ('W01', 'W02', 'W03', 'W04')
+
+
+def _sum_chase(chase_data):
+    total = 0
+    for value in chase_data.values():
+        try:
+            total += int(float(value))
+        except (TypeError, ValueError):
+            continue
+    return total
+
+
+def apply_chase_sync(item, direction, target_month_key, target_week='W02'):
+    """
+    在内存中对单个项目执行同步，返回该项目对应月份的进料需求
+    - chase_to_order: 进料需求合计 -> 實際請購數量（多站别项目平均分配到各站别）
+    - order_to_chase: 實際請購數量 -> 用户选择的那一周的进料需求
+    """
+    if direction == 'chase_to_order':
+        chase_data = (item.chase_data or {}).get(target_month_key, {})
+        total_chase = _sum_chase(chase_data)
+
+        if item.is_multi_station and item.multi_station_data:
+            # 多站别项目：平均分配进料需求
+            station_count = len(item.multi_station_data.get('stations', []))
+            if station_count > 0:
+                per_station_order = total_chase // station_count
+                item.multi_station_data['actual_order'] = [per_station_order] * station_count
+                item.actual_order = total_chase
+        else:
+            # 单站别项目
+            item.actual_order = total_chase
+        return chase_data
+
+    # order_to_chase: 根据用户选择的周安排實際請購數量
+    actual_order = item.actual_order or 0
+    chase_data = {week: actual_order if week == target_week else 0 for week in CHASE_WEEKS}
+    if not item.chase_data:
+        item.chase_data = {}
+    item.chase_data[target_month_key] = chase_data
+    return chase_data
+
+
+class FormChaseSync:
+    """整张申请表的批量同步，只用一次 bulk_update 写回变化的行"""
+
+    load_fields = ('id', 'no', 'material_name', 'actual_order', 'chase_data', 'multi_station_data', 'is_multi_station')
+    update_fields = ['actual_order', 'chase_data', 'multi_station_data', 'updated_at', 'change_version']
+
+    def __init__(self, form_id, direction, target_month_key, target_week='W02'):
+        self.form_id = form_id
+        self.direction = direction
+        self.target_month_key = target_month_key
+        self.target_week = target_week
+
+    def run(self):
+        items = (
+            DynamicCalculationItem.objects
+            .filter(form_id=self.form_id)
+            .only(*self.load_fields)
+            .order_by('no')
+        )
+
+        now = timezone.now()
+        changed = []
+        updated_items = []
+        for item in items:
+            before = (item.actual_order, copy.deepcopy(item.chase_data), copy.deepcopy(item.multi_station_data))
+            chase_data = apply_chase_sync(item, self.direction, self.target_month_key, self.target_week)
+            if (item.actual_order, item.chase_data, item.multi_station_data) == before:
+                continue
+
+            item.updated_at = now
+            changed.append(item)
+            updated_items.append({
+                'id': item.id,
+                'material_name': item.material_name,
+                'previous_actual_order': before[0],
+                'actual_order': item.actual_order,
+                'chase_data': chase_data,
+            })
+
+        if changed:
+            with transaction.atomic():
+                version = ApplicationForm.claim_change_version(self.form_id)
+                for item in changed:
+                    item.change_version = version
+                DynamicCalculationItem.objects.bulk_update(changed, self.update_fields)
+                schedule_form_summary(self.form_id)
+
+        total_count = len(items)
+        return {
+            'updated_items': updated_items,
+            'summary': {
+                'total_count': total_count,
+                'updated_count': len(changed),
+                'unchanged_count': total_count - len(changed),
+            },
+        }
@@ -0,0 +1,18 @@
+"""
+申请表模板配置缓存的失效（缓存实现见 core.http_cache）
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.http_cache import bump_version
+
+from .models import ApplicationTemplate
+
+ACTIVE_TEMPLATES_CACHE = 'active-templates'
+
+
+@receiver(post_save, sender=ApplicationTemplate)
+@receiver(post_delete, sender=ApplicationTemplate)
+def _template_changed(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(ACTIVE_TEMPLATES_CACHE))
@@ -0,0 +1,161 @@
+"""
+计算项目增量同步（by_form?since=）
+
+客户端保存上一次返回的 next_since，下次请求作为 since 传回，只取：
+- items:      游标之后新建或修改过的项目
+- tombstones: 游标之后删除的项目，以及被 bulk_hide 隐藏的项目（不含 include_hidden 时）
+
+游标按提交顺序递增，不使用写入时在 Python 中取的 updated_at：
+每次写入计算项目都在同一事务中递增申请表的 data_version（ApplicationForm.claim_change_version），
+写入的项目和删除记录带上新的版本号（change_version）。申请表行锁让同一申请表的写入事务
+按提交顺序取得版本号，读到已提交的版本号 V 时，change_version <= V 的写入都已提交，
+因此 next_since 取查询明细之前读到的 V，下次只返回 change_version > V 的行，
+运行时间再长的导入/重算事务也不会漏掉。
+游标格式为 v<版本号>-<签发时间戳>。签发时间早于墓碑保留期，或者是旧版客户端传回的时间格式时，
+返回 reset=True 和完整数据，客户端整表替换。
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .form_version import get_form_version
+from .models import ApplicationForm, CalculationItemTombstone, DynamicCalculationItem
+from .summary import schedule_form_summary
+
+DEFAULT_SETTINGS = {
+    'TOMBSTONE_DAYS': 7,
+}
+
+_CURSOR_RE = re.compile(r'^v(\d+)-(\d+)$')
+
+
+def get_delta_sync_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'DELTA_SYNC', {})}
+
+
+def format_cursor(version, issued_at):
+    return f'v{version}-{int(issued_at.timestamp())}'
+
+
+def parse_since(value):
+    """
+    解析 since，返回 (版本号, 签发时间)；无法解析时抛出 ValueError。
+    旧版游标（ISO 8601 时间或 Unix 时间戳）无法换算成版本号，版本号为 None（按 reset 处理）。
+    """
+    value = (value or '').strip()
+    match = _CURSOR_RE.match(value)
+    if match:
+        return int(match.group(1)), datetime.fromtimestamp(int(match.group(2)), tz=dt_timezone.utc)
+    try:
+        float(value)
+    except ValueError:
+        # 查询参数中未编码的时区 + 号会变成空格
+        if parse_datetime(value) is None and parse_datetime(value.replace(' ', '+')) is None:
+            raise ValueError(f'无法解析的 since 参数: {value}')
+    return None, None
+
+
+def stamp_calculation_items(queryset, **fields):
+    """
+    queryset.update(**fields)，按申请表同时写入本事务的 change_version 和 updated_at，返回更新条数。
+    涉及多个申请表时按 id 顺序加锁，避免并发的批量操作互相死锁。
+    """
+    now = timezone.now()
+    updated = 0
+    with transaction.atomic():
+        form_ids = sorted(set(queryset.order_by().values_list('form_id', flat=True)))
+        for form_id in form_ids:
+            updated += queryset.filter(form_id=form_id).update(
+                change_version=ApplicationForm.claim_change_version(form_id), updated_at=now, **fields
+            )
+    return updated
+
+
+def purge_tombstones(days=None):
+    """删除超过保留期的墓碑记录，返回删除条数"""
+    days = get_delta_sync_settings()['TOMBSTONE_DAYS'] if days is None else days
+    deleted, _ = CalculationItemTombstone.objects.filter(
+        deleted_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()
+    return deleted
+
+
+class CalculationItemDelta:
+    """一个申请表从 since（上次返回的 next_since）开始的增量；since 无法解析时抛出 ValueError"""
+
+    def __init__(self, form_id, since, include_hidden=False):
+        self.form_id = form_id
+        self.since = since
+        self.since_version, issued_at = parse_since(since)
+        self.include_hidden = include_hidden
+        config = get_delta_sync_settings()
+        now = timezone.now()
+        # 先读版本号再读明细：之后提交的写入版本号更大，下次请求会返回
+        self.version = get_form_version(form_id) or 0
+        self.next_since = format_cursor(self.version, now)
+        self.reset = self.since_version is None or issued_at < now - timedelta(days=config['TOMBSTONE_DAYS'])
+
+    def changed_items(self):
+        """需要返回给客户端的项目（未排序、未裁剪字段的查询集）"""
+        queryset = DynamicCalculationItem.objects.select_related('form').filter(form_id=self.form_id)
+        if not self.reset:
+            queryset = queryset.filter(change_version__gt=self.since_version)
+        if not self.include_hidden:
+            queryset = queryset.filter(is_visible=True)
+        return queryset
+
+    def tombstones(self):
+        if self.reset:
+            return []
+        tombstones = [
+            {'id': item_id, 'reason': 'deleted', 'at': deleted_at}
+            for item_id, deleted_at in CalculationItemTombstone.objects.filter(
+                form_id=self.form_id, change_version__gt=self.since_version
+            ).values_list('item_id', 'deleted_at')
+        ]
+        if not self.include_hidden:
+            tombstones += [
+                {'id': item_id, 'reason': 'hidden', 'at': updated_at}
+                for item_id, updated_at in DynamicCalculationItem.objects.filter(
+                    form_id=self.form_id, is_visible=False, change_version__gt=self.since_version
+                ).values_list('id', 'updated_at')
+            ]
+        return tombstones
+
+    def response_data(self, items):
+        return {
+            'since': self.since,
+            'next_since': self.next_since,
+            'reset': self.reset,
+            'items': items,
+            'tombstones': self.tombstones(),
+        }
+
+
+def delete_calculation_items(queryset):
+    """
+    删除计算项目并批量写入墓碑，返回删除条数。
+    计算项目没有删除信号，queryset.delete() 走快速删除（一条 DELETE，不加载整行）：
+    先读出 (id, form_id)，删除后一次 bulk_create 墓碑（带本事务的 change_version），
+    并登记统计汇总刷新；数据版本在本事务中递增。
+    """
+    with transaction.atomic():
+        rows = list(queryset.order_by().values_list('id', 'form_id'))
+        if not rows:
+            return 0
+        form_ids = sorted({form_id for _, form_id in rows})
+        versions = {form_id: ApplicationForm.claim_change_version(form_id) for form_id in form_ids}
+        deleted, _ = queryset.delete()
+        CalculationItemTombstone.objects.bulk_create(
+            [
+                CalculationItemTombstone(form_id=form_id, item_id=item_id, change_version=versions[form_id])
+                for item_id, form_id in rows
+            ],
+            batch_size=1000,
+        )
+        schedule_form_summary(*form_ids)
+    return deleted
@@ -0,0 +1,118 @@
+"""
+只读流式 Excel 读取
+
+基于 openpyxl 的 read_only 模式 + iter_rows(values_only=True)：
+- 不加载单元格样式，也不为每个单元格创建 Cell 对象
+- 每个工作表的表头只解析一次（支持多行表头拼接），数据行按需逐行产出
+- 多行表头中合并单元格只有左上角有值，与 pandas header=[0,1] 一致，
+  在同一个上级标题范围内向右填充（fill_merged_headers）
+- read_frame 读取整个工作表为只含单元格值的 DataFrame：importers 需要整表去重、整表替换，
+  导入任务仍按整表处理，内存与工作表的行数成正比（但不再包含单元格对象和样式）。
+  max_rows 限制读取的行数，超过时抛出 SheetTooLarge；run_benchmarks 的
+  import_calculation / import_calculation_large 场景记录两种行数下的峰值内存
+"""
+import openpyxl
+import pandas as pd
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and value.strip() == '')
+
+
+class SheetTooLarge(ValueError):
+    """工作表数据行数超过 max_rows"""
+
+
+def fill_merged_headers(headers):
+    """
+    向右填充多行表头中合并单元格留下的空白（与 pandas 读取 header=[0,1] 时的处理一致）：
+    空白单元格取左侧最近的标题，但只在上一行属于同一个标题的范围内填充
+    """
+    if len(headers) < 2:
+        return headers
+    width = max(len(row) for row in headers)
+    control = [True] * width
+    filled = []
+    for row in headers:
+        row = list(row) + [None] * (width - len(row))
+        last = row[0]
+        for index in range(1, width):
+            if not control[index]:
+                last = row[index]
+            if _is_blank(row[index]):
+                row[index] = last
+            else:
+                control[index] = False
+                last = row[index]
+        filled.append(row)
+    return filled
+
+
+def join_header(values):
+    """把多行表头中同一列的各级标题拼接成一个列名（去掉空格和空值）"""
+    return ''.join(str(value) for value in values if not _is_blank(value)).replace(' ', '')
+
+
+class SheetRows:
+    """单个工作表：columns 为解析好的列名，遍历时逐行产出 dict"""
+
+    def __init__(self, worksheet, header_rows=1, min_row=1):
+        self.title = worksheet.title
+        rows = worksheet.iter_rows(min_row=min_row, values_only=True)
+
+        headers = fill_merged_headers([row for _, row in zip(range(header_rows), rows)])
+        width = max((len(row) for row in headers), default=0)
+        self.columns = []
+        seen = {}
+        for index in range(width):
+            column = join_header(row[index] if index < len(row) else None for row in headers) or f'Unnamed:{index}'
+            # 与 pandas 一致，重复的列名加 .1、.2 后缀
+            if column in seen:
+                seen[column] += 1
+                column = f'{column}.{seen[column]}'
+            else:
+                seen[column] = 0
+            self.columns.append(column)
+        self._rows = rows
+
+    def __iter__(self):
+        width = len(self.columns)
+        for row in self._rows:
+            if all(_is_blank(value) for value in row):
+                continue
+            values = row[:width] + (None,) * (width - len(row))
+            yield dict(zip(self.columns, values))
+
+
+class WorkbookReader:
+    """只读工作簿，使用完需要 close()（或用 with 语句）"""
+
+    def __init__(self, file):
+        self.workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+
+    @property
+    def sheet_names(self):
+        return self.workbook.sheetnames
+
+    def sheet(self, sheet_name=None, header_rows=1, min_row=1):
+        worksheet = self.workbook[sheet_name] if sheet_name else self.workbook.active
+        return SheetRows(worksheet, header_rows=header_rows, min_row=min_row)
+
+    def read_frame(self, sheet_name=None, header_rows=1, min_row=1, max_rows=None):
+        """读取整个工作表为 DataFrame（只保存单元格的值），数据行超过 max_rows 时抛出 SheetTooLarge"""
+        sheet = self.sheet(sheet_name, header_rows=header_rows, min_row=min_row)
+        rows = []
+        for row in sheet:
+            if max_rows is not None and len(rows) >= max_rows:
+                raise SheetTooLarge(f'工作表 {sheet.title} 超过 {max_rows} 行，请拆分后导入')
+            rows.append(row)
+        return pd.DataFrame(rows, columns=sheet.columns)
+
+    def close(self):
+        self.workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
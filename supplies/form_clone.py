@@ -0,0 +1,185 @@
+"""
+申请表复制（月初按上月申请表新建本月申请表）
+
+FormCloner 在一个事务中把源申请表的计算项目、耗材项目、预测数据复制到目标申请表：
+- 默认路径：values() 一次读出源数据，bulk_create 分批写入
+- PostgreSQL 快速路径：INSERT ... SELECT 在数据库内完成复制，数据不经过 Python
+
+计算项目保留可见状态（隐藏的项目复制后仍然隐藏，可以用 bulk_show 恢复）和多站别设置；
+多站别数据只复制站别、用量、产能等设置，各站别的需求和订购（STATION_RESET_KEYS）
+与单站别项目的需求、订购一样不复制，由需求计算重新生成。
+
+目标申请表已有数据时，复制的行接在已有序号之后（计算项目 No. 由 sequences 分配，
+耗材项目序号接在最大序号之后），并保持源表的顺序。
+复制会锁住目标申请表行，同一目标的并发复制依次执行。
+bulk_create / 原生 SQL 不触发 post_save 信号，统计汇总和数据版本在事务提交后统一刷新。
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .form_version import schedule_form_version
+from .models import ApplicationForm, DynamicCalculationItem, DynamicForecastData, DynamicSupplyItem
+from .sequences import advance_item_numbers, allocate_item_numbers
+from .summary import schedule_form_summary
+
+DEFAULT_SETTINGS = {
+    'BATCH_SIZE': 1000,
+    'INSERT_SELECT_VENDORS': ('postgresql',),
+}
+
+# 计算项目只复制基础信息、价格采购信息、库存设置、可见状态和多站别设置，需求、订购、月度明细等取默认值
+CALCULATION_COPY_FIELDS = [
+    'material_name', 'usage_station', 'usage_per_set', 'usage_count', 'monthly_capacity',
+    'unit_price', 'purchaser', 'moq', 'min_stock', 'max_stock',
+    'linked_supply_item_id', 'linked_material', 'is_visible', 'is_multi_station', 'multi_station_data',
+]
+
+# 多站别数据中按站别记录的计算结果，复制时去掉
+STATION_RESET_KEYS = ('monthly_demand', 'monthly_net_demand', 'actual_order')
+
+SUPPLY_COPY_FIELDS = [
+    'material_description', 'unit', 'purchaser', 'unit_price', 'max_safety_stock', 'min_safety_stock',
+    'moq', 'lead_time', 'remark', 'monthly_data', 'usage_per_set', 'usage_count', 'monthly_capacity',
+    'enable_auto_calculation',
+]
+
+FORECAST_COPY_FIELDS = ['name', 'forecast_data']
+
+CLONE_KINDS = ('calculation_items', 'supply_items', 'forecasts')
+
+
+def get_form_clone_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'FORM_CLONE', {})}
+
+
+class FormCloner:
+    """把 source_form_id 的明细数据复制到 target_form_id"""
+
+    def __init__(self, source_form_id, target_form_id):
+        self.source_form_id = int(source_form_id)
+        self.target_form_id = int(target_form_id)
+        config = get_form_clone_settings()
+        self.batch_size = config['BATCH_SIZE']
+        self.insert_select = connection.vendor in config['INSERT_SELECT_VENDORS']
+
+    def clone(self, kinds=CLONE_KINDS):
+        """复制 kinds 指定的数据，返回 {kind: 复制条数}；申请表不存在时抛出 ApplicationForm.DoesNotExist"""
+        unknown = set(kinds) - set(CLONE_KINDS)
+        if unknown:
+            raise ValueError(f'不支持的复制类型: {", ".join(sorted(unknown))}')
+
+        with transaction.atomic():
+            ApplicationForm.objects.select_for_update().only('id').get(id=self.target_form_id)
+            if not ApplicationForm.objects.filter(id=self.source_form_id).exists():
+                raise ApplicationForm.DoesNotExist(f'源申请表 {self.source_form_id} 不存在')
+
+            result = {kind: getattr(self, f'copy_{kind}')() for kind in kinds}
+            if result.get('calculation_items'):
+                schedule_form_summary(self.target_form_id)
+            if any(result.values()):
+                schedule_form_version(self.target_form_id)
+        return result
+
+    def copy_calculation_items(self):
+        source = DynamicCalculationItem.objects.filter(form_id=self.source_form_id)
+        count = source.count()
+        if not count:
+            return 0
+        numbers = allocate_item_numbers(self.target_form_id, count)
+        # 复制的项目带上本事务的版本号，增量同步按提交顺序返回
+        version = ApplicationForm.claim_change_version(self.target_form_id)
+        copied = self._copy(
+            DynamicCalculationItem, CALCULATION_COPY_FIELDS, number_field='no', first_number=numbers.start,
+            values={'change_version': version}, drop_keys={'multi_station_data': STATION_RESET_KEYS},
+        )
+        if copied > count:
+            # 计数之后源表又新增了项目，多出的序号超出了分配范围
+            advance_item_numbers(self.target_form_id, numbers.start + copied - 1)
+        return copied
+
+    def copy_supply_items(self):
+        last_serial = DynamicSupplyItem.objects.filter(form_id=self.target_form_id).aggregate(
+            last=Max('serial_number')
+        )['last'] or 0
+        return self._copy(DynamicSupplyItem, SUPPLY_COPY_FIELDS, number_field='serial_number', first_number=last_serial + 1)
+
+    def copy_forecasts(self):
+        return self._copy(DynamicForecastData, FORECAST_COPY_FIELDS)
+
+    def _copy(self, model, copy_fields, number_field=None, first_number=None, values=None, drop_keys=None):
+        """
+        values: 复制的行统一写入的字段值（不从源行复制）
+        drop_keys: {JSON 字段: 键}，复制时从 JSON 对象中去掉这些键
+        """
+        values = values or {}
+        drop_keys = drop_keys or {}
+        if self.insert_select:
+            return self._insert_select(model, copy_fields, number_field, first_number, values, drop_keys)
+        return self._bulk_create(model, copy_fields, number_field, first_number, values, drop_keys)
+
+    def _bulk_create(self, model, copy_fields, number_field, first_number, values, drop_keys):
+        rows = model.objects.filter(form_id=self.source_form_id).order_by(number_field or 'id').values(*copy_fields)
+        objs = []
+        for row in rows:
+            for field, keys in drop_keys.items():
+                if isinstance(row[field], dict):
+                    row[field] = {key: value for key, value in row[field].items() if key not in keys}
+            objs.append(model(form_id=self.target_form_id, **row, **values))
+        if number_field:
+            for offset, obj in enumerate(objs):
+                setattr(obj, number_field, first_number + offset)
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        return len(objs)
+
+    def _insert_select(self, model, copy_fields, number_field, first_number, values, drop_keys):
+        """
+        INSERT INTO 表 (...) SELECT ... FROM 表 WHERE form_id = 源申请表
+        未复制的字段写入模型默认值，序号字段按源顺序用 ROW_NUMBER() 重新编排
+        """
+        qn = connection.ops.quote_name
+        now = timezone.now()
+        columns, selects, params = [], [], []
+        for field in model._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            columns.append(qn(field.column))
+            if field.name == 'form':
+                selects.append('%s')
+                params.append(self.target_form_id)
+            elif field.name == number_field:
+                selects.append(f'%s - 1 + ROW_NUMBER() OVER (ORDER BY {qn(field.column)})')
+                params.append(first_number)
+            elif field.name in drop_keys:
+                sql, key_params = _json_without_keys(qn(field.column), drop_keys[field.name])
+                selects.append(sql)
+                params.extend(key_params)
+            elif field.name in copy_fields:
+                selects.append(qn(field.column))
+            elif field.name in values:
+                selects.append('%s')
+                params.append(field.get_db_prep_save(values[field.name], connection))
+            else:
+                value = now if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False) else field.get_default()
+                selects.append('%s')
+                params.append(field.get_db_prep_save(value, connection))
+
+        table = qn(model._meta.db_table)
+        form_column = qn(model._meta.get_field('form').column)
+        sql = (
+            f'INSERT INTO {table} ({", ".join(columns)}) '
+            f'SELECT {", ".join(selects)} FROM {table} WHERE {form_column} = %s'
+        )
+        if not number_field:
+            sql += f' ORDER BY {qn(model._meta.pk.column)}'
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*params, self.source_form_id])
+            return cursor.rowcount
+
+
+def _json_without_keys(column, keys):
+    """返回 (SQL, 参数)：去掉 JSON 对象中 keys 的表达式（PostgreSQL jsonb 用 - 运算符，SQLite / MySQL 用 JSON_REMOVE）"""
+    if connection.vendor == 'postgresql':
+        return column + ' - %s::text' * len(keys), list(keys)
+    return f'JSON_REMOVE({column}, {", ".join(["%s"] * len(keys))})', [f'$.{key}' for key in keys]
@@ -0,0 +1,98 @@
+"""
+申请表明细数据版本（ApplicationForm.data_version）
+
+表内耗材项目、计算项目、预测数据的任何写入都会让该表的版本号加一，
+by_form 接口用版本号生成 ETag：请求带 If-None-Match 且版本未变时，
+只查一次申请表的版本号就返回 304，不再读取明细表。
+
+耗材项目、预测数据的单条保存/删除通过信号、批量写入（bulk_create / bulk_update / update）
+通过显式调用 schedule_form_version 登记，在事务提交后每个申请表只递增一次。
+计算项目的写入在写入事务中调用 ApplicationForm.claim_change_version 递增版本
+（DynamicCalculationItem.save、批量写入路径、delta_sync.delete_calculation_items），
+新版本号同时作为增量同步的游标，见 delta_sync。
+明细接口返回申请表的 name / code（form_name / form_code），修改这两个字段也会递增版本；
+ApplicationForm.save() 不写回 data_version 字段，整行保存不会覆盖并发的递增。
+登记的版本在数据提交之后才递增，读到的版本号不会比数据新，客户端最多多取一次数据。
+"""
+import hashlib
+import threading
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .models import ApplicationForm, DynamicForecastData, DynamicSupplyItem
+
+
+def bump_form_versions(form_ids):
+    form_ids = list(form_ids)
+    if form_ids:
+        ApplicationForm.objects.filter(id__in=form_ids).update(data_version=F('data_version') + 1)
+
+
+def get_form_version(form_id):
+    """返回申请表的数据版本，申请表不存在时返回 None"""
+    try:
+        return ApplicationForm.objects.filter(pk=form_id).values_list('data_version', flat=True).first()
+    except (TypeError, ValueError):
+        return None
+
+
+def form_etag(form_id, version, kind, variant=''):
+    """同一申请表的不同接口（kind）和查询参数（variant）使用不同的 ETag"""
+    digest = hashlib.md5(f'{kind}:{form_id}:{version}:{variant}'.encode('utf-8')).hexdigest()
+    return quote_etag(digest)
+
+
+def check_form_etag(request, form_id, kind):
+    """
+    返回 (etag, 304 响应或 None)。
+    申请表不存在时 etag 为 None，由调用方按原来的逻辑处理。
+    """
+    version = get_form_version(form_id)
+    if version is None:
+        return None, None
+    etag = form_etag(form_id, version, kind, request.META.get('QUERY_STRING', ''))
+    return etag, get_conditional_response(request, etag=etag)
+
+
+# ================================
+# 事务提交后递增版本（同一事务内的多次写入只递增一次）
+# ================================
+
+_pending = threading.local()
+
+
+def _pending_form_ids():
+    if not hasattr(_pending, 'form_ids'):
+        _pending.form_ids = set()
+    return _pending.form_ids
+
+
+def _flush():
+    form_ids = set(_pending_form_ids())
+    _pending.form_ids = set()
+    bump_form_versions(form_ids)
+
+
+def schedule_form_version(*form_ids):
+    """登记需要递增版本的申请表，事务提交后执行"""
+    _pending_form_ids().update(int(form_id) for form_id in form_ids if form_id)
+    transaction.on_commit(_flush)
+
+
+@receiver(post_save, sender=DynamicSupplyItem)
+@receiver(post_delete, sender=DynamicSupplyItem)
+@receiver(post_save, sender=DynamicForecastData)
+@receiver(post_delete, sender=DynamicForecastData)
+def _form_item_changed(sender, instance, **kwargs):
+    schedule_form_version(instance.form_id)
+
+
+@receiver(post_save, sender=ApplicationForm)
+def _form_changed(sender, instance, created, **kwargs):
+    if not created and instance.item_payload_changed():
+        schedule_form_version(instance.id)
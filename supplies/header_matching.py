@@ -0,0 +1,109 @@
+"""
+Excel 表头匹配
+
+关键字在创建匹配器时只规范化一次（去掉换行、空格并转小写），
+每个工作表只解析一次"字段 -> 列"的对应关系，导入时按固定的列名/位置取值。
+
+匹配策略（与各导入入口原来的规则一致）：
+- 'first_column'  按列的顺序，取第一个包含任一关键字的列
+- 'first_keyword' 按关键字的优先级，取第一个包含该关键字的列
+- 'best_score'    取匹配度（关键字长度 / 列名长度）最高的列，相同分数取靠前的列
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ('first_column', 'first_keyword', 'best_score')
+
+
+def normalize_header(value):
+    return str(value).replace('\n', '').replace(' ', '').lower()
+
+
+class HeaderMapping:
+    """一个工作表的匹配结果"""
+
+    def __init__(self, columns, positions, missing):
+        self.positions = positions
+        self.columns = {field: columns[index] for field, index in positions.items()}
+        self.missing = missing
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def get(self, field, default=None):
+        return self.columns.get(field, default)
+
+
+class HeaderMatcher:
+    """按字段配置的关键字匹配列名"""
+
+    def __init__(self, field_keywords, strategy='first_column', normalize=True):
+        if strategy not in STRATEGIES:
+            raise ValueError(f'未知的匹配策略: {strategy}')
+        self.strategy = strategy
+        self.normalize = normalize
+        self.field_keywords = {
+            field: tuple(dict.fromkeys(self._normalize(keyword) for keyword in keywords))
+            for field, keywords in field_keywords.items()
+        }
+
+    def _normalize(self, value):
+        return normalize_header(value) if self.normalize else str(value)
+
+    def resolve(self, columns):
+        """解析列名，返回 HeaderMapping（字段 -> 列位置 / 列名，以及缺失的字段）"""
+        columns = list(columns)
+        normalized = [self._normalize(column) for column in columns]
+        positions = {}
+        missing = []
+        for field, keywords in self.field_keywords.items():
+            index = getattr(self, f'_match_{self.strategy}')(normalized, keywords)
+            if index is None:
+                missing.append(field)
+            else:
+                positions[field] = index
+
+        mapping = HeaderMapping(columns, positions, missing)
+        logger.debug(f"表头映射结果: {mapping.columns}，缺失: {missing}")
+        return mapping
+
+    @staticmethod
+    def _match_first_column(columns, keywords):
+        for index, column in enumerate(columns):
+            if any(keyword in column for keyword in keywords):
+                return index
+        return None
+
+    @staticmethod
+    def _match_first_keyword(columns, keywords):
+        for keyword in keywords:
+            for index, column in enumerate(columns):
+                if keyword in column:
+                    return index
+        return None
+
+    @staticmethod
+    def _match_best_score(columns, keywords):
+        best_index, best_score = None, 0
+        for index, column in enumerate(columns):
+            if not column:
+                continue
+            score = max((len(keyword) / len(column) for keyword in keywords if keyword in column), default=0)
+            if score > best_score:
+                best_index, best_score = index, score
+        return best_index
+
+
+class KeywordScorer:
+    """统计文本中包含的关键字个数（关键字预先转成小写）"""
+
+    def __init__(self, keywords):
+        self.keywords = tuple(keyword.lower() for keyword in keywords)
+
+    def score(self, texts):
+        total = 0
+        for text in texts:
+            text = str(text).lower()
+            total += sum(1 for keyword in self.keywords if keyword in text)
+        return total
@@ -0,0 +1,243 @@
+"""
+Excel 后台导入任务
+
+上传接口只保存文件并创建一条 status='pending' 的 ImportLog，立即返回任务ID；
+导入在后台线程池中执行，前端通过任务状态接口轮询进度。
+- 任务通过"pending -> running"的条件更新认领，进程内线程池和
+  process_import_jobs 管理命令（轮询数据库的独立 worker）可以同时工作，不会重复执行
+- 工作表整表读入内存（见 excel_reader），数据行超过 MAX_ROWS 的任务直接失败
+- ASYNC=False 时在当前线程中直接执行，测试环境可用 override_settings 关闭异步
+- 进程重启或崩溃时的遗留任务由 recover_stale_jobs 处理（提交新任务和 process_import_jobs 命令每轮调用）：
+  started_at 超过 STALE_SECONDS 仍为 running 的任务标记为失败（导入在一个事务中执行，
+  中断时数据已回滚，由用户重新上传）；创建超过 REQUEUE_SECONDS 仍为 pending 的任务
+  （进程内线程池的排队随进程重启丢失）重新提交，认领是条件更新，重复提交不会重复执行
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .excel_reader import WorkbookReader
+from .models import ImportLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'ASYNC': True,
+    'WORKERS': 2,
+    'UPLOAD_DIR': 'imports',
+    'STALE_SECONDS': 3600,
+    'REQUEUE_SECONDS': 300,
+    'MAX_ROWS': 50000,
+}
+
+TABLE_TYPES = ('management', 'calculation')
+
+
+def get_import_job_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'IMPORT_JOBS', {})}
+
+
+def update_progress(log, stage, **fields):
+    """更新任务阶段和进度（不覆盖其它字段），log 为 None 时忽略"""
+    if log is None:
+        return
+    fields['stage'] = stage
+    for name, value in fields.items():
+        setattr(log, name, value)
+    ImportLog.objects.filter(pk=log.pk).update(**fields)
+
+
+def create_import_job(uploaded_file, user, form_id=None, sheet_name='', table_type='', header_row=1):
+    """保存上传文件并创建导入任务"""
+    config = get_import_job_settings()
+    file_path = default_storage.save(f"{config['UPLOAD_DIR']}/{uploaded_file.name}", uploaded_file)
+    log = ImportLog.objects.create(
+        user=user,
+        file_name=uploaded_file.name,
+        result='等待导入',
+        status='pending',
+        stage='queued',
+        form_id=form_id,
+        sheet_name=sheet_name or '',
+        table_type=table_type or '',
+        file_path=file_path,
+        result_data={'header_row': header_row},
+    )
+    recover_stale_jobs()
+    import_job_runner.submit(log.id)
+    return log
+
+
+def claim_job(log_id):
+    """把任务从 pending 改为 running，返回是否认领成功"""
+    return ImportLog.objects.filter(pk=log_id, status='pending').update(
+        status='running', stage='reading', started_at=timezone.now()
+    ) == 1
+
+
+def fail_stale_jobs():
+    """把 started_at 超过 STALE_SECONDS 仍在 running 的任务标记为失败，返回处理的任务数"""
+    config = get_import_job_settings()
+    now = timezone.now()
+    stale = ImportLog.objects.filter(
+        status='running', started_at__lt=now - timedelta(seconds=config['STALE_SECONDS'])
+    )
+    count = 0
+    for log_id, file_path in stale.values_list('id', 'file_path'):
+        # 条件更新：任务在此期间完成时不覆盖结果
+        updated = ImportLog.objects.filter(pk=log_id, status='running').update(
+            status='failed',
+            success=False,
+            result='导入失败: 任务执行超时或进程已退出，请重新上传',
+            finished_at=now,
+        )
+        if updated:
+            count += 1
+            if file_path and default_storage.exists(file_path):
+                default_storage.delete(file_path)
+            logger.warning(f"导入任务 {log_id} 执行超时，已标记为失败")
+    return count
+
+
+def requeue_pending_jobs():
+    """
+    重新提交创建超过 REQUEUE_SECONDS 仍在排队的任务，返回任务ID列表。
+    ASYNC=False 时不在请求中补跑遗留任务，由 process_import_jobs 命令处理
+    """
+    config = get_import_job_settings()
+    if not config['ASYNC']:
+        return []
+    log_ids = list(
+        ImportLog.objects.filter(
+            status='pending', created_at__lt=timezone.now() - timedelta(seconds=config['REQUEUE_SECONDS'])
+        ).order_by('created_at').values_list('id', flat=True)
+    )
+    for log_id in log_ids:
+        import_job_runner.submit(log_id)
+    return log_ids
+
+
+def recover_stale_jobs():
+    """处理进程重启或崩溃遗留的任务"""
+    fail_stale_jobs()
+    requeue_pending_jobs()
+
+
+def _detect_table_type(df, sheet_name):
+    from .views import detect_table_type, detect_table_type_by_content, detect_table_type_by_sheet_name
+
+    table_type = detect_table_type_by_sheet_name(sheet_name)
+    if table_type:
+        return table_type, 'sheet_name'
+    table_type = detect_table_type_by_content(df)
+    if table_type:
+        return table_type, 'content'
+    return detect_table_type(df.columns), 'columns'
+
+
+def run_import_job(log_id):
+    """执行一个已认领的导入任务"""
+    from .views import import_calculation_table, import_management_table
+
+    config = get_import_job_settings()
+    log = ImportLog.objects.select_related('user').get(pk=log_id)
+    try:
+        header_row = int(log.result_data.get('header_row') or 1)
+        with default_storage.open(log.file_path, 'rb') as file, WorkbookReader(file) as reader:
+            sheet_name = log.sheet_name or reader.workbook.active.title
+            df = reader.read_frame(sheet_name, min_row=header_row, max_rows=config['MAX_ROWS'])
+
+        if log.table_type in TABLE_TYPES:
+            table_type, detection_method = log.table_type, 'manual'
+        else:
+            table_type, detection_method = _detect_table_type(df, sheet_name)
+        update_progress(log, 'importing', sheet_name=sheet_name, table_type=table_type, total_rows=len(df))
+
+        import_table = import_management_table if table_type == 'management' else import_calculation_table
+        response = import_table(
+            df, sheet_name, log.form_id, log.user, log.file_name, log.file_path, detection_method, log=log
+        )
+        if response.status_code >= 400:
+            raise ValueError(response.data.get('error', '导入失败'))
+
+        log.status = 'completed'
+        log.stage = 'done'
+        log.processed_rows = log.total_rows
+    except Exception as e:
+        logger.exception(f"导入任务 {log_id} 失败")
+        log.status = 'failed'
+        log.success = False
+        log.result = f'导入失败: {e}'
+    finally:
+        log.finished_at = timezone.now()
+        log.save()
+        if log.file_path and default_storage.exists(log.file_path):
+            default_storage.delete(log.file_path)
+    return log
+
+
+class ImportJobRunner:
+    """进程内导入线程池"""
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, log_id):
+        config = get_import_job_settings()
+        if not config['ASYNC']:
+            self.execute(log_id)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=config['WORKERS'], thread_name_prefix='import-job'
+                )
+        self._executor.submit(self._execute_in_thread, log_id)
+
+    def execute(self, log_id):
+        if claim_job(log_id):
+            return run_import_job(log_id)
+        return None
+
+    def _execute_in_thread(self, log_id):
+        close_old_connections()
+        try:
+            self.execute(log_id)
+        finally:
+            close_old_connections()
+
+
+import_job_runner = ImportJobRunner()
+
+
+def serialize_job(log):
+    """导入任务状态（供轮询接口返回）"""
+    return {
+        'id': log.id,
+        'status': log.status,
+        'stage': log.stage,
+        'progress': log.progress,
+        'file_name': log.file_name,
+        'sheet_name': log.sheet_name,
+        'table_type': log.table_type,
+        'form_id': log.form_id,
+        'total_rows': log.total_rows,
+        'processed_rows': log.processed_rows,
+        'imported_count': log.imported_count,
+        'error_count': log.error_count,
+        'success': log.success,
+        'result': log.result,
+        'result_data': log.result_data,
+        'created_at': log.created_at.isoformat() if log.created_at else None,
+        'started_at': log.started_at.isoformat() if log.started_at else None,
+        'finished_at': log.finished_at.isoformat() if log.finished_at else None,
+        'duration': log.duration,
+    }
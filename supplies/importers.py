@@ -0,0 +1,329 @@
+"""
+Excel 导入流水线
+
+整张工作表一次性完成列映射、清洗和校验（pandas 向量化），不再逐行 iterrows：
+- clean_text / material_row_mask 过滤空行、表头行、汇总行
+- NumericColumns 把数值列批量转换成数字，并按行收集转换失败的错误
+- ManagementTableImport 在一个事务中清空旧数据并 bulk_create，失败时整体回滚，
+  不会留下只导入了一半的表
+- CalculationTableImport 预先载入申请表已有项目（料材名称 -> 项目），
+  整表划分为新增/更新/未变化三部分，再用 bulk_create / bulk_update 写回
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from .header_matching import HeaderMatcher
+from .models import ApplicationForm, B453CalculationItem, B453SupplyItem, DynamicCalculationItem
+from .sequences import allocate_item_numbers
+from .summary import schedule_form_summary
+
+logger = logging.getLogger(__name__)
+
+INT_MIN, INT_MAX = -2147483648, 2147483647
+
+
+def clean_text(series):
+    """转换成去掉首尾空白的字符串，空值转换成空字符串"""
+    return series.where(series.notna(), '').astype(str).str.strip()
+
+
+def _contains_any(series, keywords, case=True):
+    pattern = '|'.join(pd.Series(keywords).str.replace(r'([.^$*+?{}\[\]\\|()])', r'\\\1', regex=True))
+    return series.str.contains(pattern, case=case, regex=True)
+
+
+def material_row_mask(names, skip_keywords, valid_keywords, min_length=5):
+    """
+    有效物料行的布尔掩码
+    - 跳过空行、表头行和汇总行（包含 skip_keywords，不区分大小写）
+    - 不包含 valid_keywords 的名称，太短（< min_length）视为无效数据
+    """
+    not_empty = (names != '') & ~names.str.lower().isin(['nan', 'none'])
+    not_skipped = ~_contains_any(names, skip_keywords, case=False)
+    looks_valid = _contains_any(names, valid_keywords) | (names.str.len() >= min_length)
+    return not_empty & not_skipped & looks_valid
+
+
+class NumericColumns:
+    """批量数值转换，转换失败的单元格按行记录错误，空值按默认值处理"""
+
+    def __init__(self, df, mapped_columns):
+        self.df = df
+        self.mapped_columns = mapped_columns
+        self.errors = {}
+
+    def add_errors(self, mask, message):
+        for index in mask[mask].index:
+            self.errors.setdefault(index, []).append(message(index))
+
+    def error_mask(self):
+        return pd.Series(self.df.index.isin(list(self.errors)), index=self.df.index)
+
+    def _to_number(self, label):
+        raw = self.df[self.mapped_columns[label]]
+        numbers = pd.to_numeric(raw, errors='coerce')
+        invalid = raw.notna() & numbers.isna() & (raw.astype(str).str.strip() != '')
+        self.add_errors(invalid, lambda index: f'{label} 不是有效数字: {raw[index]}')
+        return numbers
+
+    def integer(self, label, default=0):
+        numbers = self._to_number(label)
+        out_of_range = numbers.notna() & ((numbers < INT_MIN) | (numbers > INT_MAX))
+        self.add_errors(out_of_range, lambda index: f'{label} 超出范围: {numbers[index]}')
+        return np.trunc(numbers.where(numbers.notna() & ~out_of_range, default)).astype(np.int64)
+
+    def decimal(self, label, max_value, default=0):
+        numbers = self._to_number(label)
+        out_of_range = numbers.notna() & (numbers.abs() >= max_value)
+        self.add_errors(out_of_range, lambda index: f'{label} 超出范围: {numbers[index]}')
+        return numbers.where(numbers.notna() & ~out_of_range, default).round(2).astype(np.float64)
+
+    def text(self, label, default='', max_length=None):
+        values = clean_text(self.df[self.mapped_columns[label]])
+        values = values.where(self.df[self.mapped_columns[label]].notna(), default)
+        if max_length:
+            too_long = values.str.len() > max_length
+            self.add_errors(too_long, lambda index: f'{label} 超过{max_length}个字符')
+        return values
+
+
+class ManagementTableImport:
+    """管控表导入：整表校验后一次性替换 B453SupplyItem"""
+
+    # 导入列 -> 列名关键字，按列的顺序取第一个包含关键字的列
+    header_matcher = HeaderMatcher({
+        '物料描述': ['物料描述', '品名', '名称', '描述', 'material', 'description'],
+        '单位': ['单位', '單位', 'unit'],
+        '采购员': ['采购员', '採購員', 'purchaser'],
+        '单价(RMB)': ['单价', '單價', '單價（RMB)', '單價(RMB)', '单价(RMB)', 'price'],
+        '安全库存-最高': ['安全库存-最高', '安全庫存最高', '最高', 'max'],
+        '安全库存-最低': ['安全库存-最低', '安全庫存最低', '最低', 'min'],
+        '最小采购量(MOQ)': ['最小采购量', 'MOQ', '最小采购量(MOQ)'],
+        'L/T(Wks)': ['L/T', 'L/T(Wks)', 'L/T_Wks', 'L/T\nWks', '交货周期', '交期'],
+    }, strategy='first_column')
+
+    skip_keywords = ['核准', '审核', '批准', '合计', '总计', '序號', '序号', 'no.', 'no', '物料描述', 'material']
+    valid_keywords = ['設備', '设备', '探針', '探针', '清潔劑', '清洁剂', '密封圈', '密封垫', '喇叭', '膠材', '胶材']
+
+    def __init__(self, df, mapped_columns, user):
+        self.df = df
+        self.mapped_columns = mapped_columns
+        self.user = user
+
+    def run(self):
+        """返回 (imported_items, error_items)"""
+        descriptions = clean_text(self.df[self.mapped_columns['物料描述']])
+        df = self.df[material_row_mask(descriptions, self.skip_keywords, self.valid_keywords)]
+        descriptions = descriptions[df.index]
+        logger.info(f"找到 {len(df)} 条有效物料数据")
+
+        columns = NumericColumns(df, self.mapped_columns)
+        data = pd.DataFrame({
+            'material_description': descriptions,
+            'unit': columns.text('单位', default='pcs', max_length=20),
+            'purchaser': columns.text('采购员', max_length=50),
+            'unit_price': columns.decimal('单价(RMB)', max_value=10 ** 8),
+            'max_safety_stock': columns.integer('安全库存-最高'),
+            'min_safety_stock': columns.integer('安全库存-最低'),
+            'moq': columns.integer('最小采购量(MOQ)'),
+            'lead_time_weeks': columns.integer('L/T(Wks)'),
+        }, index=df.index)
+
+        has_error = columns.error_mask()
+        error_items = [
+            {'row': int(index), 'material': descriptions[index], 'error': '; '.join(columns.errors[index])}
+            for index in has_error[has_error].index
+        ]
+
+        records = data[~has_error].to_dict('records')
+        items = [
+            B453SupplyItem(serial_number=serial_number, created_by=self.user, **record)
+            for serial_number, record in enumerate(records, start=1)
+        ]
+        with transaction.atomic():
+            # 清空现有B453SupplyItem数据，与新数据在同一个事务中替换
+            B453SupplyItem.objects.all().delete()
+            B453SupplyItem.objects.bulk_create(items, batch_size=1000)
+
+        imported_items = [
+            {
+                'serial_number': item.serial_number,
+                'material_description': item.material_description,
+                'unit': item.unit,
+                'unit_price': item.unit_price,
+            }
+            for item in items
+        ]
+        return imported_items, error_items
+
+
+class CalculationTableImport:
+    """
+    需求计算表导入
+    - 有 form_id：按料材名称与申请表已有的 DynamicCalculationItem 合并（新增 / 更新）
+    - 没有 form_id：整体替换 B453CalculationItem
+    """
+
+    # 导入列 -> 列名关键字，取匹配度（关键字长度 / 列名长度）最高的列
+    header_matcher = HeaderMatcher({
+        '料材名称': ['料材名称', '料件名稱', '物料名称', 'material', 'name', '耗材名稱', '耗材名称', '料材', '料件'],
+        '使用站别': ['使用站别', '使用站別', 'usage_station', 'station', '站别', '站別', '工站'],
+        '每臺機用量': ['每臺机用量', '每臺機用量', '每台机用量', 'usage_per_machine', '机用量', '機用量', '用量'],
+        '使用次数': ['使用次数', '使用次數', 'usage_count', '次數', '次数'],
+        '当月产能': ['当月产能', '當月產能', 'monthly_capacity', '產能', '产能'],
+        '最低库存': ['最低库存', '最低庫存', 'min_stock', '庫存數', '库存数'],
+        '最高库存': ['最高库存', '最高庫存', 'max_stock', '庫存總數', '库存总数'],
+        '当月需求/站': ['当月需求/站', '當月需求/站', 'monthly_demand', '需求', '當月總需求', '当月总需求'],
+        '备注': ['备注', '備註', 'remark', 'moq_remark', '備註\n（MOQ）'],
+    }, strategy='best_score')
+
+    skip_keywords = ['核准', '审核', '批准', '合计', '总计', 'No.', '料材名称', 'no.', 'no', 'material', 'name']
+    valid_keywords = ['設備', '设备', '探針', '探针', '清潔劑', '清洁剂', '密封圈', '密封垫', '喇叭', '膠材', '胶材', '耗材', '料材']
+
+    # 导入列 -> DynamicCalculationItem 字段
+    dynamic_fields = {
+        'usage_station': '使用站别',
+        'usage_per_set': '每臺機用量',
+        'usage_count': '使用次数',
+        'monthly_capacity': '当月产能',
+        'min_stock': '最低库存',
+        'max_stock': '最高库存',
+        'monthly_demand': '当月需求/站',
+        'moq_remark': '备注',
+    }
+
+    def __init__(self, df, mapped_columns, user, form_id=None):
+        self.df = df
+        self.mapped_columns = mapped_columns
+        self.user = user
+        self.form_id = form_id
+
+    def run(self):
+        """返回 (imported_items, error_items, summary)"""
+        names = clean_text(self.df[self.mapped_columns['料材名称']])
+        df = self.df[material_row_mask(names, self.skip_keywords, self.valid_keywords)]
+        names = names[df.index]
+        logger.info(f"找到 {len(df)} 条有效需求计算数据")
+
+        station_max_length = 100 if self.form_id else 50
+        columns = NumericColumns(df, self.mapped_columns)
+        data = pd.DataFrame({
+            'material_name': names,
+            'usage_station': columns.text('使用站别', max_length=station_max_length),
+            'usage_per_set': columns.integer('每臺機用量'),
+            'usage_count': columns.integer('使用次数'),
+            'monthly_capacity': columns.integer('当月产能'),
+            'min_stock': columns.integer('最低库存'),
+            'max_stock': columns.integer('最高库存'),
+            'monthly_demand': columns.integer('当月需求/站'),
+            'moq_remark': columns.text('备注'),
+        }, index=df.index)
+        if self.form_id:
+            too_long = names.str.len() > 200
+            columns.add_errors(too_long, lambda index: '料材名称 超过200个字符')
+
+        has_error = columns.error_mask()
+        error_items = [
+            {'row': int(index), 'material': names[index], 'error': '; '.join(columns.errors[index])}
+            for index in has_error[has_error].index
+        ]
+        data = data[~has_error]
+
+        if self.form_id:
+            imported_items, summary = self._upsert_dynamic(data)
+        else:
+            imported_items, summary = self._replace_b453(data)
+        return imported_items, error_items, summary
+
+    def _upsert_dynamic(self, data):
+        # 同一料材名称在表中出现多次时，以最后一行为准
+        data = data.drop_duplicates('material_name', keep='last')
+
+        # 一次载入申请表已有项目，料材名称重复时与原逻辑一致取 No. 最小的一条
+        existing = {}
+        queryset = (
+            DynamicCalculationItem.objects
+            .filter(form_id=self.form_id)
+            .only('id', 'form_id', 'no', 'material_name', *self.dynamic_fields)
+            .order_by('no')
+        )
+        for item in queryset:
+            existing.setdefault(item.material_name, item)
+
+        now = timezone.now()
+        to_create, to_update, unchanged = [], [], []
+        for record in data.to_dict('records'):
+            item = existing.get(record['material_name'])
+            if item is None:
+                to_create.append(DynamicCalculationItem(form_id=self.form_id, **record))
+                continue
+
+            values = {field: record[field] for field in self.dynamic_fields}
+            if all(getattr(item, field) == value for field, value in values.items()):
+                unchanged.append(item)
+                continue
+            for field, value in values.items():
+                setattr(item, field, value)
+            item.updated_at = now
+            to_update.append(item)
+
+        with transaction.atomic():
+            if to_update or to_create:
+                # 写入的项目带上本事务的版本号，增量同步按提交顺序返回
+                version = ApplicationForm.claim_change_version(self.form_id)
+                for item in to_update + to_create:
+                    item.change_version = version
+            if to_update:
+                DynamicCalculationItem.objects.bulk_update(
+                    to_update, [*self.dynamic_fields, 'updated_at', 'change_version'], batch_size=1000
+                )
+            if to_create:
+                # 新增项目一次分配一段连续序号
+                for item, no in zip(to_create, allocate_item_numbers(self.form_id, len(to_create))):
+                    item.no = no
+                DynamicCalculationItem.objects.bulk_create(to_create, batch_size=1000)
+            schedule_form_summary(self.form_id)
+
+        items = sorted(to_create + to_update + unchanged, key=lambda item: item.no)
+        imported_items = [
+            {
+                'no': item.no,
+                'material_name': item.material_name,
+                'usage_station': item.usage_station,
+                'monthly_demand': item.monthly_demand,
+            }
+            for item in items
+        ]
+        summary = {'inserted': len(to_create), 'updated': len(to_update), 'unchanged': len(unchanged)}
+        return imported_items, summary
+
+    def _replace_b453(self, data):
+        data = data.rename(columns={
+            'usage_per_set': 'usage_per_machine',
+            'monthly_demand': 'monthly_demand_per_station',
+        })
+        # B453CalculationItem.created_by 关联的是 UserProfile
+        profile = getattr(self.user, 'profile', None)
+        items = [
+            B453CalculationItem(no=no, created_by=profile, **record)
+            for no, record in enumerate(data.to_dict('records'), start=1)
+        ]
+        with transaction.atomic():
+            # 清空现有B453CalculationItem数据，与新数据在同一个事务中替换
+            B453CalculationItem.objects.all().delete()
+            B453CalculationItem.objects.bulk_create(items, batch_size=1000)
+
+        imported_items = [
+            {
+                'no': item.no,
+                'material_name': item.material_name,
+                'usage_station': item.usage_station,
+                'monthly_demand': item.monthly_demand_per_station,
+            }
+            for item in items
+        ]
+        return imported_items, {'inserted': len(items), 'updated': 0, 'unchanged': 0}
@@ -0,0 +1,116 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.models import OperationLog
+from supplies.models import ApplicationForm, DynamicCalculationItem, InventoryRecord
+from supplies.seed_data import seed_dataset
+
+# 0021_hot_query_indexes / accounts 0010 新增的索引，--compare 时临时删除得到"优化前"的查询计划
+HOT_QUERY_INDEXES = {
+    DynamicCalculationItem: ['calc_item_visible_no_idx', 'calc_item_form_material_idx', 'calc_item_form_updated_idx'],
+    InventoryRecord: ['inventory_supply_time_idx'],
+    OperationLog: ['oplog_user_created_idx'],
+    ApplicationForm: ['form_department_idx'],
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = '在种子数据上输出热点查询的 EXPLAIN 计划（--compare 对比新增索引前后）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forms', type=int, default=20, help='种子申请表数量')
+        parser.add_argument('--items', type=int, default=500, help='每个申请表的计算项目数量')
+        parser.add_argument('--supplies', type=int, default=1000, help='种子耗材数量')
+        parser.add_argument('--logs', type=int, default=20000, help='种子操作日志数量')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子')
+        parser.add_argument('--compare', action='store_true', help='同时输出删除新增索引后的查询计划')
+        parser.add_argument('--keep', action='store_true', help='保留种子数据（默认执行完回滚）')
+        parser.add_argument('--output', help='把查询计划写入 JSON 文件')
+
+    def handle(self, *args, **options):
+        result = {}
+        try:
+            with transaction.atomic():
+                dataset = seed_dataset(
+                    forms=options['forms'], items_per_form=options['items'], supplies=options['supplies'],
+                    logs=options['logs'], seed=options['seed'],
+                )
+                self.stdout.write(f"种子数据: { {k: v for k, v in dataset.items() if k != 'form_ids'} }")
+                self._analyze()
+                queries = self._hot_queries(dataset)
+
+                result['after'] = self._explain_all(queries)
+                if options['compare']:
+                    result['before'] = self._explain_without_indexes(queries)
+                if not options['keep']:
+                    raise _Rollback
+        except _Rollback:
+            pass
+
+        for name in result['after']:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {name}'))
+            if 'before' in result:
+                self.stdout.write('-- 优化前')
+                self.stdout.write(result['before'][name])
+                self.stdout.write('-- 优化后')
+            self.stdout.write(result['after'][name])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'vendor': connection.vendor, **result}, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"查询计划已写入 {options['output']}"))
+
+    def _analyze(self):
+        # 让规划器拿到种子数据的统计信息
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _hot_queries(self, dataset):
+        form_id = dataset['form_ids'][0]
+        material_name = (
+            DynamicCalculationItem.objects.filter(form_id=form_id).values_list('material_name', flat=True).first() or ''
+        )
+        supply_id = InventoryRecord.objects.values_list('supply_id', flat=True).first()
+        department = ApplicationForm.objects.filter(id=form_id).values_list('department', flat=True).first()
+        version = ApplicationForm.objects.filter(id=form_id).values_list('data_version', flat=True).first() or 0
+        return {
+            'by_form（可见项目按 no 排序）': DynamicCalculationItem.objects.filter(form_id=form_id, is_visible=True).order_by('no'),
+            '导入按物料名称匹配': DynamicCalculationItem.objects.filter(form_id=form_id, material_name=material_name),
+            '增量同步（change_version）': DynamicCalculationItem.objects.filter(form_id=form_id, change_version__gt=max(version - 1, 0)),
+            '耗材库存变动记录': InventoryRecord.objects.filter(supply_id=supply_id).order_by('-timestamp')[:50],
+            '用户操作日志': OperationLog.objects.filter(user_id=dataset['user_id']).order_by('-created_at')[:50],
+            '操作日志统计（最近7天）': OperationLog.objects.filter(created_at__gte=timezone.now() - timedelta(days=7)).values('operation_type'),
+            '按部门筛选申请表': ApplicationForm.objects.filter(department=department),
+        }
+
+    def _explain_all(self, queries):
+        options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+        return {name: queryset.explain(**options) for name, queryset in queries.items()}
+
+    def _explain_without_indexes(self, queries):
+        """在保存点内删除新增索引后取查询计划，随后回滚（PostgreSQL / SQLite 的 DDL 都支持事务）"""
+        plans = None
+        # 只执行 DROP INDEX，不进入 schema_editor 上下文（SQLite 在事务内不允许进入）
+        schema_editor = connection.schema_editor(atomic=False)
+        try:
+            with transaction.atomic():
+                for model, names in HOT_QUERY_INDEXES.items():
+                    for index in model._meta.indexes:
+                        if index.name in names:
+                            schema_editor.execute(
+                                schema_editor.sql_delete_index % {'name': schema_editor.quote_name(index.name)}
+                            )
+                self._analyze()
+                plans = self._explain_all(queries)
+                raise _Rollback
+        except _Rollback:
+            pass
+        return plans
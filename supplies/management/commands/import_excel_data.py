@@ -3,6 +3,11 @@ from django.core.management.base import BaseCommand
 from supplies.models import DynamicCalculationItem, ApplicationForm
 from django.db import transaction
 from decimal import Decimal
+from supplies.excel_reader import WorkbookReader
+from supplies.header_matching import HeaderMatcher
+from supplies.delta_sync import delete_calculation_items
+from supplies.sequences import reset_item_numbers
+from supplies.summary import schedule_form_summary
 import math
 import re
 
@@ -16,6 +21,24 @@ class Command(BaseCommand):
         # 统一转小写
         return cleaned.lower()
 
+    batch_size = 500
+
+    material_matcher = HeaderMatcher(
+        {'material_name': ['料描述','物料描述','品名','名称','名稱']}, strategy='first_column', normalize=False
+    )
+
+    # 字段 -> 列名关键字（按优先级，取第一个包含该关键字的列）
+    value_matcher = HeaderMatcher({
+        'unit': ['单位','單位','unit'],
+        'purchaser': ['采购员','採購員','purchaser'],
+        'unit_price': ['单价','單價','單價(RMB)','unit_price','price'],
+        'min_stock': ['最低','min_stock','min'],
+        'max_stock': ['最高','max_stock','max'],
+        'moq': ['MOQ','moq'],
+        'total_amount': ['总金额','总金额(RMB)','total_amount','amount'],
+        'remark': ['备注','備註','remark'],
+    }, strategy='first_keyword', normalize=False)
+
     def add_arguments(self, parser):
         parser.add_argument('--file', type=str, required=True, help='Excel文件路径')
 
@@ -29,35 +52,34 @@ class Command(BaseCommand):
             return
 
         self.stdout.write(self.style.WARNING('清空旧数据...'))
-        DynamicCalculationItem.objects.filter(form=application_form).delete()
+        delete_calculation_items(DynamicCalculationItem.objects.filter(form=application_form))
 
         self.stdout.write(self.style.SUCCESS(f'开始导入 {file_path} 到申请表: {application_form.name}'))
-        xls = pd.ExcelFile(file_path)
+        verbose = options['verbosity'] >= 2
         total_created = 0
         global_no = 1  # 全局序号
         seen_materials = set()  # 记录已导入的物料名称
-        with transaction.atomic():
-            for sheet_name in xls.sheet_names:
-                # 先尝试多级表头
-                try:
-                    df = pd.read_excel(xls, sheet_name=sheet_name, header=[0,1])
-                    # 拼接多级表头为单行
-                    df.columns = [''.join([str(x) for x in col if str(x) != 'nan']).replace(' ', '') for col in df.columns.values]
-                except Exception:
-                    df = pd.read_excel(xls, sheet_name=sheet_name)
-                    df.columns = [str(col).replace(' ', '') for col in df.columns]
-                self.stdout.write(f'处理Sheet: {sheet_name}，共{len(df)}行')
-                self.stdout.write(f'实际列名: {df.columns.tolist()}')
+        with transaction.atomic(), WorkbookReader(file_path) as reader:
+            # 本次导入的项目共用一个版本号，增量同步（by_form?since=）按提交顺序返回
+            change_version = ApplicationForm.claim_change_version(application_form.id)
+            for sheet_name in reader.sheet_names:
+                # 只读流式读取，前两行拼接为表头，表头每个sheet只解析一次
+                sheet = reader.sheet(sheet_name, header_rows=2)
+                self.stdout.write(f'处理Sheet: {sheet_name}')
+                self.stdout.write(f'实际列名: {sheet.columns}')
                 # 自动宽松查找物料名列
-                material_col = None
-                for col in df.columns:
-                    if any(key in str(col) for key in ['料描述','物料描述','品名','名称','名稱']):
-                        material_col = col
-                        break
+                material_col = self.material_matcher.resolve(sheet.columns).get('material_name')
                 if not material_col:
                     self.stdout.write(self.style.ERROR('未找到“料描述/物料描述/品名/名称”列，跳过该sheet'))
                     continue
-                for idx, row in df.iterrows():
+                
+                # 字段对应的列在表头解析后确定一次，不再逐行查找
+                value_columns = self.value_matcher.resolve(sheet.columns)
+                data_columns = self._classify_data_columns(sheet.columns)
+                
+                batch = []
+                sheet_created = 0
+                for row in sheet:
                     material_name = row.get(material_col)
                     if (
                         not material_name
@@ -71,58 +93,37 @@ class Command(BaseCommand):
                     # 去重检查
                     material_name_clean = self.clean_material_name(material_name)
                     if material_name_clean in seen_materials:
-                        self.stdout.write(f'跳过重复物料: {material_name} (清洗后: {material_name_clean})')
+                        if verbose:
+                            self.stdout.write(f'跳过重复物料: {material_name} (清洗后: {material_name_clean})')
                         continue  # 跳过重复物料
                     seen_materials.add(material_name_clean)
-                    self.stdout.write(f'导入物料: {material_name} (清洗后: {material_name_clean})')
+                    if verbose:
+                        self.stdout.write(f'导入物料: {material_name} (清洗后: {material_name_clean})')
+                    
+                    values = {field: row[column] for field, column in value_columns.columns.items()}
                     
                     # 基础字段
-                    unit = self._find_value(row, ['单位','單位','unit']) or 'pcs'
-                    purchaser = self._find_value(row, ['采购员','採購員','purchaser']) or ''
-                    unit_price_raw = self._find_value(row, ['单价','單價','單價(RMB)','unit_price','price'])
-                    unit_price = unit_price_raw or 0
-                    if unit_price_raw:
-                        self.stdout.write(f'找到单价: {material_name} -> {unit_price_raw}')
-                    else:
-                        self.stdout.write(f'未找到单价: {material_name}')
-                    min_stock = self._find_value(row, ['最低','min_stock','min']) or 0
-                    max_stock = self._find_value(row, ['最高','max_stock','max']) or 0
-                    moq = self._find_value(row, ['MOQ','moq']) or 0
-                    total_amount = self._find_value(row, ['总金额','总金额(RMB)','total_amount','amount']) or 0
-                    remark = self._find_value(row, ['备注','備註','remark']) or ''
-
+                    unit = values.get('unit') or 'pcs'
+                    purchaser = values.get('purchaser') or ''
+                    unit_price = values.get('unit_price') or 0
+                    min_stock = safe_int(values.get('min_stock') or 0)
+                    max_stock = safe_int(values.get('max_stock') or 0)
+                    moq = safe_int(values.get('moq') or 0)
+                    total_amount = values.get('total_amount') or 0
+                    
                     # NaN安全转换
-                    min_stock = safe_int(min_stock)
-                    max_stock = safe_int(max_stock)
-                    moq = safe_int(moq)
                     unit_price = 0 if pd.isna(unit_price) else Decimal(str(unit_price))
                     total_amount = 0 if pd.isna(total_amount) else Decimal(str(total_amount))
-
+                    
                     # 自动识别月度需求/库存、快照、周需求等
-                    monthly_data = {}
-                    stock_snapshots = {}
-                    chase_data = {}
-                    for col in df.columns:
-                        col_str = str(col)
+                    json_data = {'monthly_data': {}, 'stock_snapshots': {}, 'chase_data': {}}
+                    for col, target in data_columns:
                         val = row.get(col)
-                        if pd.isna(val):
+                        if val is None or pd.isna(val):
                             continue
-                        # 月度需求/库存
-                        if '需求' in col_str or ('月' in col_str and '需求' in col_str) or '明细' in col_str:
-                            monthly_data[col_str] = val
-                        elif '库存' in col_str or '存量' in col_str or '备料' in col_str:
-                            stock_snapshots[col_str] = val
-                        # 周需求/追料
-                        elif ('W0' in col_str or 'W1' in col_str or 'W2' in col_str or 'W3' in col_str or 'W4' in col_str or '周' in col_str) and ('需求' in col_str or '数量' in col_str or '数' in col_str):
-                            chase_data[col_str] = val
-                        # 追料特殊日期
-                        elif ('6/19' in col_str or '6/25' in col_str or '8/19' in col_str or '8/25' in col_str) and ('数量' in col_str or '数' in col_str):
-                            chase_data[col_str] = val
-
-                    # 自动分配序号
-                    no = global_no
-
-                    item = DynamicCalculationItem(
+                        json_data[target][col] = val
+                    
+                    batch.append(DynamicCalculationItem(
                         form=application_form,
                         no=global_no,
                         material_name=str(material_name).strip(),
@@ -132,22 +133,43 @@ class Command(BaseCommand):
                         max_stock=max_stock,
                         moq=moq,
                         total_amount=total_amount,
-                        monthly_data=monthly_data,
-                        stock_snapshots=stock_snapshots,
-                        chase_data=chase_data,
-                        is_visible=True
-                    )
-                    item.save()
-                    total_created += 1
+                        is_visible=True,
+                        change_version=change_version,
+                        **json_data
+                    ))
                     global_no += 1
+                    
+                    if len(batch) >= self.batch_size:
+                        DynamicCalculationItem.objects.bulk_create(batch)
+                        sheet_created += len(batch)
+                        batch = []
+                
+                if batch:
+                    DynamicCalculationItem.objects.bulk_create(batch)
+                    sheet_created += len(batch)
+                total_created += sheet_created
+                self.stdout.write(f'Sheet {sheet_name} 导入 {sheet_created} 条')
+            # 整表替换后序号从 1 重新编排，同步计数器（bulk_create 不触发信号）
+            reset_item_numbers(application_form.id, global_no - 1)
+            schedule_form_summary(application_form.id)
         self.stdout.write(self.style.SUCCESS(f'全部导入完成，共创建 {total_created} 条记录'))
 
-    def _find_value(self, row, keys):
-        for key in keys:
-            for col in row.index:
-                if key in str(col):
-                    return row.get(col)
-        return None
+    def _classify_data_columns(self, columns):
+        """按列名把月度需求/库存快照/追料数据列归类，返回 [(列名, 目标JSON字段)]"""
+        result = []
+        for col_str in columns:
+            # 月度需求/库存
+            if '需求' in col_str or '明细' in col_str:
+                result.append((col_str, 'monthly_data'))
+            elif '库存' in col_str or '存量' in col_str or '备料' in col_str:
+                result.append((col_str, 'stock_snapshots'))
+            # 周需求/追料
+            elif ('W0' in col_str or 'W1' in col_str or 'W2' in col_str or 'W3' in col_str or 'W4' in col_str or '周' in col_str) and ('需求' in col_str or '数量' in col_str or '数' in col_str):
+                result.append((col_str, 'chase_data'))
+            # 追料特殊日期
+            elif ('6/19' in col_str or '6/25' in col_str or '8/19' in col_str or '8/25' in col_str) and ('数量' in col_str or '数' in col_str):
+                result.append((col_str, 'chase_data'))
+        return result
 
 def safe_int(val):
     try:
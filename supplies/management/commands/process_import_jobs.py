@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from supplies.import_jobs import fail_stale_jobs, import_job_runner
+from supplies.models import ImportLog
+
+
+class Command(BaseCommand):
+    help = '轮询数据库执行排队中的Excel导入任务（独立worker，不依赖外部消息队列）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='只处理当前排队的任务后退出')
+        parser.add_argument('--interval', type=float, default=2.0, help='轮询间隔(秒)')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            failed = fail_stale_jobs()
+            if failed:
+                self.stdout.write(f'{failed} 个超时任务已标记为失败')
+            pending_ids = list(
+                ImportLog.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True)
+            )
+            for log_id in pending_ids:
+                log = import_job_runner.execute(log_id)
+                if log is not None:
+                    self.stdout.write(f'导入任务 {log.id}: {log.status} - {log.result}')
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
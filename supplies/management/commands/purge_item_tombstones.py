@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from supplies.delta_sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = '清理超过保留期的计算项目删除记录（增量同步墓碑）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='保留天数，默认使用 DELTA_SYNC 的 TOMBSTONE_DAYS')
+
+    def handle(self, *args, **options):
+        deleted = purge_tombstones(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'已清理 {deleted} 条删除记录'))
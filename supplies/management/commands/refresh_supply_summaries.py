@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from supplies.models import SupplySummary
+from supplies.summary import refresh_all_summaries
+
+
+class Command(BaseCommand):
+    help = '全量重新计算统计汇总表（SupplySummary）'
+
+    def handle(self, *args, **options):
+        refresh_all_summaries()
+        self.stdout.write(self.style.SUCCESS(f'统计汇总表已刷新，共 {SupplySummary.objects.count()} 条'))
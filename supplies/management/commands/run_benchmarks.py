@@ -0,0 +1,67 @@
+import json
+import platform
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from supplies.benchmark import BenchmarkSuite, compare_results, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = '在种子数据上运行接口基准测试，输出 JSON 基线（执行完回滚，不保留数据）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forms', type=int, default=10, help='种子申请表数量')
+        parser.add_argument('--items', type=int, default=500, help='每个申请表的计算项目数量')
+        parser.add_argument('--logs', type=int, default=20000, help='种子操作日志数量')
+        parser.add_argument('--import-rows', type=int, default=500, help='导入场景的工作簿行数')
+        parser.add_argument('--repeat', type=int, default=10, help='每个场景的计时次数')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子')
+        parser.add_argument('--only', nargs='+', choices=BenchmarkSuite.SCENARIOS, help='只运行指定场景')
+        parser.add_argument('--output', default='benchmark_results.json', help='结果文件路径')
+        parser.add_argument('--baseline', help='与之对比的基线文件')
+        parser.add_argument('--threshold', type=float, default=0.2, help='视为退化的增长比例（默认 0.2）')
+        parser.add_argument('--fail-on-regression', action='store_true', help='有退化时以非零状态退出')
+
+    def handle(self, *args, **options):
+        result = run_benchmarks(
+            forms=options['forms'],
+            items_per_form=options['items'],
+            logs=options['logs'],
+            import_rows=options['import_rows'],
+            repeat=options['repeat'],
+            seed=options['seed'],
+            only=options['only'],
+        )
+        result['meta'] = {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'options': {key: options[key] for key in ('forms', 'items', 'logs', 'import_rows', 'repeat', 'seed')},
+        }
+
+        self.stdout.write(f"{'场景':<28}{'p50(ms)':>10}{'p95(ms)':>10}{'查询':>6}{'峰值内存(KB)':>14}")
+        for name, metrics in result['results'].items():
+            self.stdout.write(
+                f"{name:<28}{metrics['p50_ms']:>10}{metrics['p95_ms']:>10}{metrics['queries']:>6}{metrics['peak_memory_kb']:>14}"
+            )
+
+        Path(options['output']).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f"结果已写入 {options['output']}"))
+
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                raise CommandError(f'无法读取基线文件: {e}')
+            rows, regressed = compare_results(baseline, result, options['threshold'])
+            self.stdout.write(f"\n与基线 {options['baseline']} 对比:")
+            for name, key, old, new, worse in rows:
+                line = f'{name:<28}{key:<16}{old!s:>10} -> {new!s:<10}'
+                self.stdout.write(self.style.ERROR(line + ' 退化') if worse else line)
+            if regressed and options['fail_on_regression']:
+                raise CommandError('存在性能退化')
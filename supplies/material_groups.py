@@ -0,0 +1,101 @@
+"""
+按物料分组的计算项目（一个耗材对应多个使用站别）
+
+查询次数固定，不随物料数量增长：
+- 一次 values() 取出申请表可见的计算项目（只取需要的列，不加载 JSON 大字段）
+- 一次 values('material_name').annotate() 在数据库中汇总每个物料的需求和订购数量
+- 一次 id__in 查询取出所有关联的管控表项目
+
+每个物料取第一个带 linked_supply_item_id 的项目对应的管控表项目；
+关联的项目不存在或没有关联时，用计算项目的数据构造一个虚拟的管控表项目（id 为 0）。
+"""
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from .models import B453SupplyItem, DynamicCalculationItem
+
+CALCULATION_FIELDS = [
+    'id', 'no', 'material_name', 'usage_station', 'usage_per_set', 'usage_count', 'monthly_capacity',
+    'min_stock', 'max_stock', 'monthly_demand', 'actual_order', 'linked_supply_item_id', 'unit_price',
+    'moq', 'purchaser',
+]
+
+SUPPLY_FIELDS = [
+    'id', 'material_description', 'unit', 'purchaser', 'unit_price', 'min_safety_stock', 'max_safety_stock',
+    'moq', 'lead_time_weeks',
+]
+
+DEFAULT_LEAD_TIME_WEEKS = 15
+
+
+def _virtual_supply_item(material_name, purchaser, unit_price, min_stock, max_stock, moq):
+    return {
+        'id': 0,
+        'material_description': material_name,
+        'unit': 'pcs',
+        'purchaser': purchaser,
+        'unit_price': unit_price,
+        'min_safety_stock': min_stock,
+        'max_safety_stock': max_stock,
+        'moq': moq,
+        'lead_time_weeks': DEFAULT_LEAD_TIME_WEEKS,
+    }
+
+
+def grouped_material_data(form_id):
+    """返回按物料名称分组的列表，每组包含 supply_item、calculation_items、total_demand、total_order"""
+    items = DynamicCalculationItem.objects.filter(form_id=form_id, is_visible=True)
+
+    totals = {
+        row['material_name']: row
+        for row in items.order_by().values('material_name').annotate(
+            total_demand=Coalesce(Sum('monthly_demand'), 0),
+            total_order=Coalesce(Sum('actual_order'), 0),
+        )
+    }
+
+    groups = {}
+    linked_items = {}
+    for row in items.order_by('material_name', 'usage_station').values(*CALCULATION_FIELDS):
+        row['unit_price'] = float(row['unit_price']) if row['unit_price'] else 0
+        material_name = row['material_name']
+        group = groups.get(material_name)
+        if group is None:
+            group = groups[material_name] = {
+                'supply_item': None,
+                'calculation_items': [],
+                'total_demand': totals[material_name]['total_demand'],
+                'total_order': totals[material_name]['total_order'],
+            }
+        group['calculation_items'].append(row)
+        if row['linked_supply_item_id'] and material_name not in linked_items:
+            linked_items[material_name] = row
+
+    supply_items = {
+        supply['id']: supply
+        for supply in B453SupplyItem.objects.filter(
+            id__in={row['linked_supply_item_id'] for row in linked_items.values()}
+        ).values(*SUPPLY_FIELDS)
+    }
+
+    for material_name, group in groups.items():
+        linked = linked_items.get(material_name)
+        if linked is not None:
+            supply = supply_items.get(linked['linked_supply_item_id'])
+            if supply is not None:
+                group['supply_item'] = {**supply, 'unit_price': float(supply['unit_price'])}
+            else:
+                # 关联的管控表项目已不存在：使用该计算项目的数据
+                group['supply_item'] = _virtual_supply_item(
+                    material_name, linked['purchaser'] or '', linked['unit_price'],
+                    linked['min_stock'] or 0, linked['max_stock'] or 0, linked['moq'] or 0,
+                )
+        else:
+            # 没有关联：使用第一个计算项目的数据
+            first = group['calculation_items'][0]
+            group['supply_item'] = _virtual_supply_item(
+                material_name, first['purchaser'], first['unit_price'],
+                first['min_stock'], first['max_stock'], first['moq'],
+            )
+
+    return list(groups.values())
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0016_add_min_total_stock_to_dynamic_calculation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importlog',
+            name='file_path',
+            field=models.CharField(blank=True, max_length=500, verbose_name='上传文件路径'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='结束时间'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='form_id',
+            field=models.IntegerField(blank=True, null=True, verbose_name='目标申请表ID'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='processed_rows',
+            field=models.IntegerField(default=0, verbose_name='已处理行数'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='result_data',
+            field=models.JSONField(blank=True, default=dict, verbose_name='导入结果数据'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='sheet_name',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Sheet名称'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='stage',
+            field=models.CharField(blank=True, max_length=50, verbose_name='当前阶段'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='开始时间'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='status',
+            field=models.CharField(choices=[('pending', '排队中'), ('running', '导入中'), ('completed', '已完成'), ('failed', '失败')], db_index=True, default='completed', max_length=20, verbose_name='任务状态'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='table_type',
+            field=models.CharField(blank=True, max_length=20, verbose_name='表格类型'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='total_rows',
+            field=models.IntegerField(default=0, verbose_name='总行数'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0017_importlog_job_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplySummary',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('scope', models.CharField(choices=[('category', '耗材分类'), ('form', '申请表')], max_length=20, verbose_name='汇总范围')),
+                ('key', models.CharField(max_length=100, verbose_name='分组键')),
+                ('category', models.CharField(blank=True, max_length=100, verbose_name='分类')),
+                ('item_count', models.IntegerField(default=0, verbose_name='项目数')),
+                ('total_stock', models.IntegerField(default=0, verbose_name='库存总数')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='总金额')),
+                ('total_demand', models.IntegerField(default=0, verbose_name='总需求')),
+                ('total_actual_order', models.IntegerField(default=0, verbose_name='实际订购总数')),
+                ('low_stock_count', models.IntegerField(default=0, verbose_name='低库存数量')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('form', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='supplies.applicationform', verbose_name='申请表')),
+            ],
+            options={
+                'verbose_name': '统计汇总',
+                'verbose_name_plural': '统计汇总',
+                'ordering': ['scope', 'key'],
+                'unique_together': {('scope', 'key')},
+            },
+        ),
+    ]
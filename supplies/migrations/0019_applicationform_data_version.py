@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0018_supplysummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='applicationform',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='明细数据版本'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0019_applicationform_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalculationItemTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('form_id', models.IntegerField(verbose_name='申请表ID')),
+                ('item_id', models.IntegerField(verbose_name='计算项目ID')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='删除时间')),
+            ],
+            options={
+                'verbose_name': '计算项目删除记录',
+                'verbose_name_plural': '计算项目删除记录',
+                'indexes': [models.Index(fields=['form_id', 'deleted_at'], name='supplies_ca_form_id_54e6f6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0020_calculationitemtombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='applicationform',
+            index=models.Index(fields=['department'], name='form_department_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dynamiccalculationitem',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['form', 'no'], name='calc_item_visible_no_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dynamiccalculationitem',
+            index=models.Index(fields=['form', 'material_name'], name='calc_item_form_material_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dynamiccalculationitem',
+            index=models.Index(fields=['form', 'updated_at'], name='calc_item_form_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryrecord',
+            index=models.Index(fields=['supply', '-timestamp'], name='inventory_supply_time_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0021_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FormItemSequence',
+            fields=[
+                ('form', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='item_sequence', serialize=False, to='supplies.applicationform', verbose_name='申请表')),
+                ('last_no', models.IntegerField(default=0, verbose_name='已分配的最大序号')),
+            ],
+            options={
+                'verbose_name': '计算项目序号',
+                'verbose_name_plural': '计算项目序号',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0022_formitemsequence'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='dynamiccalculationitem',
+            name='calc_item_form_updated_idx',
+        ),
+        migrations.AddField(
+            model_name='calculationitemtombstone',
+            name='change_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='修改版本'),
+        ),
+        migrations.AddField(
+            model_name='dynamiccalculationitem',
+            name='change_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='修改版本'),
+        ),
+        migrations.AddIndex(
+            model_name='calculationitemtombstone',
+            index=models.Index(fields=['form_id', 'change_version'], name='calc_tombstone_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dynamiccalculationitem',
+            index=models.Index(fields=['form', 'change_version'], name='calc_item_form_change_idx'),
+        ),
+    ]
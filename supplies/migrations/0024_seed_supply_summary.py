@@ -0,0 +1,71 @@
+# Generated manually: 初始化统计汇总表
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+AMOUNT = DecimalField(max_digits=16, decimal_places=2)
+
+
+def seed_supply_summary(apps, schema_editor):
+    """
+    全量生成分类 / 申请表汇总（与 supplies.summary.refresh_all_summaries 相同的聚合），
+    统计接口不再在请求中初始化汇总表
+    """
+    Supply = apps.get_model('supplies', 'Supply')
+    DynamicCalculationItem = apps.get_model('supplies', 'DynamicCalculationItem')
+    SupplySummary = apps.get_model('supplies', 'SupplySummary')
+
+    summaries = [
+        SupplySummary(
+            scope='category',
+            key=row['category'],
+            category=row['category'],
+            item_count=row['item_count'],
+            total_stock=row['total_stock'],
+            total_amount=row['total_amount'],
+            low_stock_count=row['low_stock_count'],
+        )
+        for row in Supply.objects.values('category').annotate(
+            item_count=Count('id'),
+            total_stock=Coalesce(Sum('current_stock'), 0),
+            total_amount=Coalesce(Sum(F('current_stock') * F('unit_price'), output_field=AMOUNT), Value(Decimal('0')), output_field=AMOUNT),
+            low_stock_count=Count('id', filter=Q(current_stock__lte=F('safety_stock'))),
+        )
+    ]
+    summaries += [
+        SupplySummary(
+            scope='form',
+            key=str(row['form_id']),
+            form_id=row['form_id'],
+            item_count=row['item_count'],
+            total_demand=row['total_demand'],
+            total_actual_order=row['total_actual_order'],
+            total_amount=row['total_amount'],
+        )
+        for row in DynamicCalculationItem.objects.filter(is_visible=True).values('form_id').annotate(
+            item_count=Count('id'),
+            total_demand=Coalesce(Sum('monthly_demand'), 0),
+            total_actual_order=Coalesce(Sum('actual_order'), 0),
+            total_amount=Coalesce(
+                Sum(F('actual_order') * Coalesce('unit_price', Value(Decimal('0'))), output_field=AMOUNT),
+                Value(Decimal('0')),
+                output_field=AMOUNT,
+            ),
+        )
+    ]
+    SupplySummary.objects.all().delete()
+    SupplySummary.objects.bulk_create(summaries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0023_calculation_item_change_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_supply_summary, migrations.RunPython.noop),
+    ]
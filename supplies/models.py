@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
 from decimal import Decimal
 
 class Supply(models.Model):
@@ -74,6 +75,10 @@ class InventoryRecord(models.Model):
         verbose_name = "库存变动记录"
         verbose_name_plural = "库存变动记录"
         ordering = ['-timestamp']
+        indexes = [
+            # 单个耗材的变动记录按时间倒序
+            models.Index(fields=['supply', '-timestamp'], name='inventory_supply_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.supply.name} - {self.get_type_display()} - {self.quantity}"
@@ -366,6 +371,10 @@ class ApplicationForm(models.Model):
     # 关联的计算表
     calculation_form_id = models.IntegerField(null=True, blank=True, verbose_name="关联的计算表ID")
     has_calculation_form = models.BooleanField(default=False, verbose_name="是否有关联的计算表")
+
+    # 明细数据版本：表内耗材/计算/预测项目写入后递增（supplies.form_version），用作 by_form 的 ETag；
+    # 计算项目的写入在同一事务内递增，新版本号同时作为增量同步的游标（见 claim_change_version）
+    data_version = models.PositiveIntegerField(default=0, verbose_name="明细数据版本")
     
     # 时间戳
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
@@ -376,10 +385,55 @@ class ApplicationForm(models.Model):
         verbose_name = "申请表"
         verbose_name_plural = "申请表"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['department'], name='form_department_idx'),
+        ]
+
+    # 明细接口（form_name / form_code）中包含的申请表字段，修改后 data_version 也要递增
+    ITEM_PAYLOAD_FIELDS = ('name', 'code')
 
     def __str__(self):
         return f"{self.name} - {self.department} ({self.period})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._reset_item_payload()
+        return instance
+
+    def _reset_item_payload(self):
+        self._loaded_item_payload = {
+            name: self.__dict__[name] for name in self.ITEM_PAYLOAD_FIELDS if name in self.__dict__
+        }
+
+    @classmethod
+    def claim_change_version(cls, form_id):
+        """
+        在当前事务中递增申请表的 data_version，返回新版本号（必须在事务中调用）。
+        本事务写入的计算项目 / 删除记录以它作为 change_version。申请表行锁持续到事务结束，
+        同一申请表的写入事务按提交顺序取得递增的版本号：读到已提交的版本号 V 时，
+        change_version <= V 的写入都已经提交。
+        """
+        cls.objects.filter(id=form_id).update(data_version=models.F('data_version') + 1)
+        return cls.objects.filter(id=form_id).values_list('data_version', flat=True).get()
+
+    def item_payload_changed(self):
+        """从数据库读出之后 name / code 是否被修改过"""
+        loaded = getattr(self, '_loaded_item_payload', {})
+        return any(self.__dict__.get(name, value) != value for name, value in loaded.items())
+
+    def save(self, *args, **kwargs):
+        # data_version 只由 form_version 用 F() 表达式递增；整行保存时不写回读取时的旧版本号，
+        # 否则会覆盖事务提交后并发执行的递增，过期的 ETag 又能匹配
+        if not self._state.adding and not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'data_version' and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+        self._reset_item_payload()
+
 
 class DynamicSupplyItem(models.Model):
     """动态申请表的耗材项目"""
@@ -483,14 +537,48 @@ class DynamicCalculationItem(models.Model):
     # 可见性/逻辑删除
     is_visible = models.BooleanField(default=True, verbose_name="是否可见")
 
+    # 最后一次写入时申请表的 data_version（ApplicationForm.claim_change_version），增量同步按它取变化的项目
+    change_version = models.PositiveIntegerField(default=0, verbose_name="修改版本")
+
     class Meta:
         verbose_name = "动态计算表项目"
         verbose_name_plural = "动态计算表项目"
         ordering = ['form', 'no']
         unique_together = ['form', 'no']
+        indexes = [
+            # by_form 默认只取可见项目并按 no 排序：部分索引只包含可见行
+            models.Index(fields=['form', 'no'], name='calc_item_visible_no_idx', condition=models.Q(is_visible=True)),
+            # 导入时按物料名称匹配已有项目
+            models.Index(fields=['form', 'material_name'], name='calc_item_form_material_idx'),
+            # 增量同步（by_form?since=）按修改版本取变化的项目
+            models.Index(fields=['form', 'change_version'], name='calc_item_form_change_idx'),
+        ]
+
+    # 申请表汇总（supplies.summary）依赖的字段：单条保存时按读取时的值计算汇总增量
+    SUMMARY_SOURCE_FIELDS = ('form_id', 'is_visible', 'monthly_demand', 'actual_order', 'unit_price')
 
     def __str__(self):
         return f"{self.form.code}-计算-{self.no}: {self.material_name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._reset_summary_source()
+        return instance
+
+    def _reset_summary_source(self):
+        self._loaded_summary_source = {
+            name: self.__dict__[name] for name in self.SUMMARY_SOURCE_FIELDS if name in self.__dict__
+        }
+
+    def save(self, *args, **kwargs):
+        # 版本号和行写入在同一事务中提交，增量同步不会读到版本号而漏掉这次写入
+        with transaction.atomic():
+            self.change_version = ApplicationForm.claim_change_version(self.form_id)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = [*kwargs['update_fields'], 'change_version']
+            super().save(*args, **kwargs)
+        self._reset_summary_source()
     
     # 🆕 多站别数据处理方法
     def get_station_count(self):
@@ -543,8 +631,82 @@ class DynamicForecastData(models.Model):
         return f"{self.form.code}-预测: {self.name}"
 
 
+class SupplySummary(models.Model):
+    """统计汇总表 - 按分类 / 申请表预先汇总，统计页面直接读取（由 supplies.summary 维护）"""
+    SCOPE_CHOICES = [
+        ('category', '耗材分类'),
+        ('form', '申请表'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES, verbose_name="汇总范围")
+    key = models.CharField(max_length=100, verbose_name="分组键")
+    form = models.ForeignKey(ApplicationForm, on_delete=models.CASCADE, null=True, blank=True, related_name='summaries', verbose_name="申请表")
+    category = models.CharField(max_length=100, blank=True, verbose_name="分类")
+
+    item_count = models.IntegerField(default=0, verbose_name="项目数")
+    total_stock = models.IntegerField(default=0, verbose_name="库存总数")
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="总金额")
+    total_demand = models.IntegerField(default=0, verbose_name="总需求")
+    total_actual_order = models.IntegerField(default=0, verbose_name="实际订购总数")
+    low_stock_count = models.IntegerField(default=0, verbose_name="低库存数量")
+
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "统计汇总"
+        verbose_name_plural = "统计汇总"
+        ordering = ['scope', 'key']
+        unique_together = ['scope', 'key']
+
+    def __str__(self):
+        return f"{self.get_scope_display()}-{self.key}"
+
+
+class FormItemSequence(models.Model):
+    """申请表计算项目序号（No.）计数器，由 supplies.sequences 加行锁分配"""
+    form = models.OneToOneField(
+        ApplicationForm, on_delete=models.CASCADE, primary_key=True, related_name='item_sequence', verbose_name="申请表"
+    )
+    last_no = models.IntegerField(default=0, verbose_name="已分配的最大序号")
+
+    class Meta:
+        verbose_name = "计算项目序号"
+        verbose_name_plural = "计算项目序号"
+
+    def __str__(self):
+        return f"{self.form_id}: {self.last_no}"
+
+
+class CalculationItemTombstone(models.Model):
+    """已删除计算项目的墓碑记录，供 by_form?since= 增量同步返回删除列表"""
+    # 不使用外键：删除申请表时级联删除的项目也会写墓碑，不能依赖申请表仍然存在
+    form_id = models.IntegerField(verbose_name="申请表ID")
+    item_id = models.IntegerField(verbose_name="计算项目ID")
+    deleted_at = models.DateTimeField(auto_now_add=True, verbose_name="删除时间")
+    change_version = models.PositiveIntegerField(default=0, verbose_name="修改版本")
+
+    class Meta:
+        verbose_name = "计算项目删除记录"
+        verbose_name_plural = "计算项目删除记录"
+        indexes = [
+            models.Index(fields=['form_id', 'deleted_at']),
+            models.Index(fields=['form_id', 'change_version'], name='calc_tombstone_change_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.form_id}-{self.item_id}"
+
+
 class ImportLog(models.Model):
-    """导入日志模型 - 记录Excel导入操作"""
+    """导入日志模型 - 记录Excel导入操作（同时作为后台导入任务）"""
+    STATUS_CHOICES = [
+        ('pending', '排队中'),
+        ('running', '导入中'),
+        ('completed', '已完成'),
+        ('failed', '失败'),
+    ]
+
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="操作用户")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="导入时间")
@@ -557,6 +719,19 @@ class ImportLog(models.Model):
     error_count = models.IntegerField(default=0, verbose_name="错误数量")
     error_details = models.TextField(blank=True, verbose_name="错误详情")
 
+    # 🆕 后台导入任务状态
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed', db_index=True, verbose_name="任务状态")
+    stage = models.CharField(max_length=50, blank=True, verbose_name="当前阶段")
+    table_type = models.CharField(max_length=20, blank=True, verbose_name="表格类型")
+    sheet_name = models.CharField(max_length=255, blank=True, verbose_name="Sheet名称")
+    form_id = models.IntegerField(null=True, blank=True, verbose_name="目标申请表ID")
+    file_path = models.CharField(max_length=500, blank=True, verbose_name="上传文件路径")
+    total_rows = models.IntegerField(default=0, verbose_name="总行数")
+    processed_rows = models.IntegerField(default=0, verbose_name="已处理行数")
+    result_data = models.JSONField(default=dict, blank=True, verbose_name="导入结果数据")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="开始时间")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="结束时间")
+
     class Meta:
         verbose_name = "导入日志"
         verbose_name_plural = "导入日志"
@@ -564,3 +739,19 @@ class ImportLog(models.Model):
 
     def __str__(self):
         return f"{self.file_name} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+    @property
+    def duration(self):
+        """导入耗时（秒），未开始时为 None"""
+        if not self.started_at:
+            return None
+        return ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+
+    @property
+    def progress(self):
+        """导入进度百分比"""
+        if self.status == 'completed':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(99, int(self.processed_rows * 100 / self.total_rows))
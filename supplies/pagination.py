@@ -0,0 +1,107 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class FormItemKeysetPagination(BasePagination):
+    """
+    按 (form_id, no) 排序的键集(游标)分页 - 按需启用
+
+    只有请求中带了 `cursor` 或 `page_size` 参数时才分页，
+    否则 paginate_queryset 返回 None，视图照旧返回完整列表，兼容老客户端。
+    游标记录上一页最后一行的 (form_id, no)，下一页直接用索引定位，
+    不会像 OFFSET 分页那样越往后越慢。
+    """
+    ordering = ('form_id', 'no')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    default_page_size = 200
+    max_page_size = 1000
+    invalid_cursor_message = '无效的游标'
+
+    def is_requested(self, request):
+        """客户端是否显式要求分页"""
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            form_id, no = position
+            queryset = queryset.filter(Q(form_id__gt=form_id) | Q(form_id=form_id, no__gt=no))
+
+        # 多取一行用于判断是否还有下一页
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        self.next_position = None
+        if self.has_next and results:
+            last = results[-1]
+            self.next_position = (last.form_id, last.no)
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.default_page_size))
+        except (TypeError, ValueError):
+            return self.default_page_size
+        if page_size <= 0:
+            return self.default_page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            form_id, no = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+            return int(form_id), int(no)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        raw = json.dumps(list(position), separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.encode_cursor(self.next_position) if self.next_position else None,
+            'page_size': self.page_size,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'page_size': {'type': 'integer'},
+                'results': schema,
+            },
+        }
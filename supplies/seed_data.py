@@ -0,0 +1,218 @@
+"""
+基准测试 / 查询计划分析用的种子数据
+
+按固定随机种子生成可重复的数据集：N 个申请表 × M 个计算项目
+（约一半为多站别项目，同一物料分布在多个使用站别）、管控表项目、
+耗材及库存变动记录、操作日志。所有数据通过 bulk_create 写入，
+代码、名称都带 BENCH 前缀，便于与业务数据区分和清理。
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import OperationLog
+
+from .chase_sync import CHASE_WEEKS
+from .models import (
+    ApplicationForm, ApplicationTemplate, B453SupplyItem, DynamicCalculationItem, InventoryRecord, Supply,
+)
+
+PREFIX = 'BENCH'
+STATIONS = ['ICT', 'FCT', 'ATE', 'SMT', 'AOI', 'BURN-IN']
+DEPARTMENTS = ['TE課', 'PE課', 'QA課', 'ME課']
+CATEGORIES = ['探针', '治具', '耗材', '清洁用品', '包装材料']
+PURCHASERS = ['张三', '李四', '王五', '赵六']
+
+
+def _multi_station_data(rng, stations):
+    count = len(stations)
+
+    def ints(low, high):
+        return [rng.randint(low, high) for _ in range(count)]
+
+    usage_per_set = ints(1, 8)
+    usage_count = ints(1000, 50000)
+    monthly_capacity = ints(1000, 20000)
+    min_stock = ints(0, 50)
+    max_stock = [value + rng.randint(10, 100) for value in min_stock]
+    monthly_demand = [
+        round(capacity * usage / count_) if count_ else 0
+        for capacity, usage, count_ in zip(monthly_capacity, usage_per_set, usage_count)
+    ]
+    return {
+        'stations': stations,
+        'usage_per_set': usage_per_set,
+        'usage_count': usage_count,
+        'monthly_capacity': monthly_capacity,
+        'min_stock': min_stock,
+        'min_total_stock': min_stock,
+        'max_stock': max_stock,
+        'max_total_stock': max_stock,
+        'monthly_demand': monthly_demand,
+        'monthly_net_demand': monthly_demand,
+        'actual_order': monthly_demand,
+        'moq_remark': [''] * count,
+    }
+
+
+def _chase_data(rng):
+    return {
+        month: {week: rng.randint(0, 200) for week in CHASE_WEEKS}
+        for month in ('2025-07', '2025-08')
+    }
+
+
+@transaction.atomic
+def seed_dataset(forms=10, items_per_form=200, supplies=500, records_per_supply=5, logs=5000, seed=42):
+    """生成种子数据，返回各表写入的行数"""
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    user, _ = User.objects.get_or_create(username=f'{PREFIX.lower()}_user', defaults={'email': 'bench@example.com'})
+    template, _ = ApplicationTemplate.objects.get_or_create(
+        code=f'{PREFIX}_TEMPLATE',
+        defaults={'name': '基准测试模板', 'created_by': user, 'has_calculation': True},
+    )
+
+    # 管控表项目（计算项目通过 linked_supply_item_id 关联）
+    materials = max(items_per_form // 2, 1)
+    start = B453SupplyItem.objects.count()
+    B453SupplyItem.objects.bulk_create([
+        B453SupplyItem(
+            serial_number=start + index + 1,
+            material_description=f'{PREFIX} 物料 {index:05d} 探针/治具规格 {rng.randint(100, 999)}',
+            purchaser=rng.choice(PURCHASERS),
+            unit_price=Decimal(rng.randint(100, 100000)) / 100,
+            min_safety_stock=rng.randint(0, 50),
+            max_safety_stock=rng.randint(50, 200),
+            moq=rng.choice([1, 10, 50, 100]),
+            lead_time_weeks=rng.randint(1, 12),
+            created_by=user,
+        )
+        for index in range(materials)
+    ], batch_size=1000)
+    supply_item_ids = list(
+        B453SupplyItem.objects.filter(material_description__startswith=PREFIX).order_by('-id').values_list('id', flat=True)[:materials]
+    )
+
+    # 申请表和计算项目：每个物料分布在 1~3 个使用站别
+    existing = ApplicationForm.objects.filter(code__startswith=f'{PREFIX}_').count()
+    form_objs = ApplicationForm.objects.bulk_create([
+        ApplicationForm(
+            template=template,
+            name=f'{PREFIX} 申请表 {existing + index}',
+            code=f'{PREFIX}_{existing + index:05d}',
+            department=rng.choice(DEPARTMENTS),
+            period='2025年7月',
+            created_by=user,
+        )
+        for index in range(forms)
+    ])
+    form_ids = [form.id for form in form_objs]
+    if None in form_ids:  # 不支持 RETURNING 的数据库
+        form_ids = list(
+            ApplicationForm.objects.filter(code__startswith=f'{PREFIX}_').order_by('-id').values_list('id', flat=True)[:forms]
+        )
+
+    items = []
+    for form_id in form_ids:
+        no = 0
+        while no < items_per_form:
+            material = rng.randrange(materials)
+            stations = rng.sample(STATIONS, k=min(rng.randint(1, 3), items_per_form - no))
+            multi = rng.random() < 0.5
+            for station in ([', '.join(stations)] if multi else stations):
+                no += 1
+                data = _multi_station_data(rng, stations) if multi else {}
+                items.append(DynamicCalculationItem(
+                    form_id=form_id,
+                    no=no,
+                    material_name=f'{PREFIX} 物料 {material:05d}',
+                    usage_station=station,
+                    usage_per_set=rng.randint(1, 8),
+                    usage_count=rng.randint(1000, 50000),
+                    monthly_capacity=rng.randint(1000, 20000),
+                    min_stock=rng.randint(0, 50),
+                    max_stock=rng.randint(50, 200),
+                    monthly_demand=rng.randint(0, 500),
+                    monthly_net_demand=rng.randint(0, 1500),
+                    actual_order=rng.randint(0, 1500),
+                    purchaser=rng.choice(PURCHASERS),
+                    unit_price=Decimal(rng.randint(100, 100000)) / 100,
+                    moq=rng.choice([1, 10, 50, 100]),
+                    linked_supply_item_id=supply_item_ids[material] if supply_item_ids and rng.random() < 0.8 else None,
+                    is_multi_station=multi,
+                    multi_station_data=data,
+                    chase_data=_chase_data(rng),
+                    monthly_data={'2025-07': {'demand': rng.randint(0, 500), 'stock': rng.randint(0, 500)}},
+                    is_visible=rng.random() > 0.05,
+                ))
+    DynamicCalculationItem.objects.bulk_create(items, batch_size=1000)
+
+    # 耗材和库存变动记录
+    supply_objs = Supply.objects.bulk_create([
+        Supply(
+            name=f'{PREFIX} 耗材 {index:05d}',
+            category=rng.choice(CATEGORIES),
+            unit='pcs',
+            unit_price=Decimal(rng.randint(100, 100000)) / 100,
+            current_stock=rng.randint(0, 500),
+            safety_stock=rng.randint(0, 100),
+        )
+        for index in range(supplies)
+    ], batch_size=1000)
+    supply_ids = [supply.id for supply in supply_objs]
+    if None in supply_ids:
+        supply_ids = list(Supply.objects.filter(name__startswith=PREFIX).order_by('-id').values_list('id', flat=True)[:supplies])
+    records = [
+        InventoryRecord(
+            type=rng.choice(['in', 'out', 'adjust']),
+            supply_id=supply_id,
+            quantity=rng.randint(1, 50),
+            operator=rng.choice(PURCHASERS),
+            department=rng.choice(DEPARTMENTS),
+            previous_stock=0,
+            new_stock=0,
+        )
+        for supply_id in supply_ids
+        for _ in range(records_per_supply)
+    ]
+    InventoryRecord.objects.bulk_create(records, batch_size=1000)
+
+    # 操作日志：created_at 为 auto_now_add，写入后按序号分散到最近 30 天
+    OperationLog.objects.bulk_create([
+        OperationLog(
+            user=user,
+            operation_type=rng.choice(['view', 'view', 'view', 'update', 'create', 'delete']),
+            model_name=rng.choice(['DynamicCalculationItem', 'Supply', 'ApplicationForm']),
+            object_id=str(rng.randint(1, 10000)),
+            description=f'{PREFIX} 操作',
+            ip_address='127.0.0.1',
+            status_code=rng.choice([200, 200, 200, 201, 400, 404]),
+            execution_time=rng.random(),
+        )
+        for _ in range(logs)
+    ], batch_size=1000)
+    log_ids = list(
+        OperationLog.objects.filter(description=f'{PREFIX} 操作').order_by('-id').values_list('id', flat=True)[:logs]
+    )
+    for offset in range(0, len(log_ids), 50):
+        # 每 50 条一组更新时间，避免逐行 UPDATE
+        OperationLog.objects.filter(id__in=log_ids[offset:offset + 50]).update(
+            created_at=now - timedelta(days=30) * (offset / len(log_ids))
+        )
+
+    return {
+        'forms': len(form_ids),
+        'calculation_items': len(items),
+        'supply_items': len(supply_item_ids),
+        'supplies': len(supply_ids),
+        'inventory_records': len(records),
+        'operation_logs': logs,
+        'form_ids': form_ids,
+        'user_id': user.id,
+    }
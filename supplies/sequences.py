@@ -0,0 +1,62 @@
+"""
+计算项目序号（No.）分配
+
+每个申请表一行 FormItemSequence 计数器，分配时 select_for_update 锁住该行再递增，
+并发新增使用站别时后到的事务会等待前一个提交，不会与 unique_together(form, no) 冲突；
+也不再需要每次插入都 count() 整个申请表。
+
+- allocate_item_numbers(form_id, count) 一次分配 count 个连续序号，供导入、复制模板批量写入
+- 计数器不存在时（历史申请表）按现有最大序号初始化
+- 手工指定 no 新建的项目通过 post_save 信号推进计数器，之后分配的序号不会与之重复
+- 删除项目不回收序号，No. 允许出现空号
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import DynamicCalculationItem, FormItemSequence
+
+
+def _locked_sequence(form_id):
+    sequence = FormItemSequence.objects.select_for_update().filter(form_id=form_id).first()
+    if sequence is not None:
+        return sequence
+    last_no = DynamicCalculationItem.objects.filter(form_id=form_id).aggregate(last_no=Max('no'))['last_no'] or 0
+    try:
+        with transaction.atomic():
+            return FormItemSequence.objects.create(form_id=form_id, last_no=last_no)
+    except IntegrityError:
+        # 并发事务已创建计数器，等待其提交后重新加锁读取
+        return FormItemSequence.objects.select_for_update().get(form_id=form_id)
+
+
+def allocate_item_numbers(form_id, count=1):
+    """
+    为申请表分配 count 个连续序号，返回 range。
+    计数器行锁持续到外层事务结束，调用方应在同一事务中写入项目。
+    """
+    if count <= 0:
+        return range(0)
+    with transaction.atomic():
+        sequence = _locked_sequence(form_id)
+        start = sequence.last_no + 1
+        sequence.last_no += count
+        sequence.save(update_fields=['last_no'])
+    return range(start, start + count)
+
+
+def reset_item_numbers(form_id, last_no=0):
+    """清空申请表项目后重置计数器（导入整表替换时使用）"""
+    FormItemSequence.objects.update_or_create(form_id=form_id, defaults={'last_no': last_no})
+
+
+def advance_item_numbers(form_id, no):
+    """确保计数器不小于 no（写入了未经分配的序号时调用）"""
+    FormItemSequence.objects.filter(form_id=form_id, last_no__lt=no).update(last_no=no)
+
+
+@receiver(post_save, sender=DynamicCalculationItem)
+def _calculation_item_saved(sender, instance, created, **kwargs):
+    if created and instance.no:
+        advance_item_numbers(instance.form_id, instance.no)
@@ -2,12 +2,70 @@ from rest_framework import serializers
 from .models import Supply, InventoryRecord, B482SupplyItem, AndorSupplyItem, CapacityForecast, B453SupplyItem, B453CalculationItem, B453ForecastData, ApplicationTemplate, ApplicationForm, DynamicSupplyItem, DynamicCalculationItem, DynamicForecastData
 from django.contrib.auth.models import User
 
+
+def parse_field_list(value):
+    """解析逗号分隔的字段列表参数"""
+    if not value:
+        return set()
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    稀疏字段集序列化器
+    GET 请求可通过 ?fields=a,b 只返回指定字段，或 ?exclude=c,d 排除字段（主键始终保留）。
+    视图层再根据裁剪后的字段对查询集 defer()，未返回的列（尤其是JSON大字段）不会从数据库读取。
+    """
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested, excluded = self.get_sparse_fieldset()
+        if not requested and not excluded:
+            return
+
+        pk_name = self.Meta.model._meta.pk.name
+        for name in list(self.fields):
+            if name == pk_name:
+                continue
+            if (requested and name not in requested) or name in excluded:
+                self.fields.pop(name)
+
+    def get_sparse_fieldset(self):
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return set(), set()
+        query_params = getattr(request, 'query_params', request.GET)
+        return (
+            parse_field_list(query_params.get(self.fields_query_param)),
+            parse_field_list(query_params.get(self.exclude_query_param)),
+        )
+
+    def get_deferrable_model_fields(self):
+        """返回当前输出字段用不到、可以 defer 的模型字段名"""
+        needed = set()
+        for field in self.fields.values():
+            if field.source == '*':
+                return []
+            attr = field.source.split('.')[0]
+            needed.add(attr)
+            # get_xxx_display 依赖 xxx 字段本身
+            if attr.startswith('get_') and attr.endswith('_display'):
+                needed.add(attr[len('get_'):-len('_display')])
+
+        return [
+            field.name
+            for field in self.Meta.model._meta.concrete_fields
+            if not field.primary_key and field.name not in needed and field.attname not in needed
+        ]
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
 
-class SupplySerializer(serializers.ModelSerializer):
+class SupplySerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Supply
         fields = '__all__'
@@ -28,7 +86,7 @@ class SupplySerializer(serializers.ModelSerializer):
         # 确保更新时也有默认值
         return super().update(instance, validated_data)
 
-class InventoryRecordSerializer(serializers.ModelSerializer):
+class InventoryRecordSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     supply_name = serializers.CharField(source='supply.name', read_only=True)
     supply_category = serializers.CharField(source='supply.category', read_only=True)
     supply_unit = serializers.CharField(source='supply.unit', read_only=True)
@@ -38,7 +96,7 @@ class InventoryRecordSerializer(serializers.ModelSerializer):
         model = InventoryRecord
         fields = '__all__'
 
-class SupplyDetailSerializer(serializers.ModelSerializer):
+class SupplyDetailSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     records = InventoryRecordSerializer(many=True, read_only=True)
     
     class Meta:
@@ -49,7 +107,7 @@ class SupplyDetailSerializer(serializers.ModelSerializer):
 # 🆕 B482耗材管控申请表序列化器
 # ================================
 
-class B482SupplyItemSerializer(serializers.ModelSerializer):
+class B482SupplyItemSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """B482耗材管控申请表序列化器"""
     
     class Meta:
@@ -65,7 +123,7 @@ class B482SupplyItemSerializer(serializers.ModelSerializer):
 # 🆕 Andor耗材需求计算表序列化器
 # ================================
 
-class AndorSupplyItemSerializer(serializers.ModelSerializer):
+class AndorSupplyItemSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Andor耗材需求计算表序列化器"""
     
     class Meta:
@@ -81,7 +139,7 @@ class AndorSupplyItemSerializer(serializers.ModelSerializer):
 # 🆕 产能预测数据序列化器
 # ================================
 
-class CapacityForecastSerializer(serializers.ModelSerializer):
+class CapacityForecastSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """产能预测数据序列化器"""
     
     class Meta:
@@ -97,7 +155,7 @@ class CapacityForecastSerializer(serializers.ModelSerializer):
 # 🆕 B453 SMT ATE耗材管控表序列化器
 # ================================
 
-class B453SupplyItemSerializer(serializers.ModelSerializer):
+class B453SupplyItemSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """B453 SMT ATE耗材管控表序列化器"""
     
     class Meta:
@@ -113,7 +171,7 @@ class B453SupplyItemSerializer(serializers.ModelSerializer):
 # 🆕 B453耗材需求计算表序列化器
 # ================================
 
-class B453CalculationItemSerializer(serializers.ModelSerializer):
+class B453CalculationItemSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """B453耗材需求计算表序列化器"""
     
     class Meta:
@@ -129,7 +187,7 @@ class B453CalculationItemSerializer(serializers.ModelSerializer):
 # 🆕 B453产能预测数据序列化器
 # ================================
 
-class B453ForecastDataSerializer(serializers.ModelSerializer):
+class B453ForecastDataSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """B453产能预测数据序列化器"""
     
     class Meta:
@@ -145,7 +203,7 @@ class B453ForecastDataSerializer(serializers.ModelSerializer):
 # 🆕 动态申请表序列化器
 # ================================
 
-class ApplicationTemplateSerializer(serializers.ModelSerializer):
+class ApplicationTemplateSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = ApplicationTemplate
         fields = '__all__'
@@ -156,7 +214,7 @@ class ApplicationTemplateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class ApplicationFormSerializer(serializers.ModelSerializer):
+class ApplicationFormSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     template_name = serializers.CharField(source='template.name', read_only=True)
     template_type = serializers.CharField(source='template.template_type', read_only=True)
     has_calculation = serializers.BooleanField(source='template.has_calculation', read_only=True)
@@ -165,14 +223,14 @@ class ApplicationFormSerializer(serializers.ModelSerializer):
     class Meta:
         model = ApplicationForm
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at', 'created_by')
+        read_only_fields = ('created_at', 'updated_at', 'created_by', 'data_version')
 
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
         return super().create(validated_data)
 
 
-class DynamicSupplyItemSerializer(serializers.ModelSerializer):
+class DynamicSupplyItemSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     form_name = serializers.CharField(source='form.name', read_only=True)
     form_code = serializers.CharField(source='form.code', read_only=True)
     
@@ -181,7 +239,7 @@ class DynamicSupplyItemSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class DynamicCalculationItemSerializer(serializers.ModelSerializer):
+class DynamicCalculationItemSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     form_name = serializers.CharField(source='form.name', read_only=True)
     form_code = serializers.CharField(source='form.code', read_only=True)
     purchaser = serializers.CharField(allow_blank=True, required=False)
@@ -218,7 +276,7 @@ class DynamicCalculationItemSerializer(serializers.ModelSerializer):
         return result
 
 
-class DynamicForecastDataSerializer(serializers.ModelSerializer):
+class DynamicForecastDataSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     form_name = serializers.CharField(source='form.name', read_only=True)
     form_code = serializers.CharField(source='form.code', read_only=True)
     
@@ -0,0 +1,163 @@
+"""
+库存调整（入库 / 出库 / 盘点调整）
+
+所有库存变动都在一个事务中完成：
+- 按 id 顺序 select_for_update 锁住涉及的耗材行，并发的入库/出库请求在行锁上排队，不会丢失更新；
+  多个耗材按固定顺序加锁，批量调整之间不会互相死锁
+- 在内存中按提交顺序依次应用变动（同一耗材先入库后出库时，出库按入库后的库存判断）
+- bulk_update 只写回 current_stock / unit_price / updated_at，bulk_create 写入变动记录
+
+单次调整就是只有一条变动的批量调整，查询次数固定为 加锁读取 + 更新 + 插入记录。
+分类汇总按变动前后的库存和单价在提交后增量更新，不重新聚合整张耗材表。
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import InventoryRecord, Supply
+from .summary import schedule_category_deltas
+
+ADJUSTMENT_TYPES = ('in', 'out', 'adjust')
+
+
+class StockError(ValueError):
+    """库存调整参数不合法、耗材不存在或库存不足"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_movement(data):
+    """校验一条库存变动（请求数据），返回 {supply_id, type, quantity, unit_price, remark}"""
+    if not isinstance(data, dict):
+        raise StockError('库存变动格式错误')
+    supply_id = data.get('supply_id')
+    adjustment_type = data.get('type')
+    quantity = data.get('quantity')
+    unit_price = data.get('unit_price')
+
+    if not all([supply_id, adjustment_type, quantity]):
+        raise StockError('缺少必要参数')
+    if adjustment_type not in ADJUSTMENT_TYPES:
+        raise StockError('操作类型必须是 in、out 或 adjust')
+    try:
+        supply_id = int(supply_id)
+    except (TypeError, ValueError):
+        raise StockError('耗材ID必须是有效数字')
+    try:
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        raise StockError('数量必须是有效数字')
+    if quantity <= 0:
+        raise StockError('数量必须大于0')
+
+    # 验证单价（如果提供了的话）
+    if unit_price is not None:
+        try:
+            unit_price = Decimal(str(unit_price))
+        except InvalidOperation:
+            raise StockError('单价必须是有效数字')
+        if not unit_price.is_finite():
+            raise StockError('单价必须是有效数字')
+        if unit_price < 0:
+            raise StockError('单价不能为负数')
+
+    return {
+        'supply_id': supply_id,
+        'type': adjustment_type,
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'remark': data.get('remark') or '',
+    }
+
+
+def _new_stock(previous_stock, adjustment_type, quantity):
+    if adjustment_type == 'in':
+        return previous_stock + quantity
+    if adjustment_type == 'out':
+        if previous_stock < quantity:
+            raise StockError('库存不足')
+        return previous_stock - quantity
+    return quantity
+
+
+def _category_deltas(originals, changed):
+    """changed 中各耗材相对 originals（变动前的 current_stock, unit_price）的分类汇总增量"""
+    deltas = {}
+    for supply in changed:
+        previous_stock, previous_price = originals[supply.id]
+        delta = deltas.setdefault(supply.category, {'total_stock': 0, 'total_amount': Decimal('0'), 'low_stock_count': 0})
+        delta['total_stock'] += supply.current_stock - previous_stock
+        delta['total_amount'] += supply.current_stock * supply.unit_price - previous_stock * previous_price
+        delta['low_stock_count'] += (
+            (supply.current_stock <= supply.safety_stock) - (previous_stock <= supply.safety_stock)
+        )
+    return deltas
+
+
+def apply_stock_movements(movements, operator, department, all_or_nothing=False):
+    """
+    在一个事务中按顺序应用 parse_movement 校验后的库存变动。
+    返回与 movements 一一对应的结果：{'success': True, 'record': InventoryRecord}
+    或 {'success': False, 'error': StockError}。
+    all_or_nothing=True 时任一变动失败则不写入任何变动（成功项的 record 不会保存）。
+    """
+    now = timezone.now()
+    results, records, changed = [], [], {}
+    with transaction.atomic():
+        supplies = {
+            supply.id: supply
+            for supply in Supply.objects.select_for_update().filter(
+                id__in={movement['supply_id'] for movement in movements}
+            ).order_by('id')
+        }
+        originals = {supply.id: (supply.current_stock, supply.unit_price) for supply in supplies.values()}
+
+        for movement in movements:
+            supply = supplies.get(movement['supply_id'])
+            try:
+                if supply is None:
+                    raise StockError('耗材不存在', status_code=404)
+                previous_stock = supply.current_stock
+                new_stock = _new_stock(previous_stock, movement['type'], movement['quantity'])
+            except StockError as e:
+                results.append({'success': False, 'error': e})
+                continue
+
+            supply.current_stock = new_stock
+            if movement['unit_price'] is not None:
+                supply.unit_price = movement['unit_price']
+            supply.updated_at = now
+            changed[supply.id] = supply
+
+            record = InventoryRecord(
+                type=movement['type'],
+                supply=supply,
+                quantity=movement['quantity'],
+                operator=operator,
+                department=department,
+                remark=movement['remark'],
+                previous_stock=previous_stock,
+                new_stock=new_stock,
+            )
+            records.append(record)
+            results.append({'success': True, 'record': record})
+
+        if all_or_nothing and len(records) < len(movements):
+            return results
+        if changed:
+            Supply.objects.bulk_update(changed.values(), ['current_stock', 'unit_price', 'updated_at'], batch_size=500)
+            InventoryRecord.objects.bulk_create(records, batch_size=500)
+            # bulk_update 不触发 post_save，分类汇总按变动增量更新
+            schedule_category_deltas(_category_deltas(originals, changed.values()))
+    return results
+
+
+def adjust_stock(movement, operator, department):
+    """应用一条库存变动，返回 InventoryRecord；失败时抛出 StockError"""
+    [result] = apply_stock_movements([movement], operator, department, all_or_nothing=True)
+    if not result['success']:
+        raise result['error']
+    return result['record']
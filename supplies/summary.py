@@ -0,0 +1,315 @@
+"""
+统计汇总表（SupplySummary）维护
+
+统计页面只读汇总表，不再每次请求都对明细做聚合：
+- 分类汇总（scope='category'）：按 Supply.category 汇总库存数量、库存金额和低库存数量
+  （低库存 = current_stock <= safety_stock，与 Supply 的低库存判断一致）
+- 申请表汇总（scope='form'）：按申请表汇总可见计算项目的数量、需求、实际订购数量和订购金额
+  （计算项目没有库存下限的概念，申请表汇总不统计低库存数量，low_stock_count 始终为 0）
+
+汇总表由迁移 0024 初始化，之后随写入维护；统计接口不在请求中全量聚合。
+也可以用 refresh_supply_summaries 命令（或统计接口的 ?refresh=1）全量刷新、校正偏差。
+
+申请表汇总：
+- 单条计算项目保存通过信号按读取时的值和保存后的值计算增量（数量/需求/订购/金额），
+  事务提交后用 F() 表达式更新对应的汇总行，不再对整个申请表分组聚合；
+  只修改了与汇总无关字段（update_fields 不包含汇总字段）的保存直接跳过
+- 批量写入（bulk_create / bulk_update / update）通过显式调用 schedule_form_summary
+  登记需要刷新的申请表，在事务提交后每个申请表只聚合一次。同一事务中已经登记了全量刷新的
+  申请表，之后的单条增量并入这次刷新，避免重复计算
+- 计算项目的删除由 delta_sync.delete_calculation_items 登记（不注册删除信号，保留快速删除）
+
+分类汇总是整张 Supply 表的分组聚合，不在每次写入后同步重算：
+- 库存变动（入库/出库/盘点）已知变动前后的库存和单价，通过 schedule_category_deltas
+  在事务提交后用 F() 表达式增量更新对应分类的汇总行，每个分类一条 UPDATE
+- 其他 Supply 保存/删除（新增耗材、修改分类或安全库存等）只标记分类汇总需要刷新，
+  由后台线程在 DEBOUNCE_SECONDS 后合并执行一次全量聚合；ASYNC=False 时在事务提交后同步刷新
+- 增量更新基于读取时的值，与并发写入或并发的全量刷新之间可能产生偏差，可用全量刷新校正
+"""
+import logging
+import threading
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import DynamicCalculationItem, Supply, SupplySummary
+
+logger = logging.getLogger('django')
+
+DEFAULT_SETTINGS = {
+    'ASYNC': True,
+    'DEBOUNCE_SECONDS': 2.0,
+}
+
+SUMMARY_FIELDS = [
+    'form', 'category', 'item_count', 'total_stock', 'total_amount',
+    'total_demand', 'total_actual_order', 'low_stock_count',
+]
+
+FORM_DELTA_FIELDS = ('item_count', 'total_demand', 'total_actual_order', 'total_amount')
+
+# 保存时 update_fields 与这些字段没有交集，则申请表汇总不变
+_ITEM_SUMMARY_UPDATE_FIELDS = {'form', 'form_id', 'is_visible', 'monthly_demand', 'actual_order', 'unit_price'}
+
+_AMOUNT = DecimalField(max_digits=16, decimal_places=2)
+
+
+def get_summary_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'SUPPLY_SUMMARY', {})}
+
+
+def refresh_category_summary():
+    """按分类重新汇总 Supply（分类数量很少，一条分组查询全部刷新）"""
+    rows = Supply.objects.values('category').annotate(
+        item_count=Count('id'),
+        total_stock=Coalesce(Sum('current_stock'), 0),
+        total_amount=Coalesce(Sum(F('current_stock') * F('unit_price'), output_field=_AMOUNT), Value(Decimal('0')), output_field=_AMOUNT),
+        low_stock_count=Count('id', filter=Q(current_stock__lte=F('safety_stock'))),
+    )
+    summaries = [
+        SupplySummary(
+            scope='category',
+            key=row['category'],
+            category=row['category'],
+            item_count=row['item_count'],
+            total_stock=row['total_stock'],
+            total_amount=row['total_amount'],
+            low_stock_count=row['low_stock_count'],
+        )
+        for row in rows
+    ]
+    _replace('category', summaries)
+
+
+def refresh_form_summary(form_ids=None):
+    """重新汇总指定申请表（None 表示全部申请表）"""
+    items = DynamicCalculationItem.objects.filter(is_visible=True)
+    if form_ids is not None:
+        form_ids = list(form_ids)
+        items = items.filter(form_id__in=form_ids)
+
+    rows = items.values('form_id').annotate(
+        item_count=Count('id'),
+        total_demand=Coalesce(Sum('monthly_demand'), 0),
+        total_actual_order=Coalesce(Sum('actual_order'), 0),
+        total_amount=Coalesce(
+            Sum(F('actual_order') * Coalesce('unit_price', Value(Decimal('0'))), output_field=_AMOUNT),
+            Value(Decimal('0')),
+            output_field=_AMOUNT,
+        ),
+    )
+    summaries = [
+        SupplySummary(
+            scope='form',
+            key=str(row['form_id']),
+            form_id=row['form_id'],
+            item_count=row['item_count'],
+            total_demand=row['total_demand'],
+            total_actual_order=row['total_actual_order'],
+            total_amount=row['total_amount'],
+        )
+        for row in rows
+    ]
+    _replace('form', summaries, keys=None if form_ids is None else [str(form_id) for form_id in form_ids])
+
+
+def _apply_deltas(scope, deltas):
+    """按增量更新汇总行，返回汇总行不存在的分组键"""
+    now = timezone.now()
+    missing = []
+    for key, delta in deltas.items():
+        updated = SupplySummary.objects.filter(scope=scope, key=str(key)).update(
+            **{field: F(field) + value for field, value in delta.items()},
+            updated_at=now,
+        )
+        if not updated:
+            missing.append(key)
+    return missing
+
+
+def apply_category_deltas(deltas):
+    """
+    按增量更新分类汇总：deltas 为 {分类: {'total_stock': 数量变化, 'total_amount': 金额变化,
+    'low_stock_count': 低库存数量变化}}。汇总行不存在的分类（尚未汇总过）改为全量刷新。
+    """
+    if _apply_deltas('category', deltas):
+        refresh_category_summary()
+
+
+def apply_form_deltas(deltas):
+    """
+    按增量更新申请表汇总：deltas 为 {申请表ID: {'item_count', 'total_demand',
+    'total_actual_order', 'total_amount' 的变化}}。汇总行不存在的申请表改为重新汇总，
+    项目数减到 0 的汇总行删除（与全量刷新的结果一致）。
+    """
+    missing = _apply_deltas('form', deltas)
+    if missing:
+        refresh_form_summary(missing)
+    emptied = [str(form_id) for form_id, delta in deltas.items() if delta.get('item_count', 0) < 0]
+    if emptied:
+        SupplySummary.objects.filter(scope='form', key__in=emptied, item_count__lte=0).delete()
+
+
+def calculation_item_contribution(values):
+    """单个计算项目（SUMMARY_SOURCE_FIELDS 的值）对申请表汇总的贡献，隐藏的项目不计入"""
+    if not values['is_visible']:
+        return dict.fromkeys(FORM_DELTA_FIELDS, 0)
+    actual_order = values['actual_order'] or 0
+    unit_price = Decimal(str(values['unit_price'] or 0))
+    return {
+        'item_count': 1,
+        'total_demand': values['monthly_demand'] or 0,
+        'total_actual_order': actual_order,
+        'total_amount': (unit_price * actual_order).quantize(Decimal('0.01')),
+    }
+
+
+def refresh_all_summaries():
+    refresh_category_summary()
+    refresh_form_summary()
+
+
+def _replace(scope, summaries, keys=None):
+    """写入汇总行，并删除范围内已经没有明细的分组（keys 为 None 时范围是整个 scope）"""
+    with transaction.atomic():
+        stale = SupplySummary.objects.filter(scope=scope).exclude(key__in=[summary.key for summary in summaries])
+        if keys is not None:
+            stale = stale.filter(key__in=keys)
+        stale.delete()
+        if summaries:
+            SupplySummary.objects.bulk_create(
+                summaries,
+                update_conflicts=True,
+                unique_fields=['scope', 'key'],
+                update_fields=SUMMARY_FIELDS + ['updated_at'],
+            )
+
+
+# ================================
+# 事务提交后刷新（同一事务内的多次写入只刷新一次）
+# ================================
+
+_pending = threading.local()
+
+
+def _pending_state():
+    if not hasattr(_pending, 'form_ids'):
+        _pending.form_ids = set()
+        _pending.category = False
+    return _pending
+
+
+def _flush():
+    # 同一事务登记的多个回调中，第一个回调刷新全部分组，其余回调为空操作；
+    # 事务回滚时登记的分组保留到下一次刷新
+    state = _pending_state()
+    form_ids, category = state.form_ids, state.category
+    state.form_ids, state.category = set(), False
+    if form_ids:
+        refresh_form_summary(form_ids)
+    if category:
+        if get_summary_settings()['ASYNC']:
+            category_refresher.schedule()
+        else:
+            refresh_category_summary()
+
+
+class CategoryRefresher:
+    """合并分类汇总刷新：第一次标记后等待 DEBOUNCE_SECONDS，期间的标记只触发这一次后台聚合"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def schedule(self):
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(get_summary_settings()['DEBOUNCE_SECONDS'], self._run)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _run(self):
+        # 先清除定时器，聚合期间提交的修改会重新登记下一次刷新
+        with self._lock:
+            self._timer = None
+        try:
+            refresh_category_summary()
+        except Exception:
+            logger.exception('刷新分类汇总失败')
+        finally:
+            # 定时器线程用完即退出，关闭其数据库连接
+            connection.close()
+
+
+category_refresher = CategoryRefresher()
+
+
+def schedule_form_summary(*form_ids):
+    """登记需要刷新的申请表汇总，事务提交后执行"""
+    _pending_state().form_ids.update(int(form_id) for form_id in form_ids if form_id)
+    transaction.on_commit(_flush)
+
+
+def schedule_category_summary():
+    """标记分类汇总需要全量刷新，事务提交后合并执行"""
+    _pending_state().category = True
+    transaction.on_commit(_flush)
+
+
+def schedule_category_deltas(deltas):
+    """登记分类汇总增量（格式同 apply_category_deltas），事务提交后执行；事务回滚时增量随之丢弃"""
+    if deltas:
+        transaction.on_commit(partial(apply_category_deltas, deltas))
+
+
+@receiver(post_save, sender=Supply)
+@receiver(post_delete, sender=Supply)
+def _supply_changed(sender, **kwargs):
+    schedule_category_summary()
+
+
+def schedule_form_deltas(deltas):
+    """
+    登记申请表汇总增量（格式同 apply_form_deltas），事务提交后执行；事务回滚时增量随之丢弃。
+    同一事务中已经登记了全量刷新的申请表并入刷新，不再重复计入增量。
+    """
+    # 回滚的事务登记的申请表会留在 _pending 中，只有当前事务登记了刷新回调时才并入
+    flush_scheduled = any(func is _flush for _, func, _ in connection.run_on_commit)
+    pending = _pending_state().form_ids if flush_scheduled else set()
+    refresh = [form_id for form_id in deltas if form_id in pending]
+    if refresh:
+        schedule_form_summary(*refresh)
+    deltas = {form_id: delta for form_id, delta in deltas.items() if form_id not in pending}
+    if deltas:
+        transaction.on_commit(partial(apply_form_deltas, deltas))
+
+
+@receiver(post_save, sender=DynamicCalculationItem)
+def _calculation_item_changed(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not _ITEM_SUMMARY_UPDATE_FIELDS.intersection(update_fields):
+        return
+
+    fields = DynamicCalculationItem.SUMMARY_SOURCE_FIELDS
+    loaded = getattr(instance, '_loaded_summary_source', {})
+    if not created and len(loaded) < len(fields):
+        # 读取时延迟加载了汇总字段（或不是从数据库读出的实例），无法计算增量
+        schedule_form_summary(instance.form_id, loaded.get('form_id'))
+        return
+
+    current = {name: instance.__dict__.get(name, loaded.get(name)) for name in fields}
+    if not created and loaded['form_id'] != current['form_id']:
+        schedule_form_summary(loaded['form_id'], current['form_id'])
+        return
+
+    after = calculation_item_contribution(current)
+    before = dict.fromkeys(FORM_DELTA_FIELDS, 0) if created else calculation_item_contribution(loaded)
+    delta = {field: after[field] - before[field] for field in FORM_DELTA_FIELDS}
+    if any(delta.values()):
+        schedule_form_deltas({instance.form_id: delta})
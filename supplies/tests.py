@@ -1,3 +1,949 @@
-from django.test import TestCase
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import openpyxl
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import (
+    ApplicationTemplate, ApplicationForm, B453SupplyItem, CalculationItemTombstone, DynamicSupplyItem,
+    DynamicCalculationItem, DynamicForecastData, FormItemSequence, ImportLog, InventoryRecord, Supply, SupplySummary,
+)
+from .calculation import (
+    CalculationError, FormDemandCalculator, calculate_demand, calculate_net_demand, unified_calculate,
+    unified_calculate_many,
+)
+from .delta_sync import delete_calculation_items
+from .excel_reader import SheetTooLarge, WorkbookReader
+from .form_clone import FormCloner
+from .import_jobs import fail_stale_jobs, import_job_runner, requeue_pending_jobs
+from .importers import CalculationTableImport
+from .material_groups import grouped_material_data
+from .sequences import allocate_item_numbers
+from .summary import refresh_category_summary, refresh_form_summary, schedule_form_summary
+
+
+@override_settings(OPERATION_LOG={'ASYNC': False}, OPERATION_LOG_POLICIES={}, SUPPLY_SUMMARY={'ASYNC': False})
+class DynamicItemListQueryCountTests(TestCase):
+    """动态申请表项目列表的查询次数回归测试：查询次数不随行数增长（无 N+1）"""
+
+    # 1 次列表查询 + 1 次操作日志写入
+    EXPECTED_QUERIES = 2
+    # by_form 另外查询 1 次申请表数据版本（ETag）
+    BY_FORM_QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        template = ApplicationTemplate.objects.create(name='测试模板', code='TEST', created_by=cls.user)
+        cls.forms = {}
+        for size in (10, 1000):
+            form = ApplicationForm.objects.create(
+                template=template,
+                name=f'测试申请表{size}',
+                code=f'FORM-{size}',
+                department='TE',
+                period='2025年7月',
+                created_by=cls.user,
+            )
+            DynamicSupplyItem.objects.bulk_create([
+                DynamicSupplyItem(
+                    form=form,
+                    serial_number=i + 1,
+                    material_description=f'耗材{i + 1}',
+                    purchaser='采购员',
+                    unit_price=1,
+                    max_safety_stock=10,
+                    min_safety_stock=1,
+                    moq=1,
+                    lead_time=7,
+                )
+                for i in range(size)
+            ])
+            DynamicCalculationItem.objects.bulk_create([
+                DynamicCalculationItem(form=form, no=i + 1, material_name=f'耗材{i + 1}')
+                for i in range(size)
+            ])
+            DynamicForecastData.objects.bulk_create([
+                DynamicForecastData(form=form, name=f'预测{i + 1}')
+                for i in range(size)
+            ])
+            cls.forms[size] = form
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertConstantQueries(self, url_template):
+        for size, form in self.forms.items():
+            with self.subTest(size=size):
+                with self.assertNumQueries(self.BY_FORM_QUERIES):
+                    response = self.client.get(url_template.format(form_id=form.id))
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                self.assertEqual(len(data), size)
+                self.assertEqual(data[0]['form_code'], form.code)
+
+    def test_calculation_items_by_form(self):
+        self.assertConstantQueries('/api/dynamic-calculation-items/by_form/?form_id={form_id}')
+
+    def test_supply_items_by_form(self):
+        self.assertConstantQueries('/api/dynamic-supply-items/by_form/?form_id={form_id}')
+
+    def test_forecast_data_by_form(self):
+        self.assertConstantQueries('/api/dynamic-forecast-data/by_form/?form_id={form_id}')
+
+    def test_by_form_not_modified(self):
+        """If-None-Match 未变化时返回 304，只查询申请表版本，不读取明细表"""
+        form = self.forms[1000]
+        url = f'/api/dynamic-calculation-items/by_form/?form_id={form.id}'
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        item = DynamicCalculationItem.objects.filter(form=form).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/dynamic-calculation-items/{item.id}/', {'material_name': '新名称'}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_batch_update_purchaser_changes_etag(self):
+        """批量设置采购员后数据版本递增，旧 ETag 不再返回 304"""
+        form = self.forms[10]
+        url = f'/api/dynamic-calculation-items/by_form/?form_id={form.id}'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/dynamic-calculation-items/batch_update_purchaser/',
+                {'form_id': form.id, 'purchaser': '新采购员'}, format='json',
+            )
+        self.assertEqual(response.json()['updated_count'], 10)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['purchaser'], '新采购员')
+
+    def test_form_rename_changes_etag(self):
+        """明细中包含 form_name：修改申请表名称后旧 ETag 不再返回 304"""
+        form = self.forms[10]
+        url = f'/api/dynamic-supply-items/by_form/?form_id={form.id}'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/application-forms/{form.id}/', {'name': '改名后的申请表'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['form_name'], '改名后的申请表')
+
+        # 只修改其他字段时版本不变
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/application-forms/{form.id}/', {'status': 'active'}, format='json')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_form_save_keeps_concurrent_version(self):
+        """整行保存申请表不会写回读取时的旧版本号"""
+        form = ApplicationForm.objects.get(id=self.forms[10].id)
+        ApplicationForm.objects.filter(id=form.id).update(data_version=F('data_version') + 1)
+        form.department = 'PE'
+        form.save()
+        self.client.post(f'/api/application-forms/{form.id}/create_calculation_form/')
+        self.client.put(f'/api/application-forms/{form.id}/', {
+            'template': form.template_id, 'name': form.name, 'code': form.code,
+            'department': 'TE', 'period': form.period, 'data_version': 0,
+        }, format='json')
+        form.refresh_from_db()
+        self.assertEqual((form.data_version, form.department, form.has_calculation_form), (self.forms[10].data_version + 1, 'TE', True))
+
+    def test_delete_calculation_items(self):
+        """删除走快速删除：读取 id + 递增版本 + 一条 DELETE + 批量写入墓碑，不随行数增长"""
+        form = self.forms[1000]
+        with self.captureOnCommitCallbacks(execute=False):
+            # 保存点/释放 + 读取 id + 递增并读取版本号 + DELETE + 墓碑 bulk_create
+            with self.assertNumQueries(7):
+                deleted = delete_calculation_items(DynamicCalculationItem.objects.filter(form=form, no__lte=200))
+        self.assertEqual(deleted, 200)
+        self.assertEqual(CalculationItemTombstone.objects.filter(form_id=form.id).count(), 200)
+        self.assertEqual(DynamicCalculationItem.objects.filter(form=form).count(), 800)
+
+    def test_calculation_items_list(self):
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get('/api/dynamic-calculation-items/')
+        self.assertEqual(len(response.json()), 1010)
+
+    def delta(self, form, since, **params):
+        return self.client.get('/api/dynamic-calculation-items/by_form/', {'form_id': form.id, 'since': since, **params})
+
+    def test_delta_since(self):
+        """增量同步：游标之后修改、隐藏、删除的项目，再次请求没有变化"""
+        form = self.forms[10]
+        data = self.delta(form, '2020-01-01T00:00:00Z').json()
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['items']), 10)
+        cursor = data['next_since']
+
+        edited, hidden, deleted = DynamicCalculationItem.objects.filter(form=form).order_by('no')[:3]
+        self.client.patch(f'/api/dynamic-calculation-items/{edited.id}/', {'material_name': '改名'}, format='json')
+        self.client.post('/api/dynamic-calculation-items/bulk_hide/', {'ids': [hidden.id]}, format='json')
+        self.client.delete(f'/api/dynamic-calculation-items/{deleted.id}/')
+
+        data = self.delta(form, cursor).json()
+        self.assertFalse(data['reset'])
+        self.assertEqual([item['id'] for item in data['items']], [edited.id])
+        self.assertEqual(
+            sorted((tombstone['id'], tombstone['reason']) for tombstone in data['tombstones']),
+            sorted([(hidden.id, 'hidden'), (deleted.id, 'deleted')]),
+        )
+        self.assertEqual([item['id'] for item in self.delta(form, cursor, include_hidden='true').json()['items']], [edited.id, hidden.id])
+
+        data = self.delta(form, data['next_since']).json()
+        self.assertEqual((data['items'], data['tombstones']), ([], []))
+
+    def test_delta_long_transaction(self):
+        """写入时间早于游标签发时间的长事务，提交后仍会返回（按提交顺序的版本号判断）"""
+        form = self.forms[10]
+        item = DynamicCalculationItem.objects.filter(form=form).first()
+        cursor = self.delta(form, '0').json()['next_since']
+        # 模拟在签发游标之前开始、之后才提交的导入：updated_at 早于游标，版本号在提交时更大
+        item.actual_order = 99
+        item.save()
+        DynamicCalculationItem.objects.filter(id=item.id).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual([row['id'] for row in self.delta(form, cursor).json()['items']], [item.id])
+
+    def test_delta_reset(self):
+        """游标签发时间超过墓碑保留期时返回完整数据；无法解析的 since 返回 400"""
+        form = self.forms[10]
+        version = ApplicationForm.objects.get(id=form.id).data_version
+        expired = int((timezone.now() - timedelta(days=8)).timestamp())
+        data = self.delta(form, f'v{version}-{expired}').json()
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['items']), 10)
+        self.assertEqual(self.delta(form, 'yesterday').status_code, 400)
+
+
+@override_settings(OPERATION_LOG={'ASYNC': False}, OPERATION_LOG_POLICIES={}, SUPPLY_SUMMARY={'ASYNC': False})
+class StockAdjustmentTests(TestCase):
+    """库存调整：加锁读取 + 只更新库存字段 + 写入变动记录"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.supply = Supply.objects.create(name='探针', category='探针', unit='pcs', unit_price=2, current_stock=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def adjust(self, **data):
+        return self.client.post('/api/adjust-stock/', {'supply_id': self.supply.id, **data}, format='json')
+
+    def test_adjust_stock(self):
+        # 保存点/释放 + 加锁读取 + 更新库存 + 写入变动记录 + 操作日志
+        with self.assertNumQueries(6):
+            response = self.adjust(type='in', quantity=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['record']['previous_stock'], response.json()['record']['new_stock']), (10, 15))
+
+        response = self.adjust(type='out', quantity=20)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], '库存不足')
+
+        response = self.adjust(type='adjust', quantity=3, unit_price='2.50')
+        self.assertEqual(response.status_code, 200)
+        self.supply.refresh_from_db()
+        self.assertEqual((self.supply.current_stock, str(self.supply.unit_price)), (3, '2.50'))
+        self.assertEqual(InventoryRecord.objects.filter(supply=self.supply).count(), 2)
+
+        self.assertEqual(self.client.post('/api/adjust-stock/', {'supply_id': 999999, 'type': 'in', 'quantity': 1}, format='json').status_code, 404)
+        self.assertEqual(self.adjust(type='move', quantity=1).status_code, 400)
+
+    def test_adjust_stock_keeps_other_fields(self):
+        """只写回库存相关字段，不覆盖其它请求同时修改的字段"""
+        Supply.objects.filter(id=self.supply.id).update(name='新名称', safety_stock=7)
+        self.assertEqual(self.adjust(type='out', quantity=4).status_code, 200)
+        supply = Supply.objects.get(id=self.supply.id)
+        self.assertEqual((supply.name, supply.safety_stock, supply.current_stock), ('新名称', 7, 6))
+
+    def test_adjust_stock_updates_category_summary(self):
+        """库存变动按增量更新分类汇总，结果与全量聚合一致"""
+        Supply.objects.filter(id=self.supply.id).update(safety_stock=5)
+        refresh_category_summary()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.adjust(type='out', quantity=6).status_code, 200)
+            self.assertEqual(self.adjust(type='in', quantity=1, unit_price='3').status_code, 200)
+        summary = SupplySummary.objects.get(scope='category', key='探针')
+        self.assertEqual((summary.total_stock, summary.total_amount, summary.low_stock_count), (5, 15, 1))
+
+        refresh_category_summary()
+        summary.refresh_from_db()
+        self.assertEqual((summary.total_stock, summary.total_amount, summary.low_stock_count), (5, 15, 1))
+
+    def test_adjust_stock_batch(self):
+        """批量调整的查询次数不随变动条数增长，单条失败不影响其他变动"""
+        other = Supply.objects.create(name='治具', category='治具', unit='pcs', unit_price=1, current_stock=0)
+        movements = [
+            {'supply_id': supply_id, 'type': 'in', 'quantity': 1}
+            for _ in range(50) for supply_id in (self.supply.id, other.id)
+        ]
+        movements += [{'supply_id': other.id, 'type': 'out', 'quantity': 500}, {'supply_id': 999999, 'type': 'in', 'quantity': 1}]
+
+        refresh_category_summary()
+
+        # 保存点/释放 + 加锁读取 + 更新库存 + 写入变动记录 + 操作日志 + 提交后每个分类一条汇总增量更新
+        with self.assertNumQueries(8), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/adjust-stock/batch/', {'movements': movements, 'atomic': 'false'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['count'], data['error_count']), (102, 2))
+        self.assertEqual([result['status'] for result in data['results'][-2:]], [400, 404])
+        self.assertEqual(data['results'][-3]['record']['new_stock'], 50)
+        self.assertEqual(Supply.objects.get(id=other.id).current_stock, 50)
+        self.assertEqual(InventoryRecord.objects.count(), 100)
+        self.assertEqual(SupplySummary.objects.get(scope='category', key='治具').total_stock, 50)
+
+        response = self.client.post('/api/adjust-stock/batch/', {'movements': movements, 'atomic': 'true'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(InventoryRecord.objects.count(), 100)
+        response = self.client.post('/api/adjust-stock/batch/', {'movements': movements, 'atomic': 'maybe'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/adjust-stock/batch/', {'movements': movements, 'atomic': True}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([failed['index'] for failed in response.json()['failed']], [100, 101])
+        self.assertEqual(InventoryRecord.objects.count(), 100)
+
+
+class FormDemandCalculatorTests(TestCase):
+    """批量需求计算：已保存数据中的 inf/nan 参数按0处理，与标量计算一致；统一计算接口拒绝非有限参数"""
+
+    def test_non_finite_inputs(self):
+        demand = calculate_demand([1000, np.inf, np.nan, 1000], [2, 2, 2, np.inf], [10, 10, 10, 10])
+        self.assertEqual(demand.tolist(), [200, 0, 0, 0])
+        self.assertEqual(calculate_demand(float('inf'), 2, 10), 0)
+        self.assertEqual(calculate_net_demand([200, 200], [np.nan, 50]).tolist(), [200, 150])
+
+        user = User.objects.create_user('planner')
+        template = ApplicationTemplate.objects.create(name='测试模板', code='TEST', created_by=user)
+        form = ApplicationForm.objects.create(
+            template=template, name='测试申请表', code='FORM-1', department='TE', period='2025年7月', created_by=user,
+        )
+        item = DynamicCalculationItem.objects.create(
+            form=form, no=1, material_name='探针', is_multi_station=True,
+            multi_station_data={
+                'stations': ['A', 'B', 'C'],
+                'usage_per_set': [2, 'inf', 2],
+                'usage_count': [10, 10, 'NaN'],
+                'monthly_capacity': [1000, 1000, 1000],
+                'min_stock': [0, 0, 0],
+            },
+        )
+        FormDemandCalculator(form.id).run()
+        item.refresh_from_db()
+        self.assertEqual(item.multi_station_data['monthly_demand'], [200, 0, 0])
+        self.assertEqual(item.monthly_demand, 200)
+
+    def test_unified_rejects_non_finite_params(self):
+        params = {'monthly_capacity': 1000, 'usage_per_set': 2, 'usage_count': 10}
+        for value in ('inf', '-inf', '1e400', 'nan'):
+            results = unified_calculate_many([params, {**params, 'usage_per_set': value}, {**params, 'unit_price': value}])
+            self.assertEqual(results[0]['monthly_demand'], 200)
+            self.assertEqual(results[1], {'error': '参数 usage_per_set 必须是有效数字'})
+            self.assertEqual(results[2], {'error': '参数 unit_price 必须是有效数字'})
+        with self.assertRaises(CalculationError):
+            unified_calculate({**params, 'monthly_capacity': '1e400'})
+
+
+@override_settings(OPERATION_LOG={'ASYNC': False}, OPERATION_LOG_POLICIES={})
+class ImportJobTests(TestCase):
+    """后台导入任务：遗留任务恢复和按用户隔离的状态查询"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='password')
+        cls.other = User.objects.create_user('other', password='password')
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def create_job(self, status, age, **fields):
+        log = ImportLog.objects.create(user=self.owner, file_name='data.xlsx', result='', status=status, **fields)
+        ImportLog.objects.filter(pk=log.pk).update(created_at=timezone.now() - timedelta(seconds=age))
+        return log
+
+    @override_settings(IMPORT_JOBS={'STALE_SECONDS': 600})
+    def test_fail_stale_jobs(self):
+        now = timezone.now()
+        stale = self.create_job('running', 3600, started_at=now - timedelta(seconds=3600))
+        fresh = self.create_job('running', 60, started_at=now - timedelta(seconds=60))
+        self.assertEqual(fail_stale_jobs(), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.success), ('failed', False))
+        self.assertIsNotNone(stale.finished_at)
+        self.assertEqual(fresh.status, 'running')
+        self.assertEqual(fail_stale_jobs(), 0)
+
+    @override_settings(IMPORT_JOBS={'ASYNC': True, 'REQUEUE_SECONDS': 300})
+    def test_requeue_pending_jobs(self):
+        lost = self.create_job('pending', 600)
+        self.create_job('pending', 10)
+        with mock.patch.object(import_job_runner, 'submit') as submit:
+            self.assertEqual(requeue_pending_jobs(), [lost.id])
+        submit.assert_called_once_with(lost.id)
+
+    def test_job_status_owner_only(self):
+        log = self.create_job('pending', 0)
+        client = APIClient()
+        for user, expected in ((self.owner, 200), (self.other, 404), (self.admin, 200)):
+            client.force_authenticate(user)
+            self.assertEqual(client.get(f'/api/import-jobs/{log.id}/').status_code, expected)
+
+
+@override_settings(OPERATION_LOG={'ASYNC': False}, OPERATION_LOG_POLICIES={})
+class ConfigCacheTests(TestCase):
+    """配置接口的 ETag / 304：常量表头在导入时构建，模板变化后缓存失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_header_not_modified(self):
+        for url in ('/api/b453-calculation-headers/', '/api/b453-management-headers/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+            # 常量表头不查询数据库，唯一的查询是操作日志写入
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            self.assertFalse(response.content)
+
+    @override_settings(CONFIG_CACHE={'LOCAL_TTL': 60})
+    def test_template_change_invalidates(self):
+        url = '/api/application-templates/active_templates/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ApplicationTemplate.objects.create(name='新模板', code='NEW', created_by=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([template['code'] for template in response.json()], ['NEW'])
+
+
+class ExcelReaderTests(TestCase):
+    """只读流式读取：合并的多行表头与 pandas header=[0,1] 一致（同一上级标题内向右填充）"""
+
+    def workbook(self):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['No.', '物料描述', '安全庫存', None, '2025年7月份明細', None, None, '備註'])
+        sheet.append([None, None, '最低', '最高', '庫存', '需求', None, None])
+        sheet.merge_cells('C1:D1')
+        sheet.merge_cells('E1:G1')
+        for index in range(3):
+            sheet.append([index + 1, f'探针{index}', 1, 2, 3, 4, 5, ''])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+        return buffer
+
+    def test_merged_header(self):
+        with WorkbookReader(self.workbook()) as reader:
+            sheet = reader.sheet(header_rows=2)
+            self.assertEqual(sheet.columns, [
+                'No.', '物料描述', '安全庫存最低', '安全庫存最高',
+                '2025年7月份明細庫存', '2025年7月份明細需求', '2025年7月份明細需求.1', '備註',
+            ])
+            self.assertEqual(next(iter(sheet))['安全庫存最高'], 2)
+
+    def test_read_frame_max_rows(self):
+        with WorkbookReader(self.workbook()) as reader:
+            self.assertEqual(len(reader.read_frame(header_rows=2, max_rows=3)), 3)
+            with self.assertRaises(SheetTooLarge):
+                reader.read_frame(header_rows=2, max_rows=2)
+
+
+@override_settings(OPERATION_LOG={'ASYNC': False}, OPERATION_LOG_POLICIES={}, SUPPLY_SUMMARY={'ASYNC': False})
+class FormSummaryTests(TestCase):
+    """申请表汇总：单条保存按增量更新，结果与全量聚合一致"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        template = ApplicationTemplate.objects.create(name='测试模板', code='TEST', created_by=cls.user)
+        cls.form = ApplicationForm.objects.create(
+            template=template, name='测试申请表', code='FORM-1', department='TE', period='2025年7月', created_by=cls.user,
+        )
+        DynamicCalculationItem.objects.bulk_create([
+            DynamicCalculationItem(
+                form=cls.form, no=i + 1, material_name=f'耗材{i + 1}', monthly_demand=10, actual_order=5, unit_price='1.50',
+            )
+            for i in range(20)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        refresh_form_summary([self.form.id])
+
+    def summary(self):
+        summary = SupplySummary.objects.get(scope='form', key=str(self.form.id))
+        return summary.item_count, summary.total_demand, summary.total_actual_order, summary.total_amount
+
+    def assert_matches_full_refresh(self):
+        incremental = self.summary()
+        refresh_form_summary([self.form.id])
+        self.assertEqual(incremental, self.summary())
+
+    def test_item_edit_applies_delta(self):
+        items = list(DynamicCalculationItem.objects.filter(form=self.form).order_by('no'))
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/dynamic-calculation-items/{items[0].id}/', {'actual_order': 8, 'unit_price': '2.00'}, format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if 'GROUP BY' in query['sql']])
+        self.assertEqual(self.summary(), (20, 200, 103, Decimal('158.50')))
+        self.assert_matches_full_refresh()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            items[1].is_visible = False
+            items[1].save()
+            DynamicCalculationItem.objects.create(form=self.form, no=21, material_name='新耗材', monthly_demand=7)
+        self.assertEqual(self.summary()[:2], (20, 197))
+        self.assert_matches_full_refresh()
+
+    def test_unrelated_field_skips_summary(self):
+        item = DynamicCalculationItem.objects.filter(form=self.form).first()
+        with self.captureOnCommitCallbacks() as callbacks:
+            item.material_name = '新名称'
+            item.save(update_fields=['material_name'])
+        self.assertEqual(callbacks, [])
+
+    def test_pending_refresh_absorbs_delta(self):
+        """同一事务先登记了全量刷新，之后的单条增量不再重复计入"""
+        item = DynamicCalculationItem.objects.filter(form=self.form).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            DynamicCalculationItem.objects.filter(form=self.form).update(monthly_demand=1)
+            schedule_form_summary(self.form.id)
+            # item 读取于 update 之前，保存时写回 monthly_demand=10
+            item.actual_order = 100
+            item.save()
+        self.assertEqual(self.summary()[:3], (20, 29, 195))
+        self.assert_matches_full_refresh()
+
+    def test_statistics_summary_does_not_aggregate(self):
+        """汇总表为空时返回空统计，不在请求中全量聚合"""
+        SupplySummary.objects.all().delete()
+        response = self.client.get('/api/statistics/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['total_supplies'], response.json()['form_stats']), (0, []))
+        self.assertFalse(SupplySummary.objects.exists())
+
+        response = self.client.get('/api/statistics/summary/', {'refresh': '1'})
+        self.assertEqual(response.json()['form_stats'][0]['item_count'], 20)
+        self.assertNotIn('low_stock_count', response.json()['form_stats'][0])
+
+
+@override_settings(OPERATION_LOG={'ASYNC': False}, OPERATION_LOG_POLICIES={}, SUPPLY_SUMMARY={'ASYNC': False})
+class ItemSequenceTests(TestCase):
+    """计算项目序号（No.）由计数器分配：批量写入一次分配一段，不与已有序号冲突"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.template = ApplicationTemplate.objects.create(name='测试模板', code='TEST', created_by=cls.user)
+
+    def create_form(self, code, numbers=()):
+        form = ApplicationForm.objects.create(
+            template=self.template, name=code, code=code, department='TE', period='2025年7月', created_by=self.user,
+        )
+        # bulk_create 不触发信号：模拟没有计数器的历史申请表
+        DynamicCalculationItem.objects.bulk_create([
+            DynamicCalculationItem(form=form, no=no, material_name=f'{code}耗材{no}') for no in numbers
+        ])
+        return form
+
+    def test_counter_starts_from_existing_max(self):
+        form = self.create_form('OLD', numbers=[3, 7])
+        self.assertFalse(FormItemSequence.objects.filter(form=form).exists())
+        self.assertEqual(allocate_item_numbers(form.id, 2), range(8, 10))
+        self.assertEqual(allocate_item_numbers(form.id), range(10, 11))
+        self.assertEqual(FormItemSequence.objects.get(form=form).last_no, 10)
+
+    def test_import_allocates_block(self):
+        form = self.create_form('IMPORT', numbers=[1, 2])
+        labels = ['料材名称', *CalculationTableImport.dynamic_fields.values()]
+        df = pd.DataFrame({label: [None] * 3 for label in labels})
+        df['料材名称'] = ['耗材探针A', 'IMPORT耗材2', '耗材探针B']
+        df['当月需求/站'] = [10, 20, 30]
+
+        with CaptureQueriesContext(connection) as queries:
+            CalculationTableImport(df, {label: label for label in labels}, self.user, form_id=form.id).run()
+        sequence_writes = [
+            query for query in queries
+            if 'supplies_formitemsequence' in query['sql'] and not query['sql'].startswith('SELECT')
+        ]
+        # 计数器初始化 + 一次推进，与新增行数无关
+        self.assertEqual(len(sequence_writes), 2)
+        numbers = dict(DynamicCalculationItem.objects.filter(form=form).values_list('material_name', 'no'))
+        self.assertEqual(numbers, {'IMPORT耗材1': 1, 'IMPORT耗材2': 2, '耗材探针A': 3, '耗材探针B': 4})
+        self.assertEqual(FormItemSequence.objects.get(form=form).last_no, 4)
+
+    def test_copy_allocates_after_target_numbers(self):
+        source = self.create_form('SOURCE', numbers=[1, 2, 3])
+        target = self.create_form('TARGET')
+        DynamicCalculationItem.objects.create(form=target, no=5, material_name='手工项目')
+
+        FormCloner(source.id, target.id).clone(['calculation_items'])
+        numbers = list(DynamicCalculationItem.objects.filter(form=target).order_by('no').values_list('no', flat=True))
+        self.assertEqual(numbers, [5, 6, 7, 8])
+        self.assertEqual(allocate_item_numbers(target.id), range(9, 10))
+
+    def test_add_usage_station_after_explicit_no(self):
+        """手工指定 no 新建的项目推进计数器，新增使用站别不会与之冲突"""
+        form = self.create_form('STATION')
+        # 计数器已经存在（已分配过序号 1）时，手工写入的序号同样推进计数器
+        self.assertEqual(allocate_item_numbers(form.id), range(1, 2))
+        DynamicCalculationItem.objects.create(form=form, no=10, material_name='手工项目')
+        material = B453SupplyItem.objects.create(
+            serial_number=1, material_description='探针', purchaser='张三', unit_price='1.00',
+            min_safety_stock=1, max_safety_stock=10, moq=1, lead_time_weeks=1, created_by=self.user,
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for expected_no in (11, 12):
+            response = client.post(
+                f'/api/add-station/{material.id}/', {'form_id': form.id, 'usage_station': 'ST'}, format='json',
+            )
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual(DynamicCalculationItem.objects.get(id=response.data['id']).no, expected_no)
+
+
+@override_settings(OPERATION_LOG={'ASYNC': False}, OPERATION_LOG_POLICIES={}, SUPPLY_SUMMARY={'ASYNC': False})
+class FormClonerTests(TestCase):
+    """申请表复制：序号接在目标表已有数据之后，失败时整体回滚"""
+
+    STATIONS = {'stations': ['A', 'B'], 'usage_per_set': [1, 2], 'monthly_demand': [5, 6], 'actual_order': [5, 6]}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        template = ApplicationTemplate.objects.create(name='测试模板', code='TEST', created_by=cls.user)
+        cls.source, cls.target = [
+            ApplicationForm.objects.create(
+                template=template, name=code, code=code, department='TE', period='2025年7月', created_by=cls.user,
+            )
+            for code in ('SOURCE', 'TARGET')
+        ]
+        DynamicCalculationItem.objects.bulk_create([
+            DynamicCalculationItem(
+                form=cls.source, no=1, material_name='探针', unit_price='1.50', monthly_demand=50, actual_order=40,
+            ),
+            DynamicCalculationItem(form=cls.source, no=2, material_name='隐藏项目', is_visible=False),
+            DynamicCalculationItem(
+                form=cls.source, no=3, material_name='多站别', is_multi_station=True, multi_station_data=cls.STATIONS,
+            ),
+        ])
+        DynamicSupplyItem.objects.bulk_create([
+            cls.supply_item(cls.source, serial_number, f'耗材{serial_number}') for serial_number in (1, 2)
+        ])
+        DynamicForecastData.objects.create(form=cls.source, name='预测', forecast_data={'2025-07': 100})
+
+        DynamicCalculationItem.objects.create(form=cls.target, no=4, material_name='已有项目')
+        cls.supply_item(cls.target, 7, '已有耗材').save()
+
+    @staticmethod
+    def supply_item(form, serial_number, description):
+        return DynamicSupplyItem(
+            form=form, serial_number=serial_number, material_description=description, purchaser='张三',
+            unit_price='1.00', max_safety_stock=10, min_safety_stock=1, moq=1, lead_time=7,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def target_items(self):
+        return list(DynamicCalculationItem.objects.filter(form=self.target).order_by('no'))
+
+    def test_clone_from(self):
+        response = self.client.post(
+            f'/api/application-forms/{self.target.id}/clone_from/', {'source_form_id': self.source.id}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['copied'], {'calculation_items': 3, 'supply_items': 2, 'forecasts': 1})
+
+        items = self.target_items()
+        self.assertEqual(
+            [(item.no, item.material_name, item.is_visible) for item in items],
+            [(4, '已有项目', True), (5, '探针', True), (6, '隐藏项目', False), (7, '多站别', True)],
+        )
+        # 需求和订购不复制，多站别只保留站别设置
+        self.assertEqual((items[1].unit_price, items[1].monthly_demand, items[1].actual_order), (Decimal('1.50'), 0, 0))
+        self.assertTrue(items[3].is_multi_station)
+        self.assertEqual(items[3].multi_station_data, {'stations': ['A', 'B'], 'usage_per_set': [1, 2]})
+
+        serials = DynamicSupplyItem.objects.filter(form=self.target).order_by('serial_number')
+        self.assertEqual(
+            list(serials.values_list('serial_number', 'material_description')),
+            [(7, '已有耗材'), (8, '耗材1'), (9, '耗材2')],
+        )
+        self.assertEqual(
+            list(DynamicForecastData.objects.filter(form=self.target).values_list('name', 'forecast_data')),
+            [('预测', {'2025-07': 100})],
+        )
+        self.assertEqual(allocate_item_numbers(self.target.id), range(8, 9))
+
+    def test_copy_from_template(self):
+        response = self.client.post(
+            '/api/dynamic-calculation-items/copy_from_template/',
+            {'source_form_id': self.source.id, 'target_form_id': self.target.id},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        copied = [
+            {'id': item.id, 'no': item.no, 'material_name': item.material_name,
+             'unit_price': float(item.unit_price or 0), 'purchaser': item.purchaser}
+            for item in self.target_items()[1:]
+        ]
+        self.assertEqual(response.data['copied_items'], copied)
+        self.assertEqual([item['no'] for item in copied], [5, 6, 7])
+
+    def test_forecast_copy(self):
+        response = self.client.post(
+            '/api/dynamic-forecast-data/copy/', {'source_form_id': self.source.id, 'target_form_id': self.target.id},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DynamicForecastData.objects.filter(form=self.target).count(), 1)
+        self.assertEqual(DynamicCalculationItem.objects.filter(form=self.target).count(), 1)
+
+    def test_failure_rolls_back(self):
+        """任一类数据复制失败时，已复制的数据和分配的序号一起回滚"""
+        with mock.patch.object(FormCloner, 'copy_forecasts', side_effect=RuntimeError('复制失败')):
+            with self.assertRaises(RuntimeError):
+                FormCloner(self.source.id, self.target.id).clone()
+        self.assertEqual(len(self.target_items()), 1)
+        self.assertEqual(DynamicSupplyItem.objects.filter(form=self.target).count(), 1)
+        self.assertEqual(allocate_item_numbers(self.target.id), range(5, 6))
+
+    def test_unknown_kind(self):
+        response = self.client.post(
+            f'/api/application-forms/{self.target.id}/clone_from/',
+            {'source_form_id': self.source.id, 'kinds': ['calculation_items', 'orders']},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self.target_items()), 1)
+
+
+@override_settings(FORM_CLONE={'INSERT_SELECT_VENDORS': (connection.vendor,)})
+class InsertSelectFormClonerTests(FormClonerTests):
+    """INSERT ... SELECT 路径：与 bulk_create 路径的结果一致"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(FormCloner, '_bulk_create', side_effect=AssertionError('应使用 INSERT ... SELECT'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+@override_settings(OPERATION_LOG={'ASYNC': False}, OPERATION_LOG_POLICIES={}, SUPPLY_SUMMARY={'ASYNC': False})
+class CalculationItemPagingTests(TestCase):
+    """计算项目列表按需游标分页和 JSON Lines 流式输出"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        template = ApplicationTemplate.objects.create(name='测试模板', code='TEST', created_by=cls.user)
+        cls.forms = [
+            ApplicationForm.objects.create(
+                template=template, name=code, code=code, department='TE', period='2025年7月', created_by=cls.user,
+            )
+            for code in ('FORM-1', 'FORM-2')
+        ]
+        DynamicCalculationItem.objects.bulk_create([
+            DynamicCalculationItem(form=form, no=no, material_name=f'{form.code}-{no}', is_visible=no != 3)
+            for form in cls.forms
+            for no in range(1, 6)
+        ])
+        cls.visible = [(form.id, no) for form in cls.forms for no in (1, 2, 4, 5)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def collect_pages(self, url, params):
+        rows, pages = [], 0
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            pages += 1
+            rows += [(row['form'], row['no']) for row in response.data['results']]
+            if not response.data['next_cursor']:
+                return rows, pages
+            params = {**params, 'cursor': response.data['next_cursor']}
+
+    def test_cursor_pages(self):
+        rows, pages = self.collect_pages('/api/dynamic-calculation-items/', {'page_size': 3})
+        self.assertEqual((rows, pages), (self.visible, 3))
+
+        form = self.forms[1]
+        rows, pages = self.collect_pages(
+            '/api/dynamic-calculation-items/by_form/', {'form_id': form.id, 'page_size': 2, 'include_hidden': 'true'},
+        )
+        self.assertEqual((rows, pages), ([(form.id, no) for no in range(1, 6)], 3))
+
+    def test_without_paging_params(self):
+        """不带 cursor/page_size 时照旧返回完整列表"""
+        response = self.client.get('/api/dynamic-calculation-items/')
+        self.assertEqual(sorted((row['form'], row['no']) for row in response.data), self.visible)
+
+    def test_invalid_cursor(self):
+        for cursor in ('!!!', 'WzFd', 'bm90LWpzb24'):
+            for url, params in (
+                ('/api/dynamic-calculation-items/', {}),
+                ('/api/dynamic-calculation-items/by_form/', {'form_id': self.forms[0].id}),
+            ):
+                with self.subTest(cursor=cursor, url=url):
+                    response = self.client.get(url, {**params, 'cursor': cursor})
+                    self.assertEqual(response.status_code, 404)
+
+    def test_json_lines(self):
+        response = self.client.get('/api/dynamic-calculation-items/', {'stream': 'jsonl'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([(row['form'], row['no']) for row in rows], self.visible)
+
+
+@override_settings(OPERATION_LOG={'ASYNC': False}, OPERATION_LOG_POLICIES={}, SUPPLY_SUMMARY={'ASYNC': False})
+class SparseFieldsetTests(TestCase):
+    """?fields= / ?exclude= 裁剪返回字段，未返回的列不从数据库读取"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        template = ApplicationTemplate.objects.create(name='测试模板', code='TEST', created_by=cls.user)
+        cls.form = ApplicationForm.objects.create(
+            template=template, name='测试申请表', code='FORM-1', department='TE', period='2025年7月', created_by=cls.user,
+        )
+        cls.item = DynamicCalculationItem.objects.create(
+            form=cls.form, no=1, material_name='探针', monthly_data={'2025-07': {'demand': 10}},
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_items(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/dynamic-calculation-items/by_form/', {'form_id': self.form.id, **params})
+        self.assertEqual(response.status_code, 200)
+        [select] = [query['sql'] for query in queries if 'FROM "supplies_dynamiccalculationitem"' in query['sql']]
+        return response.data, select
+
+    def test_fields(self):
+        rows, select = self.get_items(fields='no,material_name,form_name')
+        self.assertEqual([set(row) for row in rows], [{'id', 'no', 'material_name', 'form_name'}])
+        self.assertEqual(rows[0]['form_name'], '测试申请表')
+        self.assertNotIn('"monthly_data"', select)
+        self.assertNotIn('"multi_station_data"', select)
+
+    def test_exclude(self):
+        rows, select = self.get_items(exclude='monthly_data,chase_data,id')
+        self.assertEqual(rows[0]['id'], self.item.id)
+        self.assertNotIn('monthly_data', rows[0])
+        self.assertNotIn('chase_data', rows[0])
+        self.assertEqual(rows[0]['material_name'], '探针')
+        self.assertNotIn('"monthly_data"', select)
+        self.assertIn('"multi_station_data"', select)
+
+    def test_full_response(self):
+        rows, select = self.get_items()
+        self.assertEqual(rows[0]['monthly_data'], {'2025-07': {'demand': 10}})
+        self.assertIn('"monthly_data"', select)
+
+    def test_write_ignores_fields(self):
+        """写请求不裁剪字段，返回完整数据"""
+        response = self.client.patch(
+            f'/api/dynamic-calculation-items/{self.item.id}/?fields=no', {'material_name': '新探针'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['material_name'], '新探针')
+        self.assertIn('monthly_data', response.data)
+
+
+@override_settings(OPERATION_LOG={'ASYNC': False}, OPERATION_LOG_POLICIES={}, SUPPLY_SUMMARY={'ASYNC': False})
+class GroupedMaterialDataTests(TestCase):
+    """按物料分组的计算项目：查询次数固定，不随物料数量增长"""
+
+    # 可见项目汇总 + 可见项目明细 + 关联的管控表项目
+    EXPECTED_QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.template = ApplicationTemplate.objects.create(name='测试模板', code='TEST', created_by=cls.user)
+
+    def create_form(self, material_count):
+        form = ApplicationForm.objects.create(
+            template=self.template, name=f'申请表{material_count}', code=f'FORM-{material_count}', department='TE',
+            period='2025年7月', created_by=self.user,
+        )
+        supplies = B453SupplyItem.objects.bulk_create([
+            B453SupplyItem(
+                serial_number=index, material_description=f'耗材{index}', purchaser='张三', unit_price='2.00',
+                min_safety_stock=1, max_safety_stock=10, moq=1, lead_time_weeks=4, created_by=self.user,
+            )
+            for index in range(material_count // 2)
+        ])
+        # 每个物料两个使用站别；前一半物料关联管控表项目，最后一个关联的项目不存在
+        linked = [supply.id for supply in supplies] + [None] * (material_count - len(supplies))
+        linked[-1] = 10 ** 9
+        DynamicCalculationItem.objects.bulk_create([
+            DynamicCalculationItem(
+                form=form, no=index * 2 + offset + 1, material_name=f'耗材{index:04d}', usage_station=station,
+                monthly_demand=10, actual_order=5, linked_supply_item_id=linked[index] if offset else None,
+            )
+            for index in range(material_count)
+            for offset, station in enumerate(['A', 'B'])
+        ])
+        return form
+
+    def test_constant_queries(self):
+        for material_count in (10, 1000):
+            with self.subTest(material_count=material_count):
+                form = self.create_form(material_count)
+                with self.assertNumQueries(self.EXPECTED_QUERIES):
+                    groups = grouped_material_data(form.id)
+
+                self.assertEqual(len(groups), material_count)
+                first, last = groups[0], groups[-1]
+                self.assertEqual([item['usage_station'] for item in first['calculation_items']], ['A', 'B'])
+                self.assertEqual((first['total_demand'], first['total_order']), (20, 10))
+                self.assertEqual(first['supply_item']['material_description'], '耗材0')
+                # 关联的管控表项目不存在时用计算项目的数据构造虚拟项目
+                self.assertEqual((last['supply_item']['id'], last['supply_item']['material_description']),
+                                 (0, f'耗材{material_count - 1:04d}'))
@@ -32,13 +32,18 @@ urlpatterns = [
     
     # 🆕 添加其他API端点
     path('adjust-stock/', views.adjust_stock, name='adjust_stock'),
+    path('adjust-stock/batch/', views.adjust_stock_batch, name='adjust_stock_batch'),
     path('statistics/', views.get_statistics, name='get_statistics'),
+    path('statistics/summary/', views.get_statistics_summary, name='get_statistics_summary'),
     path('unified-calculation/', views.unified_calculation, name='unified_calculation'),
+    path('unified-calculation/batch/', views.unified_calculation_batch, name='unified_calculation_batch'),
     path('link-b453-data/', views.link_b453_data, name='link_b453_data'),
     
     # 🆕 添加导入Excel相关API
     path('import-supplies-excel/', views.import_supplies_excel, name='supplies_import_supplies_excel'),
     path('import-log-list/', views.import_log_list, name='supplies_import_log_list'),
+    path('import-jobs/', views.import_job_create, name='import_job_create'),
+    path('import-jobs/<int:job_id>/', views.import_job_status, name='import_job_status'),
     
     # 🆕 添加一列多行处理相关API
     path('grouped-material-data/<int:form_id>/', views.get_grouped_material_data, name='get_grouped_material_data'),
@@ -1,16 +1,47 @@
+import logging
+
 from django.shortcuts import render
-from rest_framework import viewsets, status
+from rest_framework import serializers, viewsets, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
-from .models import Supply, InventoryRecord, B482SupplyItem, AndorSupplyItem, CapacityForecast, B453SupplyItem, B453CalculationItem, B453ForecastData, ApplicationTemplate, ApplicationForm, DynamicSupplyItem, DynamicCalculationItem, DynamicForecastData, ImportLog
+from django.utils import timezone
+from .models import Supply, InventoryRecord, B482SupplyItem, AndorSupplyItem, CapacityForecast, B453SupplyItem, B453CalculationItem, B453ForecastData, ApplicationTemplate, ApplicationForm, DynamicSupplyItem, DynamicCalculationItem, DynamicForecastData, ImportLog, SupplySummary
 from .serializers import SupplySerializer, InventoryRecordSerializer, SupplyDetailSerializer, B482SupplyItemSerializer, AndorSupplyItemSerializer, CapacityForecastSerializer, B453SupplyItemSerializer, B453CalculationItemSerializer, B453ForecastDataSerializer, ApplicationTemplateSerializer, ApplicationFormSerializer, DynamicSupplyItemSerializer, DynamicCalculationItemSerializer, DynamicForecastDataSerializer
 from django.db import models
 from django.db.models import Q
 from rest_framework.decorators import action
-
-class SupplyViewSet(viewsets.ModelViewSet):
+from .chase_sync import SYNC_DIRECTIONS, FormChaseSync, apply_chase_sync
+from .calculation import FormDemandCalculator, CalculationError, calculate_demand, unified_calculate, unified_calculate_many
+from .mixins import JsonLinesStreamMixin, SparseFieldsetMixin
+from .pagination import FormItemKeysetPagination
+from .importers import CalculationTableImport, ManagementTableImport
+from .header_matching import KeywordScorer
+from .summary import refresh_all_summaries, schedule_form_summary
+from .form_version import check_form_etag
+from .delta_sync import CalculationItemDelta, delete_calculation_items, stamp_calculation_items
+from .material_groups import grouped_material_data
+from .sequences import allocate_item_numbers
+from .form_clone import CLONE_KINDS, FormCloner
+from . import stock
+from .stock import StockError, parse_movement
+from .import_jobs import create_import_job, serialize_job, update_progress
+from .config_cache import ACTIVE_TEMPLATES_CACHE
+from core.http_cache import cached_config_response, config_response, static_config_entry
+
+logger = logging.getLogger(__name__)
+
+
+def with_etag(response, etag):
+    """by_form 响应附带申请表数据版本的 ETag（浏览器每次使用前重新验证）"""
+    if etag:
+        response['ETag'] = etag
+        response.setdefault('Cache-Control', 'private, no-cache')
+    return response
+
+
+class SupplyViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """耗材管理视图集"""
     queryset = Supply.objects.all()
     serializer_class = SupplySerializer
@@ -68,7 +99,7 @@ class SupplyViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class InventoryRecordViewSet(viewsets.ModelViewSet):
+class InventoryRecordViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """库存变动记录视图集"""
     queryset = InventoryRecord.objects.all()
     serializer_class = InventoryRecordSerializer
@@ -76,7 +107,8 @@ class InventoryRecordViewSet(viewsets.ModelViewSet):
     pagination_class = None  # 关闭分页，返回所有数据
 
     def get_queryset(self):
-        queryset = InventoryRecord.objects.all()
+        # supply_name 等字段来自关联的耗材，一次JOIN取回，避免逐行查询
+        queryset = InventoryRecord.objects.select_related('supply')
         supply_id = self.request.query_params.get('supply_id', None)
         record_type = self.request.query_params.get('type', None)
         
@@ -92,95 +124,97 @@ class InventoryRecordViewSet(viewsets.ModelViewSet):
 @permission_classes([IsAuthenticated])
 def adjust_stock(request):
     """
-    库存调整API
+    库存调整API（加行锁读-改-写，并发入库/出库不会丢失更新）
     """
     try:
-        supply_id = request.data.get('supply_id')
-        adjustment_type = request.data.get('type')  # 'in', 'out', 'adjust'
-        quantity = request.data.get('quantity')
-        unit_price = request.data.get('unit_price')  # 新增：单价调整
-        remark = request.data.get('remark', '')
-        
-        if not all([supply_id, adjustment_type, quantity]):
-            return Response({
-                'error': '缺少必要参数'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        try:
-            quantity = int(quantity)
-            if quantity <= 0:
-                return Response({
-                    'error': '数量必须大于0'
-                }, status=status.HTTP_400_BAD_REQUEST)
-        except ValueError:
-            return Response({
-                'error': '数量必须是有效数字'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 验证单价（如果提供了的话）
-        if unit_price is not None:
+        movement = parse_movement(request.data)
+        record = stock.adjust_stock(movement, request.user.username, _user_department(request.user))
+        return Response({
+            'message': '库存调整成功',
+            'record': InventoryRecordSerializer(record).data
+        }, status=status.HTTP_200_OK)
+    except StockError as e:
+        return Response({'error': str(e)}, status=e.status_code)
+    except Exception as e:
+        return Response({
+            'error': f'操作失败: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def _user_department(user):
+    return getattr(user.userprofile, 'department', '未知部门') if hasattr(user, 'userprofile') else '未知部门'
+
+STOCK_BATCH_MAX_MOVEMENTS = 1000  # 批量库存调整单次最多变动条数
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def adjust_stock_batch(request):
+    """
+    批量库存调整API（扫码枪交班批量上传）
+    请求体: {"movements": [{supply_id, type, quantity, unit_price?, remark?}, ...], "atomic": false}
+    按 id 顺序锁住涉及的耗材后依次应用，变动记录批量写入，结果按输入顺序返回；
+    atomic=false 时单条失败不影响其他变动，atomic=true 时任一失败则全部不执行
+    """
+    movements = request.data.get('movements')
+    if not isinstance(movements, list) or not movements:
+        return Response({
+            'error': '请提供库存变动列表 movements'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # 表单/字符串提交时 "false"、"0" 也按假处理
+    try:
+        atomic = serializers.BooleanField().to_internal_value(request.data.get('atomic', False))
+    except serializers.ValidationError:
+        return Response({
+            'error': 'atomic 必须是布尔值'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if len(movements) > STOCK_BATCH_MAX_MOVEMENTS:
+        return Response({
+            'error': f'单次最多提交 {STOCK_BATCH_MAX_MOVEMENTS} 条库存变动'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        results = [None] * len(movements)
+        parsed = []
+        for index, data in enumerate(movements):
             try:
-                unit_price = float(unit_price)
-                if unit_price < 0:
-                    return Response({
-                        'error': '单价不能为负数'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-            except (ValueError, TypeError):
-                return Response({
-                    'error': '单价必须是有效数字'
-                }, status=status.HTTP_400_BAD_REQUEST)
-        
-        try:
-            supply = Supply.objects.get(id=supply_id)
-        except Supply.DoesNotExist:
-            return Response({
-                'error': '耗材不存在'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        # 记录原始库存和单价
-        previous_stock = supply.current_stock
-        previous_unit_price = supply.unit_price
-        
-        # 计算新库存
-        if adjustment_type == 'in':
-            new_stock = previous_stock + quantity
-        elif adjustment_type == 'out':
-            if previous_stock < quantity:
-                return Response({
-                    'error': '库存不足'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            new_stock = previous_stock - quantity
-        else:  # adjust
-            new_stock = quantity
-        
-        # 开始事务
-        with transaction.atomic():
-            # 更新耗材库存
-            supply.current_stock = new_stock
-            
-            # 如果提供了单价，也更新单价
-            if unit_price is not None:
-                supply.unit_price = unit_price
-            
-            supply.save()
-            
-            # 创建库存变动记录
-            record = InventoryRecord.objects.create(
-                type=adjustment_type,
-                supply=supply,
-                quantity=quantity,
-                operator=request.user.username,
-                department=getattr(request.user.userprofile, 'department', '未知部门') if hasattr(request.user, 'userprofile') else '未知部门',
-                remark=remark,
-                previous_stock=previous_stock,
-                new_stock=new_stock
+                parsed.append((index, parse_movement(data)))
+            except StockError as e:
+                results[index] = {'success': False, 'error': e}
+        
+        if not (atomic and len(parsed) < len(movements)):
+            applied = stock.apply_stock_movements(
+                [movement for _, movement in parsed],
+                request.user.username,
+                _user_department(request.user),
+                all_or_nothing=atomic,
             )
-            
+            for (index, _), result in zip(parsed, applied):
+                results[index] = result
+        
+        failed = [
+            {'index': index, 'error': str(result['error']), 'status': result['error'].status_code}
+            for index, result in enumerate(results) if result and not result['success']
+        ]
+        if atomic and failed:
             return Response({
-                'message': '库存调整成功',
-                'record': InventoryRecordSerializer(record).data
-            }, status=status.HTTP_200_OK)
-            
+                'error': f'{len(failed)} 条库存变动无法执行，未调整任何库存',
+                'failed': failed
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        records = InventoryRecordSerializer([result['record'] for result in results if result['success']], many=True).data
+        records = iter(records)
+        return Response({
+            'message': f'成功调整 {len(movements) - len(failed)} 条库存变动',
+            'results': [
+                {'index': index, 'success': True, 'record': next(records)} if result['success']
+                else {'index': index, 'success': False, 'error': str(result['error']), 'status': result['error'].status_code}
+                for index, result in enumerate(results)
+            ],
+            'count': len(results),
+            'error_count': len(failed)
+        }, status=status.HTTP_200_OK)
+    
     except Exception as e:
         return Response({
             'error': f'操作失败: {str(e)}'
@@ -240,11 +274,58 @@ def get_statistics(request):
             'error': f'获取统计信息失败: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_statistics_summary(request):
+    """
+    获取统计信息（只读取预先汇总的 SupplySummary）
+    参数: form_id(可选，只返回该申请表的汇总), refresh=1(先全量刷新汇总表)
+    汇总表由迁移初始化并随写入维护，为空时返回空统计，不在请求中全量聚合
+    （需要时运行 refresh_supply_summaries 命令）。
+    - category_stats.low_stock_count: 分类下 current_stock <= safety_stock 的耗材数
+    - form_stats: 申请表可见计算项目的数量、当月需求、实际订购数量和订购金额
+    """
+    if request.query_params.get('refresh') in ('1', 'true'):
+        refresh_all_summaries()
+    
+    summaries = SupplySummary.objects.all()
+    form_id = request.query_params.get('form_id')
+    if form_id:
+        summaries = summaries.filter(Q(scope='category') | Q(scope='form', form_id=form_id))
+    
+    category_stats = {}
+    form_stats = []
+    for summary in summaries:
+        if summary.scope == 'category':
+            category_stats[summary.category] = {
+                'count': summary.item_count,
+                'total_stock': summary.total_stock,
+                'total_value': float(summary.total_amount),
+                'low_stock_count': summary.low_stock_count,
+            }
+        else:
+            form_stats.append({
+                'form_id': summary.form_id,
+                'item_count': summary.item_count,
+                'total_demand': summary.total_demand,
+                'total_actual_order': summary.total_actual_order,
+                'total_amount': float(summary.total_amount),
+                'updated_at': summary.updated_at.isoformat(),
+            })
+    
+    return Response({
+        'total_supplies': sum(stats['count'] for stats in category_stats.values()),
+        'low_stock_count': sum(stats['low_stock_count'] for stats in category_stats.values()),
+        'total_value': sum(stats['total_value'] for stats in category_stats.values()),
+        'category_stats': category_stats,
+        'form_stats': form_stats,
+    })
+
 # ================================
 # 🆕 B482耗材管控申请表视图集
 # ================================
 
-class B482SupplyItemViewSet(viewsets.ModelViewSet):
+class B482SupplyItemViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """B482耗材管控申请表视图集"""
     queryset = B482SupplyItem.objects.all()
     serializer_class = B482SupplyItemSerializer
@@ -266,7 +347,7 @@ class B482SupplyItemViewSet(viewsets.ModelViewSet):
 # 🆕 Andor耗材需求计算表视图集
 # ================================
 
-class AndorSupplyItemViewSet(viewsets.ModelViewSet):
+class AndorSupplyItemViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """Andor耗材需求计算表视图集"""
     queryset = AndorSupplyItem.objects.all()
     serializer_class = AndorSupplyItemSerializer
@@ -290,7 +371,7 @@ class AndorSupplyItemViewSet(viewsets.ModelViewSet):
 # 🆕 产能预测数据视图集
 # ================================
 
-class CapacityForecastViewSet(viewsets.ModelViewSet):
+class CapacityForecastViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """产能预测数据视图集"""
     queryset = CapacityForecast.objects.all()
     serializer_class = CapacityForecastSerializer
@@ -304,7 +385,7 @@ class CapacityForecastViewSet(viewsets.ModelViewSet):
 # 🆕 B453 SMT ATE耗材管控表视图集
 # ================================
 
-class B453SupplyItemViewSet(viewsets.ModelViewSet):
+class B453SupplyItemViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """B453 SMT ATE耗材管控表视图集"""
     queryset = B453SupplyItem.objects.all()
     serializer_class = B453SupplyItemSerializer
@@ -326,7 +407,7 @@ class B453SupplyItemViewSet(viewsets.ModelViewSet):
 # 🆕 B453耗材需求计算表视图集
 # ================================
 
-class B453CalculationItemViewSet(viewsets.ModelViewSet):
+class B453CalculationItemViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """B453耗材需求计算表视图集"""
     queryset = B453CalculationItem.objects.all()
     serializer_class = B453CalculationItemSerializer
@@ -348,7 +429,7 @@ class B453CalculationItemViewSet(viewsets.ModelViewSet):
 # 🆕 B453产能预测数据视图集
 # ================================
 
-class B453ForecastDataViewSet(viewsets.ModelViewSet):
+class B453ForecastDataViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """B453产能预测数据视图集"""
     queryset = B453ForecastData.objects.all()
     serializer_class = B453ForecastDataSerializer
@@ -365,6 +446,8 @@ class B453ForecastDataViewSet(viewsets.ModelViewSet):
 # 🆕 统一计算引擎API
 # ================================
 
+UNIFIED_BATCH_MAX_ITEMS = 1000  # 批量计算单次最多参数组数
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def unified_calculation(request):
@@ -373,53 +456,45 @@ def unified_calculation(request):
     计算当月需求/站、最高/最低库存等
     """
     try:
-        # 获取计算参数
-        monthly_capacity = request.data.get('monthly_capacity')
-        usage_per_set = request.data.get('usage_per_set')
-        usage_count = request.data.get('usage_count')
-        max_capacity = request.data.get('max_capacity')
-        min_capacity = request.data.get('min_capacity')
-        current_stock = request.data.get('current_stock')
-        unit_price = request.data.get('unit_price')
-        
-        if not all([monthly_capacity, usage_per_set, usage_count]):
-            return Response({
-                'error': '缺少必要参数: monthly_capacity, usage_per_set, usage_count'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 计算当月需求/站
-        monthly_demand = round(monthly_capacity * usage_per_set / usage_count) if usage_count > 0 else 0
-        
-        result = {
-            'monthly_demand': monthly_demand
-        }
-        
-        # 计算最高库存和最低库存
-        if max_capacity and usage_count > 0:
-            max_inventory = round(max_capacity * usage_per_set / usage_count)
-            result['max_inventory'] = max_inventory
-            # 安全库存等于最高库存
-            result['safety_stock'] = max_inventory
-        
-        if min_capacity and usage_count > 0:
-            min_inventory = round(min_capacity * usage_per_set / usage_count)
-            result['min_inventory'] = min_inventory
-            
-            # 验证安全库存是否在合理范围内
-            if 'safety_stock' in result:
-                if result['safety_stock'] < min_inventory:
-                    return Response({
-                        'error': f'安全库存({result["safety_stock"]})不能低于最低库存({min_inventory})'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-        
-        if current_stock is not None:
-            result['net_demand'] = max(0, monthly_demand - current_stock)
-        
-        if unit_price:
-            result['demand_value'] = monthly_demand * float(unit_price)
-        
+        result = unified_calculate(request.data)
         return Response(result, status=status.HTTP_200_OK)
         
+    except CalculationError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({
+            'error': f'计算失败: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def unified_calculation_batch(request):
+    """
+    统一计算引擎批量API
+    请求体: {"items": [{monthly_capacity, usage_per_set, usage_count, ...}, ...]}
+    一次请求计算多组参数，结果按输入顺序返回，单项参数错误不影响其他项
+    """
+    items = request.data.get('items')
+    if not isinstance(items, list) or not items:
+        return Response({
+            'error': '请提供计算参数列表 items'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if len(items) > UNIFIED_BATCH_MAX_ITEMS:
+        return Response({
+            'error': f'单次最多计算 {UNIFIED_BATCH_MAX_ITEMS} 组参数'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        results = unified_calculate_many(items)
+        return Response({
+            'results': results,
+            'count': len(results),
+            'error_count': sum(1 for result in results if 'error' in result)
+        }, status=status.HTTP_200_OK)
+        
     except Exception as e:
         return Response({
             'error': f'计算失败: {str(e)}'
@@ -482,7 +557,7 @@ def link_b453_data(request):
 # 🆕 动态申请表API视图
 # ================================
 
-class ApplicationTemplateViewSet(viewsets.ModelViewSet):
+class ApplicationTemplateViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """申请表模板管理"""
     queryset = ApplicationTemplate.objects.all()
     serializer_class = ApplicationTemplateSerializer
@@ -547,15 +622,19 @@ class ApplicationTemplateViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def active_templates(self, request):
-        """获取所有启用的模板"""
-        templates = ApplicationTemplate.objects.filter(is_active=True)
-        serializer = self.get_serializer(templates, many=True)
-        return Response(serializer.data)
+        """获取所有启用的模板（版本化缓存，模板变化时失效；?fields= 不同的请求分别缓存）"""
+        def build():
+            templates = self.apply_sparse_fieldset(ApplicationTemplate.objects.filter(is_active=True))
+            return self.get_serializer(templates, many=True).data
+
+        return cached_config_response(
+            request, ACTIVE_TEMPLATES_CACHE, build, variant=request.META.get('QUERY_STRING', '')
+        )
 
 
-class ApplicationFormViewSet(viewsets.ModelViewSet):
+class ApplicationFormViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """申请表实例管理"""
-    queryset = ApplicationForm.objects.all()
+    queryset = ApplicationForm.objects.select_related('template', 'created_by')
     serializer_class = ApplicationFormSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = None  # 关闭分页，返回所有数据
@@ -587,7 +666,7 @@ class ApplicationFormViewSet(viewsets.ModelViewSet):
                     DynamicSupplyItem.objects.filter(form=instance).delete()
                 
                 if calculation_items_count > 0:
-                    DynamicCalculationItem.objects.filter(form=instance).delete()
+                    delete_calculation_items(DynamicCalculationItem.objects.filter(form=instance))
                 
                 if forecast_data_count > 0:
                     DynamicForecastData.objects.filter(form=instance).delete()
@@ -628,36 +707,60 @@ class ApplicationFormViewSet(viewsets.ModelViewSet):
         # 创建计算表实例（这里可以根据需要创建对应的计算表数据）
         form.has_calculation_form = True
         form.calculation_form_id = form.id  # 简化处理，实际可以创建独立的计算表
-        form.save()
+        form.save(update_fields=['has_calculation_form', 'calculation_form_id', 'updated_at'])
         
         return Response({'message': '计算表创建成功', 'calculation_form_id': form.calculation_form_id})
     
+    @action(detail=True, methods=['post'])
+    def clone_from(self, request, pk=None):
+        """从源申请表复制计算项目、耗材项目和预测数据（月初按上月申请表新建）"""
+        form = self.get_object()
+        source_form_id = request.data.get('source_form_id')
+        kinds = request.data.get('kinds') or list(CLONE_KINDS)
+        
+        if not source_form_id:
+            return Response({'error': '请提供源申请表ID'}, status=400)
+        
+        try:
+            copied = FormCloner(source_form_id, form.id).clone(kinds=kinds)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=400)
+        except ApplicationForm.DoesNotExist:
+            return Response({'error': '源申请表不存在'}, status=404)
+        
+        return Response({'message': f'成功复制 {sum(copied.values())} 条数据', 'copied': copied})
+    
     @action(detail=False, methods=['get'])
     def by_department(self, request):
         """按部门获取申请表"""
         department = request.query_params.get('department')
         if department:
-            forms = ApplicationForm.objects.filter(department=department)
+            forms = self.apply_sparse_fieldset(self.get_queryset().filter(department=department))
             serializer = self.get_serializer(forms, many=True)
             return Response(serializer.data)
         return Response({'error': '请提供部门参数'}, status=400)
 
 
-class DynamicSupplyItemViewSet(viewsets.ModelViewSet):
+class DynamicSupplyItemViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """动态申请表耗材项目管理"""
-    queryset = DynamicSupplyItem.objects.all()
+    # form_name/form_code 来自关联的申请表，统一 select_related 避免 N+1 查询
+    queryset = DynamicSupplyItem.objects.select_related('form')
     serializer_class = DynamicSupplyItemSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = None  # 关闭分页，返回所有数据
     
     @action(detail=False, methods=['get'])
     def by_form(self, request):
-        """根据申请表ID获取耗材项目"""
+        """根据申请表ID获取耗材项目（支持 If-None-Match 条件请求）"""
         form_id = request.query_params.get('form_id')
         if form_id:
-            items = DynamicSupplyItem.objects.filter(form_id=form_id).order_by('serial_number')
+            etag, not_modified = check_form_etag(request, form_id, 'supply-items')
+            if not_modified is not None:
+                return not_modified
+            items = DynamicSupplyItem.objects.select_related('form').filter(form_id=form_id).order_by('serial_number')
+            items = self.apply_sparse_fieldset(items)
             serializer = self.get_serializer(items, many=True)
-            return Response(serializer.data)
+            return with_etag(Response(serializer.data), etag)
         return Response({'error': '请提供申请表ID'}, status=400)
     
     @action(detail=False, methods=['post'])
@@ -690,12 +793,13 @@ class DynamicSupplyItemViewSet(viewsets.ModelViewSet):
             return Response({'error': '申请表不存在'}, status=404)
 
 
-class DynamicCalculationItemViewSet(viewsets.ModelViewSet):
+class DynamicCalculationItemViewSet(SparseFieldsetMixin, JsonLinesStreamMixin, viewsets.ModelViewSet):
     """动态计算表项目管理"""
-    queryset = DynamicCalculationItem.objects.all()
+    queryset = DynamicCalculationItem.objects.select_related('form')
     serializer_class = DynamicCalculationItemSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = None  # 关闭分页，返回所有数据
+    # 按需分页：带 cursor/page_size 参数时按 (form_id, no) 游标分页，否则仍返回全部数据
+    pagination_class = FormItemKeysetPagination
 
     def get_queryset(self):
         """
@@ -703,7 +807,7 @@ class DynamicCalculationItemViewSet(viewsets.ModelViewSet):
         - 对于列表视图，默认只显示 is_visible=True 的项目，除非提供了 include_hidden=true。
         - 对于详情、更新、删除等操作，返回所有项目，以便能操作隐藏项。
         """
-        queryset = DynamicCalculationItem.objects.all()
+        queryset = DynamicCalculationItem.objects.select_related('form')
 
         if self.action == 'list':
             include_hidden = self.request.query_params.get('include_hidden', 'false').lower() == 'true'
@@ -714,24 +818,62 @@ class DynamicCalculationItemViewSet(viewsets.ModelViewSet):
         # 我们不过滤 is_visible，以便可以获取和操作隐藏的项目。
         return queryset
 
+    def perform_destroy(self, instance):
+        # 计算项目没有删除信号，墓碑、统计汇总和数据版本由 delete_calculation_items 统一处理
+        delete_calculation_items(DynamicCalculationItem.objects.filter(pk=instance.pk))
+
+    def list(self, request, *args, **kwargs):
+        """列表视图，支持 ?stream=jsonl 流式输出"""
+        if self.wants_json_lines():
+            queryset = self.filter_queryset(self.get_queryset()).order_by('form_id', 'no')
+            return self.stream_json_lines(queryset)
+        return super().list(request, *args, **kwargs)
+
     @action(detail=False, methods=['get'])
     def by_form(self, request):
         """
         根据申请表ID获取计算项目。
         默认只返回可见的项目，除非 `include_hidden=true`。
+        - 带 `cursor`/`page_size` 参数时按 (form_id, no) 游标分页
+        - 带 `stream=jsonl` 参数时以 JSON Lines 流式返回
+        - 带 `since` 参数（上次返回的 next_since）时只返回增量和删除/隐藏列表，见 delta_sync
+        - 响应带 ETag（申请表数据版本），If-None-Match 未变化时返回 304，不读取明细表
         """
         form_id = request.query_params.get('form_id')
         if not form_id:
             return Response({'error': '缺少 form_id 参数'}, status=status.HTTP_400_BAD_REQUEST)
 
-        queryset = DynamicCalculationItem.objects.filter(form_id=form_id)
+        etag, not_modified = check_form_etag(request, form_id, 'calculation-items')
+        if not_modified is not None:
+            return not_modified
 
         include_hidden = self.request.query_params.get('include_hidden', 'false').lower() == 'true'
+
+        since = request.query_params.get('since')
+        if since:
+            try:
+                delta = CalculationItemDelta(form_id, since, include_hidden)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = self.apply_sparse_fieldset(delta.changed_items().order_by('no'))
+            serializer = self.get_serializer(queryset, many=True)
+            return with_etag(Response(delta.response_data(serializer.data)), etag)
+
+        queryset = DynamicCalculationItem.objects.select_related('form').filter(form_id=form_id)
         if not include_hidden:
             queryset = queryset.filter(is_visible=True)
 
-        serializer = self.get_serializer(queryset.order_by('no'), many=True)
-        return Response(serializer.data)
+        queryset = self.apply_sparse_fieldset(queryset.order_by('no'))
+        if self.wants_json_lines():
+            return with_etag(self.stream_json_lines(queryset), etag)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return with_etag(self.get_paginated_response(serializer.data), etag)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return with_etag(Response(serializer.data), etag)
 
     @action(detail=False, methods=['post'])
     def bulk_hide(self, request):
@@ -749,7 +891,11 @@ class DynamicCalculationItemViewSet(viewsets.ModelViewSet):
 
             # 使用 transaction 来确保操作的原子性
             with transaction.atomic():
-                updated_count = DynamicCalculationItem.objects.filter(id__in=valid_ids).update(is_visible=False)
+                items = DynamicCalculationItem.objects.filter(id__in=valid_ids)
+                form_ids = list(items.values_list('form_id', flat=True).distinct())
+                schedule_form_summary(*form_ids)
+                # 同时写入 change_version，增量同步（by_form?since=）据此返回隐藏/显示的项目
+                updated_count = stamp_calculation_items(items, is_visible=False)
 
             return Response({
                 'message': f'成功隐藏 {updated_count} 个项目。',
@@ -772,7 +918,11 @@ class DynamicCalculationItemViewSet(viewsets.ModelViewSet):
                 return Response({'error': '提供的ID列表无效'}, status=status.HTTP_400_BAD_REQUEST)
 
             with transaction.atomic():
-                updated_count = DynamicCalculationItem.objects.filter(id__in=valid_ids).update(is_visible=True)
+                items = DynamicCalculationItem.objects.filter(id__in=valid_ids)
+                form_ids = list(items.values_list('form_id', flat=True).distinct())
+                schedule_form_summary(*form_ids)
+                # 同时写入 change_version，增量同步（by_form?since=）据此返回隐藏/显示的项目
+                updated_count = stamp_calculation_items(items, is_visible=True)
 
             return Response({
                 'message': f'成功显示 {updated_count} 个项目。',
@@ -784,85 +934,12 @@ class DynamicCalculationItemViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def calculate_demands(self, request):
-        """批量计算需求量"""
+        """批量计算需求量（向量化计算，单次 bulk_update 写回）"""
         form_id = request.data.get('form_id')
         if not form_id:
             return Response({'error': '请提供申请表ID'}, status=400)
         
-        items = DynamicCalculationItem.objects.filter(form_id=form_id)
-        updated_items = []
-        
-        for item in items:
-            if item.is_multi_station and item.multi_station_data:
-                # 多站别数据处理
-                stations = item.multi_station_data.get('stations', [])
-                usage_per_set = item.multi_station_data.get('usage_per_set', [])
-                usage_count = item.multi_station_data.get('usage_count', [])
-                monthly_capacity = item.multi_station_data.get('monthly_capacity', [])
-                min_stock = item.multi_station_data.get('min_stock', [])
-                
-                monthly_demands = []
-                monthly_net_demands = []
-                actual_orders = []
-                
-                for i in range(len(stations)):
-                    if usage_count[i] > 0:
-                        demand = int(monthly_capacity[i] * usage_per_set[i] / usage_count[i])
-                        net_demand = max(0, demand - min_stock[i])
-                        actual_order = net_demand
-                    else:
-                        demand = 0
-                        net_demand = 0
-                        actual_order = 0
-                    
-                    monthly_demands.append(demand)
-                    monthly_net_demands.append(net_demand)
-                    actual_orders.append(actual_order)
-                
-                # 更新多站别数据
-                item.multi_station_data['monthly_demand'] = monthly_demands
-                item.multi_station_data['monthly_net_demand'] = monthly_net_demands
-                item.multi_station_data['actual_order'] = actual_orders
-                
-                # 计算总计
-                total_monthly_demand = sum(monthly_demands)
-                total_monthly_net_demand = sum(monthly_net_demands)
-                total_actual_order = sum(actual_orders)
-                
-                item.monthly_demand = total_monthly_demand
-                item.monthly_net_demand = total_monthly_net_demand
-                item.actual_order = total_actual_order
-                item.save()
-                
-                updated_items.append({
-                    'id': item.id,
-                    'material_name': item.material_name,
-                    'monthly_demand': total_monthly_demand,
-                    'monthly_net_demand': total_monthly_net_demand,
-                    'actual_order': total_actual_order,
-                    'is_multi_station': True
-                })
-            else:
-                # 单站别数据处理
-                if item.usage_count > 0:
-                    monthly_demand = int(item.monthly_capacity * item.usage_per_set / item.usage_count)
-                    monthly_net_demand = max(0, monthly_demand - item.min_stock)
-                    # 实际订购数量通常等于月度总需求
-                    actual_order = monthly_net_demand
-                    
-                    item.monthly_demand = monthly_demand
-                    item.monthly_net_demand = monthly_net_demand
-                    item.actual_order = actual_order
-                    item.save()
-                    
-                    updated_items.append({
-                        'id': item.id,
-                        'material_name': item.material_name,
-                        'monthly_demand': monthly_demand,
-                        'monthly_net_demand': monthly_net_demand,
-                        'actual_order': actual_order,
-                        'is_multi_station': False
-                    })
+        updated_items = FormDemandCalculator(form_id).run()
         
         return Response({
             'message': f'成功计算 {len(updated_items)} 个项目的需求量',
@@ -883,52 +960,21 @@ class DynamicCalculationItemViewSet(viewsets.ModelViewSet):
             target_form = ApplicationForm.objects.get(id=target_form_id)
             source_form = ApplicationForm.objects.get(id=source_form_id)
             
-            # 获取源申请表的所有计算项目
-            source_items = DynamicCalculationItem.objects.filter(form_id=source_form_id)
-            
-            if not source_items.exists():
+            if not DynamicCalculationItem.objects.filter(form_id=source_form_id).exists():
                 return Response({'error': '源申请表中没有耗材项目可以复制'}, status=400)
             
-            copied_items = []
-            
+            # 复制基础信息、价格采购信息和库存设置（不复制需求和库存数量），序号接在目标表已有项目之后
             with transaction.atomic():
-                for source_item in source_items:
-                    # 创建新的计算项目，复制基础信息但不复制库存相关数据
-                    new_item = DynamicCalculationItem.objects.create(
-                        form=target_form,
-                        no=source_item.no,
-                        material_name=source_item.material_name,
-                        usage_station=source_item.usage_station,
-                        usage_per_set=source_item.usage_per_set,
-                        usage_count=source_item.usage_count,
-                        monthly_capacity=source_item.monthly_capacity,
-                        
-                        # 复制价格和采购信息
-                        unit_price=source_item.unit_price,
-                        purchaser=source_item.purchaser,
-                        moq=source_item.moq,
-                        
-                        # 复制库存设置（但不复制具体库存数量）
-                        min_stock=source_item.min_stock,
-                        max_stock=source_item.max_stock,
-                        
-                        # 为必需字段设置默认值
-                        monthly_demand=0,
-                        monthly_net_demand=0,
-                        actual_order=0,
-                        
-                        # 复制关联信息
-                        linked_supply_item_id=source_item.linked_supply_item_id,
-                        linked_material=source_item.linked_material,
-                    )
-                    
-                    copied_items.append({
-                        'id': new_item.id,
-                        'no': new_item.no,
-                        'material_name': new_item.material_name,
-                        'unit_price': float(new_item.unit_price) if new_item.unit_price else 0,
-                        'purchaser': new_item.purchaser,
-                    })
+                copied_count = FormCloner(source_form.id, target_form.id).clone(kinds=['calculation_items'])['calculation_items']
+                # 目标申请表在事务结束前保持锁定，序号最大的 copied_count 条即为本次复制的项目
+                new_items = (
+                    DynamicCalculationItem.objects.filter(form_id=target_form.id)
+                    .order_by('-no').values('id', 'no', 'material_name', 'unit_price', 'purchaser')[:copied_count]
+                )
+                copied_items = [
+                    {**item, 'unit_price': float(item['unit_price']) if item['unit_price'] else 0}
+                    for item in reversed(new_items)
+                ]
             
             return Response({
                 'message': f'成功从 "{source_form.name}" 复制了 {len(copied_items)} 个耗材项目到 "{target_form.name}"',
@@ -966,7 +1012,10 @@ class DynamicCalculationItemViewSet(viewsets.ModelViewSet):
             if not items.exists():
                 return Response({'error': '该申请表中没有计算项目'}, status=400)
             
-            updated_count = items.update(purchaser=purchaser.strip())
+            with transaction.atomic():
+                schedule_form_summary(form_id)
+                # 同时写入 change_version，增量同步（by_form?since=）据此返回修改过的项目
+                updated_count = stamp_calculation_items(items, purchaser=purchaser.strip())
             
             return Response({
                 'message': f'成功将 {updated_count} 个项目的采购员设置为: {purchaser}',
@@ -984,138 +1033,58 @@ class DynamicCalculationItemViewSet(viewsets.ModelViewSet):
             item = self.get_object()
             sync_type = request.data.get('sync_type')  # 'chase_to_order' 或 'order_to_chase'
             target_month_key = request.data.get('target_month_key')
+            target_week = request.data.get('target_week', 'W02')  # 默认W02，但允许用户选择
             
             if not target_month_key:
                 return Response({'error': '请提供目标月份'}, status=400)
             
-            if sync_type == 'chase_to_order':
-                # 从进料需求同步到實際請購數量
-                chase_data = item.chase_data.get(target_month_key, {})
-                total_chase = sum(chase_data.values())
-                
-                # 更新actual_order
-                if item.is_multi_station and item.multi_station_data:
-                    # 多站别项目：平均分配进料需求
-                    station_count = len(item.multi_station_data.get('stations', []))
-                    if station_count > 0:
-                        per_station_order = total_chase // station_count
-                        item.multi_station_data['actual_order'] = [per_station_order] * station_count
-                        item.actual_order = total_chase
-                else:
-                    # 单站别项目
-                    item.actual_order = total_chase
-                
-                item.save()
-                
-                return Response({
-                    'message': f'成功同步项目 {item.material_name} 的进料需求到實際請購數量',
-                    'actual_order': item.actual_order,
-                    'chase_data': chase_data
-                })
-                
-            elif sync_type == 'order_to_chase':
-                # 从實際請購數量同步到进料需求
-                actual_order = item.actual_order or 0
-                target_week = request.data.get('target_week', 'W02')  # 默认W02，但允许用户选择
-                
-                # 根据用户选择的周安排實際請購數量
-                chase_data = {
-                    'W01': target_week == 'W01' and actual_order or 0,
-                    'W02': target_week == 'W02' and actual_order or 0,
-                    'W03': target_week == 'W03' and actual_order or 0,
-                    'W04': target_week == 'W04' and actual_order or 0
-                }
-                
-                # 更新chase_data
-                if not item.chase_data:
-                    item.chase_data = {}
-                item.chase_data[target_month_key] = chase_data
-                item.save()
-                
-                return Response({
-                    'message': f'成功同步项目 {item.material_name} 的實際請購數量到进料需求',
-                    'actual_order': actual_order,
-                    'chase_data': chase_data
-                })
+            if sync_type not in SYNC_DIRECTIONS:
+                return Response({'error': '无效的同步类型'}, status=400)
+            
+            chase_data = apply_chase_sync(item, sync_type, target_month_key, target_week)
+            item.save(update_fields=['actual_order', 'chase_data', 'multi_station_data', 'updated_at'])
             
+            if sync_type == 'chase_to_order':
+                message = f'成功同步项目 {item.material_name} 的进料需求到實際請購數量'
             else:
-                return Response({'error': '无效的同步类型'}, status=400)
+                message = f'成功同步项目 {item.material_name} 的實際請購數量到进料需求'
+            
+            return Response({
+                'message': message,
+                'actual_order': item.actual_order,
+                'chase_data': chase_data
+            })
                 
         except Exception as e:
             return Response({'error': f'同步失败: {str(e)}'}, status=500)
 
     @action(detail=False, methods=['post'])
     def sync_chase_data_with_actual_order(self, request):
-        """同步进料需求与實際請購數量"""
+        """
+        同步进料需求与實際請購數量
+        只写回发生变化的行，并返回变化摘要
+        """
         try:
             form_id = request.data.get('form_id')
             sync_direction = request.data.get('direction', 'chase_to_order')  # chase_to_order 或 order_to_chase
+            target_month_key = request.data.get('target_month_key')  # 例如: "2025-07"
+            target_week = request.data.get('target_week', 'W02')  # 默认W02，但允许用户选择
             
             if not form_id:
                 return Response({'error': '请提供申请表ID'}, status=400)
             
-            items = DynamicCalculationItem.objects.filter(form_id=form_id)
-            updated_items = []
+            if not target_month_key:
+                return Response({'error': '请提供目标月份'}, status=400)
             
-            for item in items:
-                target_month_key = request.data.get('target_month_key')  # 例如: "2025-07"
-                if not target_month_key:
-                    return Response({'error': '请提供目标月份'}, status=400)
-                
-                if sync_direction == 'chase_to_order':
-                    # 从进料需求同步到實際請購數量
-                    chase_data = item.chase_data.get(target_month_key, {})
-                    total_chase = sum(chase_data.values())
-                    
-                    # 更新actual_order
-                    if item.is_multi_station and item.multi_station_data:
-                        # 多站别项目：平均分配进料需求
-                        station_count = len(item.multi_station_data.get('stations', []))
-                        if station_count > 0:
-                            per_station_order = total_chase // station_count
-                            item.multi_station_data['actual_order'] = [per_station_order] * station_count
-                            item.actual_order = total_chase
-                    else:
-                        # 单站别项目
-                        item.actual_order = total_chase
-                    
-                    updated_items.append({
-                        'id': item.id,
-                        'material_name': item.material_name,
-                        'actual_order': item.actual_order,
-                        'chase_data': chase_data
-                    })
-                    
-                elif sync_direction == 'order_to_chase':
-                    # 从實際請購數量同步到进料需求
-                    actual_order = item.actual_order or 0
-                    target_week = request.data.get('target_week', 'W02')  # 默认W02，但允许用户选择
-                    
-                    # 根据用户选择的周安排實際請購數量
-                    chase_data = {
-                        'W01': target_week == 'W01' and actual_order or 0,
-                        'W02': target_week == 'W02' and actual_order or 0,
-                        'W03': target_week == 'W03' and actual_order or 0,
-                        'W04': target_week == 'W04' and actual_order or 0
-                    }
-                    
-                    # 更新chase_data
-                    if not item.chase_data:
-                        item.chase_data = {}
-                    item.chase_data[target_month_key] = chase_data
-                    
-                    updated_items.append({
-                        'id': item.id,
-                        'material_name': item.material_name,
-                        'actual_order': actual_order,
-                        'chase_data': chase_data
-                    })
-                
-                item.save()
+            if sync_direction not in SYNC_DIRECTIONS:
+                return Response({'error': '无效的同步方向'}, status=400)
+            
+            result = FormChaseSync(form_id, sync_direction, target_month_key, target_week).run()
             
             return Response({
-                'message': f'成功同步{len(updated_items)}个项目的数据',
-                'updated_items': updated_items,
+                'message': f'成功同步{result["summary"]["updated_count"]}个项目的数据',
+                'updated_items': result['updated_items'],
+                'summary': result['summary'],
                 'sync_direction': sync_direction
             })
             
@@ -1123,21 +1092,24 @@ class DynamicCalculationItemViewSet(viewsets.ModelViewSet):
             return Response({'error': f'同步失败: {str(e)}'}, status=500)
 
 
-class DynamicForecastDataViewSet(viewsets.ModelViewSet):
+class DynamicForecastDataViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """动态产能预测数据管理"""
-    queryset = DynamicForecastData.objects.all()
+    queryset = DynamicForecastData.objects.select_related('form')
     serializer_class = DynamicForecastDataSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = None  # 关闭分页，返回所有数据
     
     @action(detail=False, methods=['get'])
     def by_form(self, request):
-        """根据申请表ID获取预测数据"""
+        """根据申请表ID获取预测数据（支持 If-None-Match 条件请求）"""
         form_id = request.query_params.get('form_id')
         if form_id:
-            forecasts = DynamicForecastData.objects.filter(form_id=form_id)
+            etag, not_modified = check_form_etag(request, form_id, 'forecasts')
+            if not_modified is not None:
+                return not_modified
+            forecasts = self.apply_sparse_fieldset(DynamicForecastData.objects.select_related('form').filter(form_id=form_id))
             serializer = self.get_serializer(forecasts, many=True)
-            return Response(serializer.data)
+            return with_etag(Response(serializer.data), etag)
         return Response({'error': '请提供申请表ID'}, status=400)
 
     @action(detail=False, methods=['post'])
@@ -1150,26 +1122,15 @@ class DynamicForecastDataViewSet(viewsets.ModelViewSet):
             return Response({'error': '请提供源表和目标表ID'}, status=400)
             
         try:
-            # 获取源表的预测数据
-            source_forecasts = DynamicForecastData.objects.filter(form_id=source_form_id)
-            
-            # 复制到新表
-            for forecast in source_forecasts:
-                forecast.pk = None  # 清除主键以创建新记录
-                forecast.form_id = target_form_id
-                forecast.save()
-                
+            # 一个事务内批量复制到新表
+            FormCloner(source_form_id, target_form_id).clone(kinds=['forecasts'])
             return Response({'message': '预测数据复制成功'})
+        except ApplicationForm.DoesNotExist:
+            return Response({'error': '指定的申请表不存在'}, status=404)
         except Exception as e:
             return Response({'error': f'复制预测数据失败: {str(e)}'}, status=400)
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def get_b453_calculation_headers(request):
-    """
-    提供B453耗材需求计算表的前端表头配置 (Ant Design Table columns)
-    现在返回完整的列配置，包含dataIndex和key
-    """
+def _b453_calculation_headers():
     headers = [
         {'title': 'No.', 'dataIndex': 'no', 'key': 'no', 'width': 80},
         {'title': '料材名稱', 'dataIndex': 'material_name', 'key': 'material_name', 'width': 300},
@@ -1186,14 +1147,23 @@ def get_b453_calculation_headers(request):
         {'title': '實際請購數量', 'dataIndex': 'actual_purchase_quantity', 'key': 'actual_purchase_quantity', 'width': 150},
         {'title': '備註(MOQ)', 'dataIndex': 'moq_remark', 'key': 'moq_remark', 'width': 200}
     ]
-    return Response(headers)
+    return headers
+
+
+B453_CALCULATION_HEADERS = static_config_entry(_b453_calculation_headers)
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_b453_management_headers(request):
+def get_b453_calculation_headers(request):
     """
-    获取B453耗材管控表的表头配置（层级结构）
+    提供B453耗材需求计算表的前端表头配置 (Ant Design Table columns)
+    现在返回完整的列配置，包含dataIndex和key
+    列配置是常量，响应体和 ETag 在模块导入时构建一次，支持 If-None-Match 条件请求
     """
+    return config_response(request, B453_CALCULATION_HEADERS)
+
+def _b453_management_headers():
     headers = [
         {'title': '序號', 'dataIndex': 'no', 'width': 60, 'fixed': 'left', 'className': 'bg-orange-100'},
         {'title': '物料描述', 'dataIndex': 'material_name', 'width': 300, 'fixed': 'left'},
@@ -1280,7 +1250,20 @@ def get_b453_management_headers(request):
         {'title': '總金額(RMB)', 'dataIndex': 'total_amount', 'width': 120},
         {'title': '備註', 'dataIndex': 'moq_remark', 'width': 150},
     ]
-    return Response(headers)
+    return headers
+
+
+B453_MANAGEMENT_HEADERS = static_config_entry(_b453_management_headers)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_b453_management_headers(request):
+    """
+    获取B453耗材管控表的表头配置（层级结构）
+    列配置是常量，响应体和 ETag 在模块导入时构建一次，支持 If-None-Match 条件请求
+    """
+    return config_response(request, B453_MANAGEMENT_HEADERS)
 
 
 @api_view(['POST'])
@@ -1321,9 +1304,8 @@ def import_supplies_excel(request):
             return Response({'error': '在文件的第4行中未找到"物料描述"列，无法进行格式化。'}, status=400)
 
         # --- 应用格式 ---
-        # 从第5行开始处理数据
-        for row in worksheet.iter_rows(min_row=5):
-            cell = row[material_desc_col_index - 1] # 转换为0-based索引
+        # 从第5行开始处理数据（只遍历"物料描述"这一列）
+        for (cell,) in worksheet.iter_rows(min_row=5, min_col=material_desc_col_index, max_col=material_desc_col_index):
             
             # 1. 为所有单元格启用自动换行
             cell.alignment = Alignment(wrap_text=True, vertical='center')
@@ -1357,29 +1339,22 @@ def import_supplies_excel(request):
 
 
 
+# 表格类型检测关键字（创建时统一转小写，检测时不再重复处理）
+MANAGEMENT_HEADER_SCORER = KeywordScorer(['物料描述', '采购员', '单价', '安全库存', 'MOQ', 'L/T'])
+CALCULATION_HEADER_SCORER = KeywordScorer(['料材名称', '使用站别', '每臺機用量', '使用次数', '当月产能', '当月需求/站'])
+MANAGEMENT_CONTENT_SCORER = KeywordScorer(['物料描述', '采购员', '单价', '安全库存', 'MOQ', 'L/T', '序號', '單位', '備註', '採購員', '單價'])
+CALCULATION_CONTENT_SCORER = KeywordScorer(['料材名称', '使用站别', '每臺機用量', '使用次数', '当月产能', '当月需求/站', 'No.', '月份', '耗材名稱', '當月需求/站', '使用站別'])
+
+
 def detect_table_type(columns):
     """
     检测Excel表格类型
     返回 'management' 或 'calculation'
     """
-    # 管控表特征列
-    management_keywords = ['物料描述', '采购员', '单价', '安全库存', 'MOQ', 'L/T']
-    # 需求计算表特征列
-    calculation_keywords = ['料材名称', '使用站别', '每臺機用量', '使用次数', '当月产能', '当月需求/站']
-    
-    management_score = 0
-    calculation_score = 0
-    
-    for col in columns:
-        col_str = str(col).lower()
-        for keyword in management_keywords:
-            if keyword.lower() in col_str:
-                management_score += 1
-        for keyword in calculation_keywords:
-            if keyword.lower() in col_str:
-                calculation_score += 1
+    management_score = MANAGEMENT_HEADER_SCORER.score(columns)
+    calculation_score = CALCULATION_HEADER_SCORER.score(columns)
     
-    print(f"管控表匹配分数: {management_score}, 需求计算表匹配分数: {calculation_score}")
+    logger.debug(f"管控表匹配分数: {management_score}, 需求计算表匹配分数: {calculation_score}")
     
     if calculation_score > management_score:
         return 'calculation'
@@ -1429,36 +1404,16 @@ def detect_table_type_by_content(df):
     通过数据内容检测表格类型
     返回 'management' 或 'calculation' 或 None
     """
-    # 管控表特征列
-    management_keywords = ['物料描述', '采购员', '单价', '安全库存', 'MOQ', 'L/T', '序號', '單位', '備註', '採購員', '單價']
-    # 需求计算表特征列
-    calculation_keywords = ['料材名称', '使用站别', '每臺機用量', '使用次数', '当月产能', '当月需求/站', 'No.', '月份', '耗材名稱', '當月需求/站', '使用站別']
-    
-    management_score = 0
-    calculation_score = 0
-    
     # 检查列名
-    for col in df.columns:
-        col_str = str(col).lower()
-        for keyword in management_keywords:
-            if keyword.lower() in col_str:
-                management_score += 1
-        for keyword in calculation_keywords:
-            if keyword.lower() in col_str:
-                calculation_score += 1
+    management_score = MANAGEMENT_CONTENT_SCORER.score(df.columns)
+    calculation_score = CALCULATION_CONTENT_SCORER.score(df.columns)
     
-    # 检查数据内容（前几行）
-    for idx in range(min(5, len(df))):
-        for col in df.columns:
-            cell_value = str(df.iloc[idx, df.columns.get_loc(col)]).lower()
-            for keyword in management_keywords:
-                if keyword.lower() in cell_value:
-                    management_score += 0.5
-            for keyword in calculation_keywords:
-                if keyword.lower() in cell_value:
-                    calculation_score += 0.5
+    # 检查数据内容（前几行），每个匹配计0.5分
+    cells = df.head(5).to_numpy().ravel()
+    management_score += MANAGEMENT_CONTENT_SCORER.score(cells) * 0.5
+    calculation_score += CALCULATION_CONTENT_SCORER.score(cells) * 0.5
     
-    print(f"内容检测 - 管控表匹配分数: {management_score}, 需求计算表匹配分数: {calculation_score}")
+    logger.debug(f"内容检测 - 管控表匹配分数: {management_score}, 需求计算表匹配分数: {calculation_score}")
     
     if calculation_score > management_score and calculation_score > 2:
         return 'calculation'
@@ -1468,165 +1423,84 @@ def detect_table_type_by_content(df):
         return None
 
 
-def import_management_table(df, sheet_name, form_id, request, file_name, full_path, detection_method):
+def save_import_log(log, **fields):
+    """记录导入日志：后台任务更新已有的ImportLog，否则新建一条"""
+    if log is None:
+        return ImportLog.objects.create(**fields)
+    for name, value in fields.items():
+        setattr(log, name, value)
+    log.save()
+    return log
+
+
+def import_management_table(df, sheet_name, form_id, user, file_name, full_path, detection_method, log=None):
     """
     导入管控表数据
+    log: 后台导入任务对应的ImportLog，为None时新建一条导入日志
     """
-    import pandas as pd
-    
-    # 定义列名映射（支持多种可能的列名，自动模糊查找）
-    column_keywords = {
-        '物料描述': ['物料描述', '品名', '名称', '描述', 'material', 'description'],
-        '单位': ['单位', '單位', 'unit'],
-        '采购员': ['采购员', '採購員', 'purchaser'],
-        '单价(RMB)': ['单价', '單價', '單價（RMB)', '單價(RMB)', '单价(RMB)', 'price'],
-        '安全库存-最高': ['安全库存-最高', '安全庫存最高', '最高', 'max'],
-        '安全库存-最低': ['安全库存-最低', '安全庫存最低', '最低', 'min'],
-        '最小采购量(MOQ)': ['最小采购量', 'MOQ', '最小采购量(MOQ)'],
-        'L/T(Wks)': ['L/T', 'L/T(Wks)', 'L/T_Wks', 'L/T\nWks', '交货周期', '交期'],
-    }
-    
-    # 自动查找包含关键字的列名
-    mapped_columns = {}
-    missing_columns = []
-    for required_col, keywords in column_keywords.items():
-        found = False
-        for col in df.columns:
-            for kw in keywords:
-                if kw.replace('\n', '').replace(' ', '').lower() in str(col).replace('\n', '').replace(' ', '').lower():
-                    mapped_columns[required_col] = col
-                    found = True
-                    break
-            if found:
-                break
-        if not found:
-            missing_columns.append(required_col)
+    # 按预编译的关键字解析列名（每个工作表只解析一次）
+    mapping = ManagementTableImport.header_matcher.resolve(df.columns)
+    mapped_columns = mapping.columns
+    missing_columns = mapping.missing
     
     if missing_columns:
         return Response({
             'error': f'Excel文件缺少必要的列: {", ".join(missing_columns)}'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    # 清理物料描述函数
-    def clean_material_description(desc):
-        if pd.isna(desc):
-            return ""
-        return str(desc).strip()
-    
-    # 处理数据 - 智能过滤和导入有效数据
-    imported_items = []
-    error_items = []
-    
-    # 清空现有B453SupplyItem数据
-    B453SupplyItem.objects.all().delete()
-    
-    # 智能过滤有效数据行
-    valid_rows = []
-    for index, row in df.iterrows():
-        material_desc = clean_material_description(row[mapped_columns['物料描述']])
-        
-        # 跳过空行或无效数据
-        if not material_desc or material_desc.lower() in ['nan', 'none', '']:
-            continue
-        
-        # 跳过表头行和汇总行
-        skip_keywords = ['核准', '审核', '批准', '合计', '总计', '序號', '序号', 'no.', 'no', '物料描述', 'material']
-        if any(keyword.lower() in material_desc.lower() for keyword in skip_keywords):
-            continue
-        
-        # 检查是否包含有效的物料信息（至少包含设备类型或耗材类型）
-        valid_material_keywords = ['設備', '设备', '探針', '探针', '清潔劑', '清洁剂', '密封圈', '密封垫', '喇叭', '膠材', '胶材']
-        if not any(keyword in material_desc for keyword in valid_material_keywords):
-            # 如果不是明显的物料，进一步检查
-            if len(material_desc) < 5:  # 太短的描述可能是无效数据
-                continue
-        
-        valid_rows.append((index, row))
-    
-    print(f"找到 {len(valid_rows)} 条有效物料数据")
-    
-    # 遍历有效的行数据
-    for index, row in valid_rows:
-        material_desc = clean_material_description(row[mapped_columns['物料描述']])
-        
-        try:
-            # 创建B453SupplyItem
-            item = B453SupplyItem.objects.create(
-                serial_number=len(imported_items) + 1,
-                material_description=material_desc,
-                unit=str(row[mapped_columns['单位']]).strip() if pd.notna(row[mapped_columns['单位']]) else 'pcs',
-                purchaser=str(row[mapped_columns['采购员']]).strip() if pd.notna(row[mapped_columns['采购员']]) else '',
-                unit_price=float(row[mapped_columns['单价(RMB)']]) if pd.notna(row[mapped_columns['单价(RMB)']]) else 0,
-                max_safety_stock=int(row[mapped_columns['安全库存-最高']]) if pd.notna(row[mapped_columns['安全库存-最高']]) else 0,
-                min_safety_stock=int(row[mapped_columns['安全库存-最低']]) if pd.notna(row[mapped_columns['安全库存-最低']]) else 0,
-                moq=int(row[mapped_columns['最小采购量(MOQ)']]) if pd.notna(row[mapped_columns['最小采购量(MOQ)']]) else 0,
-                lead_time_weeks=int(row[mapped_columns['L/T(Wks)']]) if pd.notna(row[mapped_columns['L/T(Wks)']]) else 0,
-                created_by=request.user
-            )
-            imported_items.append({
-                'serial_number': item.serial_number,
-                'material_description': item.material_description,
-                'unit': item.unit,
-                'unit_price': item.unit_price
-            })
-            print(f"✓ 导入管控表: {material_desc}")
-            
-        except Exception as e:
-            error_items.append({
-                'material': material_desc,
-                'error': str(e)
-            })
-            print(f"✗ 错误: {material_desc} - {str(e)}")
+    # 整表向量化清洗校验，并在一个事务中替换B453SupplyItem数据
+    imported_items, error_items = ManagementTableImport(df, mapped_columns, user).run()
     
     # 同步到DynamicCalculationItem (form_id)
+    update_progress(log, 'syncing', processed_rows=len(df))
     try:
         from django.core.management import call_command
         sync_form_id = int(form_id) if form_id else 17  # 默认17，兼容老逻辑
         
-        # 先清空目标申请表的现有数据，避免唯一约束冲突
-        from supplies.models import DynamicCalculationItem
-        existing_count = DynamicCalculationItem.objects.filter(form_id=sync_form_id).count()
-        if existing_count > 0:
-            print(f"清空现有 {existing_count} 条动态计算表数据")
-            DynamicCalculationItem.objects.filter(form_id=sync_form_id).delete()
-        
-        # 执行同步命令
-        call_command('sync_b453_to_dynamic', 
-                   application_form_id=sync_form_id, 
-                   user_id=request.user.id, 
-                   update_existing=False,  # 改为False，因为我们已经清空了数据
-                   verbose=True)
-        
-        # 执行月份数据同步
-        call_command('sync_b453_monthly_data', 
-                   application_form_id=sync_form_id, 
-                   user_id=request.user.id, 
-                   verbose=True)
+        # 清空和同步在同一个事务中，同步失败时保留申请表原有数据
+        with transaction.atomic():
+            # 先清空目标申请表的现有数据，避免唯一约束冲突
+            from supplies.models import DynamicCalculationItem
+            existing_count = DynamicCalculationItem.objects.filter(form_id=sync_form_id).count()
+            if existing_count > 0:
+                logger.info(f"清空现有 {existing_count} 条动态计算表数据")
+                delete_calculation_items(DynamicCalculationItem.objects.filter(form_id=sync_form_id))
+            
+            # 执行同步命令
+            call_command('sync_b453_to_dynamic', 
+                       application_form_id=sync_form_id, 
+                       user_id=user.id, 
+                       update_existing=False,  # 改为False，因为我们已经清空了数据
+                       verbose=True)
+            
+            # 执行月份数据同步
+            call_command('sync_b453_monthly_data', 
+                       application_form_id=sync_form_id, 
+                       user_id=user.id, 
+                       verbose=True)
         
     except Exception as e:
         error_items.append({
             'material': '同步到DynamicCalculationItem',
             'error': str(e)
         })
-        print(f"同步错误: {str(e)}")
+        logger.warning(f"同步错误: {str(e)}")
     
     # 记录导入日志
-    log = ImportLog.objects.create(
-        user=request.user,
+    log = save_import_log(
+        log,
+        user=user,
         file_name=file_name,
         result=f"成功导入管控表 {len(imported_items)} 条耗材（Sheet: {sheet_name or '默认'}），错误 {len(error_items)} 条",
         success=len(error_items) == 0,
         imported_count=len(imported_items),
         error_count=len(error_items),
-        error_details=str(error_items) if error_items else ""
+        error_details=str(error_items) if error_items else "",
+        result_data={'error_items': error_items[:100]},
     )
     
-    # 打印详细错误信息到终端
     if error_items:
-        print(f"\n=== 导入错误详情 ===")
-        for i, error in enumerate(error_items, 1):
-            print(f"错误 {i}: {error}")
-        print(f"=== 共 {len(error_items)} 条错误 ===\n")
+        logger.warning(f"导入管控表共 {len(error_items)} 条错误（详见导入日志 {log.id}）")
     
     return Response({
         'message': f'成功导入管控表 {len(imported_items)} 条耗材（Sheet: {sheet_name or "默认"}）',
@@ -1641,206 +1515,41 @@ def import_management_table(df, sheet_name, form_id, request, file_name, full_pa
     }, status=status.HTTP_200_OK)
 
 
-def import_calculation_table(df, sheet_name, form_id, request, file_name, full_path, detection_method):
+def import_calculation_table(df, sheet_name, form_id, user, file_name, full_path, detection_method, log=None):
     """
     导入需求计算表数据
+    log: 后台导入任务对应的ImportLog，为None时新建一条导入日志
     """
-    import pandas as pd
-    
-    # 定义列名映射（需求计算表）
-    column_keywords = {
-        '料材名称': ['料材名称', '料件名稱', '物料名称', 'material', 'name', '耗材名稱', '耗材名称', '料材', '料件'],
-        '使用站别': ['使用站别', '使用站別', 'usage_station', 'station', '站别', '站別', '工站'],
-        '每臺機用量': ['每臺机用量', '每臺機用量', '每台机用量', 'usage_per_machine', '机用量', '機用量', '用量'],
-        '使用次数': ['使用次数', '使用次數', 'usage_count', '次數', '次数'],
-        '当月产能': ['当月产能', '當月產能', 'monthly_capacity', '產能', '产能'],
-        '最低库存': ['最低库存', '最低庫存', 'min_stock', '庫存數', '库存数'],
-        '最高库存': ['最高库存', '最高庫存', 'max_stock', '庫存總數', '库存总数'],
-        '当月需求/站': ['当月需求/站', '當月需求/站', 'monthly_demand', '需求', '當月總需求', '当月总需求'],
-        '备注': ['备注', '備註', 'remark', 'moq_remark', '備註\n（MOQ）'],
-    }
-    
-    # 自动查找包含关键字的列名
-    mapped_columns = {}
-    missing_columns = []
-    
-    print(f"=== 需求计算表列名映射调试 ===")
-    print(f"实际列名: {list(df.columns)}")
-    
-    for required_col, keywords in column_keywords.items():
-        found = False
-        best_match = None
-        best_score = 0
-        
-        for col in df.columns:
-            col_str = str(col).replace('\n', '').replace(' ', '').lower()
-            
-            for kw in keywords:
-                kw_clean = kw.replace('\n', '').replace(' ', '').lower()
-                
-                # 计算匹配度
-                if kw_clean in col_str:
-                    score = len(kw_clean) / len(col_str)  # 匹配度 = 关键词长度 / 列名长度
-                    if score > best_score:
-                        best_score = score
-                        best_match = col
-                        found = True
-                        print(f"  匹配 '{required_col}': '{kw}' -> '{col}' (匹配度: {score:.2f})")
-        
-        if found and best_match:
-            mapped_columns[required_col] = best_match
-        else:
-            missing_columns.append(required_col)
-            print(f"  ❌ 未找到 '{required_col}' 的匹配列")
-    
-    print(f"=== 映射结果 ===")
-    for col, mapped in mapped_columns.items():
-        print(f"  {col} -> {mapped}")
+    # 按预编译的关键字解析列名，取匹配度最高的列（每个工作表只解析一次）
+    mapping = CalculationTableImport.header_matcher.resolve(df.columns)
+    mapped_columns = mapping.columns
+    missing_columns = mapping.missing
     
     if missing_columns:
         return Response({
             'error': f'需求计算表缺少必要的列: {", ".join(missing_columns)}'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    # 清理物料名称函数
-    def clean_material_name(name):
-        if pd.isna(name):
-            return ""
-        return str(name).strip()
-    
-    # 处理数据 - 智能过滤和导入有效数据
-    imported_items = []
-    error_items = []
-    
-    # 智能过滤有效数据行
-    valid_rows = []
-    for index, row in df.iterrows():
-        material_name = clean_material_name(row[mapped_columns['料材名称']])
-        
-        # 跳过空行或无效数据
-        if not material_name or material_name.lower() in ['nan', 'none', '']:
-            continue
-        
-        # 跳过表头行和汇总行
-        skip_keywords = ['核准', '审核', '批准', '合计', '总计', 'No.', '料材名称', 'no.', 'no', 'material', 'name']
-        if any(keyword.lower() in material_name.lower() for keyword in skip_keywords):
-            continue
-        
-        # 检查是否包含有效的物料信息
-        valid_material_keywords = ['設備', '设备', '探針', '探针', '清潔劑', '清洁剂', '密封圈', '密封垫', '喇叭', '膠材', '胶材', '耗材', '料材']
-        if not any(keyword in material_name for keyword in valid_material_keywords):
-            # 如果不是明显的物料，进一步检查
-            if len(material_name) < 5:  # 太短的描述可能是无效数据
-                continue
-        
-        valid_rows.append((index, row))
-    
-    print(f"找到 {len(valid_rows)} 条有效需求计算数据")
-    
-    # 如果有form_id，导入到DynamicCalculationItem，否则导入到B453CalculationItem
-    if form_id:
-        # 不再清空DynamicCalculationItem数据
-        # 遍历有效的行数据
-        for index, row in valid_rows:
-            material_name = clean_material_name(row[mapped_columns['料材名称']])
-            try:
-                # 查找是否已存在
-                item = DynamicCalculationItem.objects.filter(form_id=form_id, material_name=material_name).first()
-                if item:
-                    # 更新需求相关字段
-                    item.usage_station = str(row[mapped_columns['使用站别']]).strip() if pd.notna(row[mapped_columns['使用站别']]) else ''
-                    item.usage_per_set = int(row[mapped_columns['每臺機用量']]) if pd.notna(row[mapped_columns['每臺機用量']]) else 0
-                    item.usage_count = int(row[mapped_columns['使用次数']]) if pd.notna(row[mapped_columns['使用次数']]) else 0
-                    item.monthly_capacity = int(row[mapped_columns['当月产能']]) if pd.notna(row[mapped_columns['当月产能']]) else 0
-                    item.min_stock = int(row[mapped_columns['最低库存']]) if pd.notna(row[mapped_columns['最低库存']]) else 0
-                    item.max_stock = int(row[mapped_columns['最高库存']]) if pd.notna(row[mapped_columns['最高库存']]) else 0
-                    item.monthly_demand = int(row[mapped_columns['当月需求/站']]) if pd.notna(row[mapped_columns['当月需求/站']]) else 0
-                    item.moq_remark = str(row[mapped_columns['备注']]).strip() if pd.notna(row[mapped_columns['备注']]) else ''
-                    item.save()
-                    print(f"✓ 更新需求计算表(Dynamic): {material_name}")
-                else:
-                    # 新建
-                    item = DynamicCalculationItem.objects.create(
-                        form_id=form_id,
-                        no=len(imported_items) + 1,
-                        material_name=material_name,
-                        usage_station=str(row[mapped_columns['使用站别']]).strip() if pd.notna(row[mapped_columns['使用站别']]) else '',
-                        usage_per_set=int(row[mapped_columns['每臺機用量']]) if pd.notna(row[mapped_columns['每臺機用量']]) else 0,
-                        usage_count=int(row[mapped_columns['使用次数']]) if pd.notna(row[mapped_columns['使用次数']]) else 0,
-                        monthly_capacity=int(row[mapped_columns['当月产能']]) if pd.notna(row[mapped_columns['当月产能']]) else 0,
-                        min_stock=int(row[mapped_columns['最低库存']]) if pd.notna(row[mapped_columns['最低库存']]) else 0,
-                        max_stock=int(row[mapped_columns['最高库存']]) if pd.notna(row[mapped_columns['最高库存']]) else 0,
-                        monthly_demand=int(row[mapped_columns['当月需求/站']]) if pd.notna(row[mapped_columns['当月需求/站']]) else 0,
-                        moq_remark=str(row[mapped_columns['备注']]).strip() if pd.notna(row[mapped_columns['备注']]) else ''
-                    )
-                    print(f"✓ 新增需求计算表(Dynamic): {material_name}")
-                imported_items.append({
-                    'no': item.no,
-                    'material_name': item.material_name,
-                    'usage_station': item.usage_station,
-                    'monthly_demand': item.monthly_demand
-                })
-            except Exception as e:
-                error_items.append({
-                    'material': material_name,
-                    'error': str(e)
-                })
-                print(f"✗ 错误: {material_name} - {str(e)}")
-    else:
-        # 清空现有B453CalculationItem数据
-        B453CalculationItem.objects.all().delete()
-        
-        # 遍历有效的行数据
-        for index, row in valid_rows:
-            material_name = clean_material_name(row[mapped_columns['料材名称']])
-            
-            try:
-                # 创建B453CalculationItem
-                item = B453CalculationItem.objects.create(
-                    no=len(imported_items) + 1,
-                    material_name=material_name,
-                    usage_station=str(row[mapped_columns['使用站别']]).strip() if pd.notna(row[mapped_columns['使用站别']]) else '',
-                    usage_per_machine=int(row[mapped_columns['每臺機用量']]) if pd.notna(row[mapped_columns['每臺機用量']]) else 0,
-                    usage_count=int(row[mapped_columns['使用次数']]) if pd.notna(row[mapped_columns['使用次数']]) else 0,
-                    monthly_capacity=int(row[mapped_columns['当月产能']]) if pd.notna(row[mapped_columns['当月产能']]) else 0,
-                    min_stock=int(row[mapped_columns['最低库存']]) if pd.notna(row[mapped_columns['最低库存']]) else 0,
-                    max_stock=int(row[mapped_columns['最高库存']]) if pd.notna(row[mapped_columns['最高库存']]) else 0,
-                    monthly_demand_per_station=int(row[mapped_columns['当月需求/站']]) if pd.notna(row[mapped_columns['当月需求/站']]) else 0,
-                    moq_remark=str(row[mapped_columns['备注']]).strip() if pd.notna(row[mapped_columns['备注']]) else '',
-                    created_by=request.user
-                )
-                imported_items.append({
-                    'no': item.no,
-                    'material_name': item.material_name,
-                    'usage_station': item.usage_station,
-                    'monthly_demand': item.monthly_demand_per_station
-                })
-                print(f"✓ 导入需求计算表(B453): {material_name}")
-                
-            except Exception as e:
-                error_items.append({
-                    'material': material_name,
-                    'error': str(e)
-                })
-                print(f"✗ 错误: {material_name} - {str(e)}")
+    # 整表向量化清洗校验，有form_id时按料材名称批量新增/更新，否则整体替换B453CalculationItem
+    imported_items, error_items, summary = CalculationTableImport(
+        df, mapped_columns, user, form_id=form_id
+    ).run()
     
     # 记录导入日志
-    log = ImportLog.objects.create(
-        user=request.user,
+    log = save_import_log(
+        log,
+        user=user,
         file_name=file_name,
         result=f"成功导入需求计算表 {len(imported_items)} 条记录（Sheet: {sheet_name or '默认'}），错误 {len(error_items)} 条",
         success=len(error_items) == 0,
         imported_count=len(imported_items),
         error_count=len(error_items),
-        error_details=str(error_items) if error_items else ""
+        error_details=str(error_items) if error_items else "",
+        result_data={'summary': summary, 'error_items': error_items[:100]},
     )
     
-    # 打印详细错误信息到终端
     if error_items:
-        print(f"\n=== 导入错误详情 ===")
-        for i, error in enumerate(error_items, 1):
-            print(f"错误 {i}: {error}")
-        print(f"=== 共 {len(error_items)} 条错误 ===\n")
+        logger.warning(f"导入需求计算表共 {len(error_items)} 条错误（详见导入日志 {log.id}）")
     
     return Response({
         'message': f'成功导入需求计算表 {len(imported_items)} 条记录（Sheet: {sheet_name or "默认"}）',
@@ -1848,6 +1557,7 @@ def import_calculation_table(df, sheet_name, form_id, request, file_name, full_p
         'error_count': len(error_items),
         'imported_items': imported_items,
         'error_items': error_items,
+        'summary': summary,
         'log_id': log.id,
         'sheet_name': sheet_name,
         'table_type': 'calculation',
@@ -1874,7 +1584,10 @@ def import_log_list(request):
                 'result': log.result,
                 'success': log.success,
                 'imported_count': log.imported_count,
-                'error_count': log.error_count
+                'error_count': log.error_count,
+                'status': log.status,
+                'progress': log.progress,
+                'duration': log.duration,
             })
         
         return Response({
@@ -1887,105 +1600,71 @@ def import_log_list(request):
             'error': f'获取日志失败: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# ================================
+# 🆕 后台导入任务
+# ================================
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_job_create(request):
+    """
+    上传Excel并创建后台导入任务，立即返回任务ID
+    参数: file, form_id(可选), sheet_name(可选), table_type(management/calculation，可选，默认自动检测),
+         header_row(表头所在行，默认1)
+    """
+    if 'file' not in request.FILES:
+        return Response({'error': '请上传Excel文件'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    uploaded_file = request.FILES['file']
+    if not uploaded_file.name.endswith('.xlsx'):
+        return Response({'error': '请上传Excel文件（.xlsx格式）'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    table_type = request.data.get('table_type') or ''
+    if table_type and table_type not in ('management', 'calculation'):
+        return Response({'error': 'table_type 必须是 management 或 calculation'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        form_id = int(request.data['form_id']) if request.data.get('form_id') else None
+        header_row = int(request.data.get('header_row') or 1)
+    except (TypeError, ValueError):
+        return Response({'error': 'form_id 和 header_row 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if form_id and not ApplicationForm.objects.filter(id=form_id).exists():
+        return Response({'error': '申请表不存在'}, status=status.HTTP_404_NOT_FOUND)
+    
+    log = create_import_job(
+        uploaded_file,
+        request.user,
+        form_id=form_id,
+        sheet_name=request.data.get('sheet_name') or '',
+        table_type=table_type,
+        header_row=max(1, header_row),
+    )
+    log.refresh_from_db()
+    return Response(serialize_job(log), status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def import_job_status(request, job_id):
+    """查询后台导入任务的状态和进度（只能查询自己创建的任务，超级管理员可查询全部）"""
+    jobs = ImportLog.objects.all() if request.user.is_superuser else ImportLog.objects.filter(user=request.user)
+    try:
+        log = jobs.get(id=job_id)
+    except ImportLog.DoesNotExist:
+        return Response({'error': '导入任务不存在'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(serialize_job(log))
+
 @api_view(['GET'])
 def get_grouped_material_data(request, form_id):
     """
     获取分组的材料数据 - 处理一个耗材对应多个使用站别的情况
+    查询次数固定，不随物料数量增长（见 material_groups）
     """
     try:
-        # 获取申请表
-        application_form = ApplicationForm.objects.get(id=form_id)
-        
-        # 获取所有计算项目
-        calculation_items = DynamicCalculationItem.objects.filter(
-            form=application_form,
-            is_visible=True
-        ).order_by('material_name', 'usage_station')
-        
-        # 按材料名称分组
-        grouped_data = {}
-        for item in calculation_items:
-            material_name = item.material_name
-            if material_name not in grouped_data:
-                grouped_data[material_name] = {
-                    'supply_item': None,
-                    'calculation_items': [],
-                    'total_demand': 0,
-                    'total_order': 0
-                }
-            
-            # 添加计算项目
-            calculation_data = {
-                'id': item.id,
-                'no': item.no,
-                'material_name': item.material_name,
-                'usage_station': item.usage_station,
-                'usage_per_set': item.usage_per_set,
-                'usage_count': item.usage_count,
-                'monthly_capacity': item.monthly_capacity,
-                'min_stock': item.min_stock,
-                'max_stock': item.max_stock,
-                'monthly_demand': item.monthly_demand,
-                'actual_order': item.actual_order,
-                'linked_supply_item_id': item.linked_supply_item_id,
-                'unit_price': float(item.unit_price) if item.unit_price else 0,
-                'moq': item.moq,
-                'purchaser': item.purchaser,
-            }
-            
-            grouped_data[material_name]['calculation_items'].append(calculation_data)
-            grouped_data[material_name]['total_demand'] += item.monthly_demand or 0
-            grouped_data[material_name]['total_order'] += item.actual_order or 0
-            
-            # 如果有关联的供应项目，获取供应项目信息
-            if item.linked_supply_item_id and not grouped_data[material_name]['supply_item']:
-                try:
-                    supply_item = B453SupplyItem.objects.get(id=item.linked_supply_item_id)
-                    grouped_data[material_name]['supply_item'] = {
-                        'id': supply_item.id,
-                        'material_description': supply_item.material_description,
-                        'unit': supply_item.unit,
-                        'purchaser': supply_item.purchaser,
-                        'unit_price': float(supply_item.unit_price),
-                        'min_safety_stock': supply_item.min_safety_stock,
-                        'max_safety_stock': supply_item.max_safety_stock,
-                        'moq': supply_item.moq,
-                        'lead_time_weeks': supply_item.lead_time_weeks,
-                    }
-                except B453SupplyItem.DoesNotExist:
-                    # 如果关联的供应项目不存在，创建一个虚拟的供应项目
-                    grouped_data[material_name]['supply_item'] = {
-                        'id': 0,
-                        'material_description': material_name,
-                        'unit': 'pcs',
-                        'purchaser': item.purchaser or '',
-                        'unit_price': float(item.unit_price) if item.unit_price else 0,
-                        'min_safety_stock': item.min_stock or 0,
-                        'max_safety_stock': item.max_stock or 0,
-                        'moq': item.moq or 0,
-                        'lead_time_weeks': 15,
-                    }
-        
-        # 转换为列表格式
-        result = []
-        for material_name, data in grouped_data.items():
-            if not data['supply_item']:
-                # 如果没有供应项目，创建一个基于第一个计算项目的虚拟供应项目
-                first_calc = data['calculation_items'][0] if data['calculation_items'] else {}
-                data['supply_item'] = {
-                    'id': 0,
-                    'material_description': material_name,
-                    'unit': 'pcs',
-                    'purchaser': first_calc.get('purchaser', ''),
-                    'unit_price': first_calc.get('unit_price', 0),
-                    'min_safety_stock': first_calc.get('min_stock', 0),
-                    'max_safety_stock': first_calc.get('max_stock', 0),
-                    'moq': first_calc.get('moq', 0),
-                    'lead_time_weeks': 15,
-                }
-            result.append(data)
-        
-        return Response(result, status=200)
+        if not ApplicationForm.objects.filter(id=form_id).exists():
+            raise ApplicationForm.DoesNotExist
+        return Response(grouped_material_data(form_id), status=200)
         
     except ApplicationForm.DoesNotExist:
         return Response({'error': '申请表不存在'}, status=404)
@@ -2019,27 +1698,29 @@ def add_usage_station(request, material_id):
         # 计算当月需求/站
         monthly_demand = 0
         if usage_per_set and usage_count and monthly_capacity:
-            monthly_demand = int((monthly_capacity * usage_per_set) / usage_count)
+            monthly_demand = calculate_demand(monthly_capacity, usage_per_set, usage_count)
         
-        # 创建新的计算项目
-        calculation_item = DynamicCalculationItem.objects.create(
-            form=application_form,
-            no=DynamicCalculationItem.objects.filter(form=application_form).count() + 1,
-            material_name=supply_item.material_description,
-            usage_station=usage_station,
-            usage_per_set=usage_per_set,
-            usage_count=usage_count,
-            monthly_capacity=monthly_capacity,
-            min_stock=supply_item.min_safety_stock,
-            max_stock=supply_item.max_safety_stock,
-            monthly_demand=monthly_demand,
-            actual_order=monthly_demand,
-            linked_supply_item_id=supply_item.id,
-            linked_material=supply_item.material_description,
-            unit_price=supply_item.unit_price,
-            moq=supply_item.moq,
-            purchaser=supply_item.purchaser,
-        )
+        # 创建新的计算项目（序号由计数器加锁分配，并发新增不会冲突）
+        with transaction.atomic():
+            [no] = allocate_item_numbers(application_form.id)
+            calculation_item = DynamicCalculationItem.objects.create(
+                form=application_form,
+                no=no,
+                material_name=supply_item.material_description,
+                usage_station=usage_station,
+                usage_per_set=usage_per_set,
+                usage_count=usage_count,
+                monthly_capacity=monthly_capacity,
+                min_stock=supply_item.min_safety_stock,
+                max_stock=supply_item.max_safety_stock,
+                monthly_demand=monthly_demand,
+                actual_order=monthly_demand,
+                linked_supply_item_id=supply_item.id,
+                linked_material=supply_item.material_description,
+                unit_price=supply_item.unit_price,
+                moq=supply_item.moq,
+                purchaser=supply_item.purchaser,
+            )
         
         return Response({
             'id': calculation_item.id,